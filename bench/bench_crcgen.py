@@ -0,0 +1,326 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+# Offline benchmarks for matrix construction and HDL generation.
+#
+#   python -m bench.bench_crcgen run -o baseline.json
+#   python -m bench.bench_crcgen compare baseline.json [current.json]
+#
+# Each phase is timed as the best of several repeats, then run once more under
+# tracemalloc for its peak memory, so the tracing overhead stays out of the
+# timings.
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Iterable, List, NamedTuple, Sequence, Tuple
+
+from crcgen.crcgen import (
+    CRC_MATRIX_METHODS,
+    build_crc_matrices,
+    gen_vhdl_package,
+    int_to_poly,
+    lfsr_shift_serial,
+)
+
+POLYS = {
+    "CRC5-USB": (5, 0x05),
+    "CRC16-CCITT": (16, 0x1021),
+    "CRC32": (32, 0x04C11DB7),
+    "CRC64-ECMA": (64, 0x42F0E1EBA9EA3693),
+}
+WIDTHS = (8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+PHASES = ("shift", "matrices", "vhdl")
+FORMAT_VERSION = 1
+
+
+class Result(NamedTuple):
+    poly: str
+    width: int
+    phase: str
+    seconds: float
+    peak_bytes: int
+
+
+class BenchRun(NamedTuple):
+    # Settings a run was recorded with, results only compare under the same
+    method: str
+    widths: List[int]
+    results: List[Result]
+
+
+class Regression(NamedTuple):
+    key: Tuple[str, int, str]
+    metric: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Tuple[float, int]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run_benchmarks(
+    polys: Iterable[str] = POLYS,
+    widths: Iterable[int] = WIDTHS,
+    method: str = "matrix",
+    repeat: int = 3,
+    progress: Callable[[Result], None] = lambda result: None,
+) -> List[Result]:
+    results = []
+    for name in polys:
+        length, value = POLYS[name]
+        poly = int_to_poly(length, value)
+        for width in widths:
+            state = [1] * length
+            data = [(i >> 1) & 1 for i in range(width)]
+            state_matrix, data_matrix = build_crc_matrices(poly, width, True, method)
+            phases = {
+                "shift": lambda: lfsr_shift_serial(poly, state, data),
+                "matrices": lambda: build_crc_matrices(poly, width, True, method),
+                "vhdl": lambda: gen_vhdl_package(
+                    "", "bench", poly, width, state_matrix, data_matrix
+                ),
+            }
+            for phase in PHASES:
+                seconds, peak = measure(phases[phase], repeat)
+                result = Result(name, width, phase, seconds, peak)
+                progress(result)
+                results.append(result)
+    return results
+
+
+def save_results(path: str, results: Sequence[Result], method: str):
+    document = {
+        "version": FORMAT_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "method": method,
+        "widths": sorted({result.width for result in results}),
+        "results": [result._asdict() for result in results],
+    }
+    with open(path, "w") as f:
+        json.dump(document, f, indent=1)
+        f.write("\n")
+
+
+def load_run(path: str) -> BenchRun:
+    with open(path) as f:
+        document = json.load(f)
+    if document.get("version") != FORMAT_VERSION:
+        raise ValueError("{}: unsupported baseline version".format(path))
+    results = [Result(**result) for result in document["results"]]
+    widths = document.get("widths")
+    if widths is None:
+        widths = sorted({result.width for result in results})
+    return BenchRun(document.get("method", ""), widths, results)
+
+
+def load_results(path: str) -> List[Result]:
+    return load_run(path).results
+
+
+def run_mismatch(baseline: BenchRun, current: BenchRun) -> List[str]:
+    # A different method makes every timing incomparable, different widths
+    # only leave part of the results to compare
+    problems = []
+    if baseline.method != current.method:
+        problems.append(
+            "baseline was recorded with --method {}, not {}".format(
+                baseline.method or "?", current.method or "?"
+            )
+        )
+    if baseline.widths != current.widths:
+        problems.append(
+            "baseline widths {} differ from {}, only the common widths are "
+            "compared".format(
+                ",".join(map(str, baseline.widths)), ",".join(map(str, current.widths))
+            )
+        )
+    return problems
+
+
+def compare_results(
+    baseline: Sequence[Result],
+    current: Sequence[Result],
+    threshold: float = 0.25,
+    min_seconds: float = 1e-3,
+) -> List[Regression]:
+    # Timings below min_seconds are too noisy to compare, memory always is
+    base = {(r.poly, r.width, r.phase): r for r in baseline}
+    regressions = []
+    for result in current:
+        key = (result.poly, result.width, result.phase)
+        old = base.get(key)
+        if old is None:
+            continue
+        if max(
+            old.seconds, result.seconds
+        ) >= min_seconds and result.seconds > old.seconds * (1 + threshold):
+            regressions.append(Regression(key, "seconds", old.seconds, result.seconds))
+        if old.peak_bytes and result.peak_bytes > old.peak_bytes * (1 + threshold):
+            regressions.append(
+                Regression(key, "peak_bytes", old.peak_bytes, result.peak_bytes)
+            )
+    return regressions
+
+
+def print_result(result: Result):
+    print(
+        "{:12} {:5d} {:9} {:10.6f}s {:10d}B".format(
+            result.poly, result.width, result.phase, result.seconds, result.peak_bytes
+        ),
+        file=sys.stderr,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="bench_crcgen",
+        description="Benchmark CRC matrix construction and HDL generation",
+    )
+    parser.add_argument(
+        "command",
+        choices=("run", "compare"),
+        help="Record results, or compare them against a baseline",
+    )
+    parser.add_argument(
+        "files",
+        nargs="*",
+        help="compare: baseline file and optionally a results file to compare",
+    )
+    parser.add_argument(
+        "-o", "--output", type=str, default=None, help="Write the results as JSON"
+    )
+    parser.add_argument(
+        "--poly",
+        action="append",
+        choices=POLYS,
+        default=None,
+        help="Polynomial to benchmark, may be repeated (Default: all)",
+    )
+    parser.add_argument(
+        "-w",
+        "--width",
+        action="append",
+        type=int,
+        default=None,
+        help="Data width to benchmark, may be repeated (Default: 8 to 4096)",
+    )
+    parser.add_argument(
+        "--method",
+        choices=sorted(CRC_MATRIX_METHODS),
+        default="matrix",
+        help="Matrix construction method (Default matrix)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Timing repeats per phase (Default 3)"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Allowed relative slowdown or memory growth (Default 0.25)",
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=1e-3,
+        help="Ignore timing changes of phases faster than this (Default 0.001s)",
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true", help="Do not print each result"
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "run" and args.files:
+        parser.error("run does not take files")
+    if args.command == "compare" and not 1 <= len(args.files) <= 2:
+        parser.error("compare needs a baseline file and optionally a results file")
+
+    if args.command == "compare":
+        baseline = load_run(args.files[0])
+    if args.command == "compare" and len(args.files) == 2:
+        current = load_run(args.files[1])
+    else:
+        if args.command == "compare" and baseline.method != args.method:
+            # Refuse before spending the time on the run
+            parser.error(
+                "baseline was recorded with --method {}, not {}".format(
+                    baseline.method, args.method
+                )
+            )
+        results = run_benchmarks(
+            args.poly or POLYS,
+            args.width or WIDTHS,
+            args.method,
+            args.repeat,
+            (lambda result: None) if args.quiet else print_result,
+        )
+        current = BenchRun(
+            args.method, sorted({result.width for result in results}), results
+        )
+    if args.output is not None:
+        save_results(args.output, current.results, current.method)
+    if args.command == "run":
+        return 0
+
+    problems = run_mismatch(baseline, current)
+    if baseline.method != current.method:
+        parser.error(problems[0])
+    for problem in problems:
+        print("WARNING " + problem, file=sys.stderr)
+    regressions = compare_results(
+        baseline.results, current.results, args.threshold, args.min_time
+    )
+    for regression in regressions:
+        poly, width, phase = regression.key
+        print(
+            "REGRESSION {} {} {} {}: {:g} -> {:g} ({:+.0%})".format(
+                poly,
+                width,
+                phase,
+                regression.metric,
+                regression.baseline,
+                regression.current,
+                regression.ratio - 1,
+            ),
+            file=sys.stderr,
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
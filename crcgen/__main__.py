@@ -15,23 +15,107 @@
 #
 
 import argparse
+import cProfile
+import functools
+import importlib
+import os
+import pstats
 import sys
 
-from .crcgen import PRESETS, build_crc_matrices, gen_vhdl_package, int_to_poly
+from .cache import MatrixCache
+from .crcgen import (
+    CRC_MATRIX_METHODS,
+    PRESETS,
+    CrcParams,
+    build_crc_matrices,
+    build_crc_matrices_sweep,
+    int_to_poly,
+    iter_vhdl_package,
+)
+from .csource import C_STYLES, MAX_C_WIDTH, iter_c_source
+from .folded import build_folded, folded_equation_stats, iter_vhdl_folded_package
+from .pipeline import iter_vhdl_pipeline, pipeline_stats
+from .residual import build_residual_matrices, iter_vhdl_residual_package
+from .stats import GenerationStats, equation_stats, network_stats
+from .transform import derby_transform
+from .vectors import DEFAULT_VECTORS, iter_vhdl_testbench, write_vectors
+from .xornet import matrix_rows, share_xor_terms
 
 
 class PresetAction(argparse.Action):
     def __call__(self, parser, namespace, values, option_string=None):
         preset = PRESETS[values]
         setattr(namespace, "preset", values)
-        setattr(namespace, "length", preset[0])
-        setattr(namespace, "poly", preset[1])
+        setattr(namespace, "length", preset.length)
+        setattr(namespace, "poly", preset.poly)
 
 
-def main():
+# Subcommands live in their own modules and are only imported when used
+SUBCOMMANDS = {
+    "batch": "batch",
+    "file": "filecrc",
+    "reveng": "reveng",
+    "search": "search",
+    "serve": "server",
+}
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] in SUBCOMMANDS:
+        module = importlib.import_module("." + SUBCOMMANDS[argv[0]], __package__)
+        return module.main(argv[1:])
+    generate(argv)
+
+
+def generate(argv=None, matrix_source=None) -> GenerationStats:
+    if argv is None:
+        argv = sys.argv[1:]
+    stats = GenerationStats()
+    with stats.phase("parse"):
+        parser, args = parse_args(argv)
+    profiler = cProfile.Profile() if args.profile is not None else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        run(parser, args, " ".join(argv), stats, matrix_source)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+
+    if args.stats:
+        print(stats.format(), file=sys.stderr)
+    if profiler is not None:
+        if args.profile == "-":
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats(
+                "cumulative"
+            ).print_stats(25)
+        else:
+            profiler.dump_stats(args.profile)
+    return stats
+
+
+def parse_args(argv):
     def auto_int(x):
         return int(x, 0)
 
+    def width_range(x):
+        # Either a single width or an inclusive start:stop[:step] sweep
+        try:
+            bounds = [int(part) for part in x.split(":")]
+        except ValueError:
+            raise argparse.ArgumentTypeError("invalid width: {!r}".format(x))
+        if len(bounds) == 1:
+            widths = bounds
+        elif len(bounds) in (2, 3):
+            widths = list(range(bounds[0], bounds[1] + 1, *bounds[2:]))
+        else:
+            widths = []
+        if not widths or min(widths) < 1:
+            raise argparse.ArgumentTypeError("invalid width: {!r}".format(x))
+        return widths
+
     parser = argparse.ArgumentParser(
         description="Parallel CRC HDL implementation generator"
     )
@@ -60,16 +144,17 @@ def main():
     parser.add_argument(
         "-w",
         "--width",
-        type=int,
-        required=True,
-        help="Parallel data width to implement CRC for",
+        type=width_range,
+        default=None,
+        help="Parallel data width to implement CRC for, or start:stop[:step] to "
+        "generate every width in a range",
     )
     parser.add_argument(
         "-r",
         "--reflect-input",
         help="Reflect input data before processing (Default True)",
         action="store_true",
-        default=True,
+        default=None,
     )
     parser.add_argument(
         "-R",
@@ -78,52 +163,442 @@ def main():
         action="store_false",
         dest="reflect_input",
     )
+    parser.add_argument(
+        "--reflect-output",
+        action="store_true",
+        default=None,
+        help="Reflect the CRC before the final XOR (Default: same as input)",
+    )
+    parser.add_argument(
+        "--no-reflect-output",
+        action="store_false",
+        dest="reflect_output",
+        help="Do not reflect the CRC before the final XOR",
+    )
+    parser.add_argument(
+        "--init",
+        type=auto_int,
+        default=None,
+        help="Initial CRC state, folded into a first-word function (Default 0)",
+    )
+    parser.add_argument(
+        "--xorout",
+        type=auto_int,
+        default=None,
+        help="Final XOR value, folded into a final output function (Default 0)",
+    )
     parser.add_argument(
         "-m",
         "--mode",
         type=str,
-        choices=["vhdl_package"],
+        choices=[
+            "vhdl_package",
+            "vhdl_pipeline",
+            "vhdl_residual",
+            "vhdl_testbench",
+            "vhdl_folded",
+            "c_source",
+        ],
         default="vhdl_package",
         help="Type of output file to write",
     )
+    parser.add_argument(
+        "--method",
+        type=str,
+        choices=CRC_MATRIX_METHODS,
+        default="serial",
+        help="Algorithm used to build the CRC matrices",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes for the serial matrix build (Default 1, 0 for the "
+        "number of CPUs). Only for --method serial with a single data width",
+    )
+    parser.add_argument(
+        "--share-xor",
+        action="store_true",
+        help="Extract XOR terms shared between output bits into intermediate "
+        "variables and report the XOR gate count",
+    )
+    parser.add_argument(
+        "--state-transform",
+        action="store_true",
+        help="Transform the state into companion form (Derby's method) so the "
+        "state feedback is at most a few XOR inputs wide, with input and output "
+        "transform functions outside the loop (vhdl_package only)",
+    )
+    parser.add_argument(
+        "--max-fanin",
+        type=int,
+        default=6,
+        help="Maximum XOR fan-in per register stage for vhdl_pipeline (Default 6)",
+    )
+    parser.add_argument(
+        "--residual-step",
+        type=int,
+        default=8,
+        help="Bits per byte enable for vhdl_residual (Default 8)",
+    )
+    parser.add_argument(
+        "--lanes",
+        type=int,
+        default=4,
+        help="Number of lanes the data word is split into for vhdl_folded "
+        "(Default 4)",
+    )
+    parser.add_argument(
+        "--c-style",
+        type=str,
+        choices=C_STYLES,
+        default="table",
+        help="c_source evaluation: byte slice tables or one masked parity per "
+        "bit (Default table)",
+    )
+    parser.add_argument(
+        "--vectors",
+        type=int,
+        default=DEFAULT_VECTORS,
+        help="Random vectors per width for vhdl_testbench (Default {})".format(
+            DEFAULT_VECTORS
+        ),
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Random seed for vhdl_testbench vectors"
+    )
+    parser.add_argument(
+        "--vector-dir",
+        type=str,
+        default=None,
+        help="Directory for vhdl_testbench vector files (Default: next to the "
+        "output file)",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        default=False,
+        help="Reuse CRC matrices from the on-disk cache",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_false",
+        dest="cache",
+        help="Always rebuild the CRC matrices (Default)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Matrix cache directory (default $CRCGEN_CACHE_DIR or ~/.cache/crcgen)",
+    )
+    parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="Remove all cached CRC matrices before generating",
+    )
     parser.add_argument(
         "--name", type=str, default=None, help="Name of generated function/module"
     )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print phase timings, XOR fan-in and LUT6 estimates to stderr",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        nargs="?",
+        const="-",
+        default=None,
+        help="Profile the generation with cProfile, printing the top functions "
+        "to stderr or saving the pstats data to the given file",
+    )
     parser.add_argument(
         "-o",
         "--output_file",
-        type=argparse.FileType("w"),
+        type=argparse.FileType("w", 1024 * 1024),
         default=sys.stdout,
         help="Output filename (default stdout)",
     )
 
-    args = parser.parse_args()
+    return parser, parser.parse_args(argv)
+
+
+def resolve_params(parser, args):
+    # Explicit options override the preset, which overrides the defaults.
+    # Without either only the plain next-state function is generated
+    preset = PRESETS[args.preset] if args.preset is not None else None
+    if args.reflect_input is None:
+        args.reflect_input = preset.reflect_input if preset is not None else True
+    overrides = (args.init, args.reflect_output, args.xorout)
+    if preset is None and all(value is None for value in overrides):
+        return None
+
+    if preset is None:
+        preset = CrcParams(args.length, args.poly, reflect_output=args.reflect_input)
+    params = CrcParams(
+        args.length,
+        args.poly,
+        preset.init if args.init is None else args.init,
+        args.reflect_input,
+        preset.reflect_output if args.reflect_output is None else args.reflect_output,
+        preset.xorout if args.xorout is None else args.xorout,
+    )
+    if params.init >> params.length or params.xorout >> params.length:
+        parser.error("--init and --xorout must fit in the CRC length")
+    return params
+
+
+def run(parser, args, cmdline, stats, matrix_source=None):
+    cache = MatrixCache(args.cache_dir)
+    if args.clear_cache:
+        cache.clear()
+        if args.width is None and args.poly is None:
+            return
+    if args.width is None:
+        parser.error("the following arguments are required: -w/--width")
     if args.length is None or args.poly is None:
         parser.error(
             "Need to specify both polynominal (-p) and length (-l) or use preset (--preset)"
         )
+    if args.max_fanin < 2:
+        parser.error("--max-fanin must be at least 2")
+    if args.jobs < 0:
+        parser.error("--jobs must not be negative")
+    if args.jobs != 1:
+        # Only the single-width serial build is split into column chunks
+        if args.method != "serial":
+            parser.error("--jobs only applies to --method serial")
+        if len(args.width) > 1 or args.mode == "vhdl_residual":
+            parser.error("--jobs needs a single data width")
+    if args.vectors < 1:
+        parser.error("--vectors must be at least 1")
+    if args.state_transform and args.mode != "vhdl_package":
+        parser.error("--state-transform is only supported with vhdl_package")
+    if args.mode == "vhdl_folded":
+        if args.share_xor:
+            parser.error("--share-xor is not supported with vhdl_folded")
+        if args.lanes < 1 or any(dwidth % args.lanes for dwidth in args.width):
+            parser.error("data widths must be a multiple of --lanes")
+    if args.mode == "c_source":
+        if args.share_xor:
+            parser.error("--share-xor is not supported with c_source")
+        if len(args.width) > 1:
+            parser.error("c_source takes a single data width")
+        if args.length > MAX_C_WIDTH or args.width[0] > MAX_C_WIDTH:
+            parser.error(
+                "c_source needs CRC length and data width of at most {}".format(
+                    MAX_C_WIDTH
+                )
+            )
+    params = resolve_params(parser, args)
     poly = int_to_poly(args.length, args.poly)
-    cmdline = " ".join(sys.argv[1:])
-    name = args.name
-    if name is None:
+    widths = args.width
+    base_name = args.name
+    if base_name is None:
         if args.preset is not None:
-            name = args.preset.lower().replace("-", "_")
+            base_name = args.preset.lower().replace("-", "_")
         else:
-            name = "crc{}".format(len(poly))
-        name += "_{}b".format(args.width)
-
-    matrices = build_crc_matrices(poly, args.width, args.reflect_input)
-    args.output_file.write(
-        gen_vhdl_package(
-            cmdline,
-            name,
-            poly,
-            args.width,
-            matrices[0],
-            matrices[1],
+            base_name = "crc{}".format(len(poly))
+
+    if matrix_source is not None:
+        build_single = matrix_source.build_crc_matrices
+        build_sweep = matrix_source.build_crc_matrices_sweep
+    elif args.cache:
+        build_single = cache.build_crc_matrices
+        build_sweep = cache.build_crc_matrices_sweep
+    else:
+        build_single = build_crc_matrices
+        build_sweep = build_crc_matrices_sweep
+
+    if args.mode == "vhdl_residual":
+        run_residual(parser, args, cmdline, stats, poly, base_name, build_sweep, params)
+        return
+
+    if len(widths) == 1:
+        sweep = iter(
+            (
+                dwidth,
+                build_single(
+                    poly, dwidth, args.reflect_input, args.method, args.jobs or None
+                ),
+            )
+            for dwidth in widths
         )
-    )
+    else:
+        sweep = iter(build_sweep(poly, widths, args.reflect_input))
+
+    while True:
+        # The sweep is lazy, so the matrices are timed as they are produced
+        with stats.phase("matrices"):
+            step = next(sweep, None)
+        if step is None:
+            break
+        dwidth, matrices = step
+        analysis = None
+        name = base_name
+        if args.name is None or len(widths) > 1:
+            name += "_{}b".format(dwidth)
+        if args.mode == "vhdl_pipeline":
+            chunks = iter_vhdl_pipeline(
+                cmdline,
+                name,
+                poly,
+                dwidth,
+                matrices[0],
+                matrices[1],
+                args.max_fanin,
+                params,
+            )
+            analysis = functools.partial(
+                pipeline_stats, dwidth, *matrices, args.max_fanin
+            )
+        elif args.mode == "vhdl_folded":
+            with stats.phase("matrices"):
+                plan = build_folded(poly, dwidth, args.lanes, args.reflect_input)
+            analysis = functools.partial(folded_equation_stats, plan)
+            chunks = iter_vhdl_folded_package(
+                cmdline,
+                name,
+                poly,
+                plan,
+                equation_stats(dwidth, *matrices),
+                params,
+            )
+        elif args.mode == "vhdl_testbench":
+            with stats.phase("vectors"):
+                files = write_testbench_vectors(args, name, matrices)
+            chunks = iter_vhdl_testbench(
+                cmdline, name, len(poly), dwidth, *map(os.path.basename, files)
+            )
+        elif args.mode == "c_source":
+            chunks = iter_c_source(
+                cmdline,
+                name,
+                poly,
+                dwidth,
+                matrices[0],
+                matrices[1],
+                args.c_style,
+                params,
+            )
+        else:
+            transform = None
+            if args.state_transform:
+                with stats.phase("transform"):
+                    transform = derby_transform(*matrices)
+            network = None
+            if args.share_xor:
+                # Shared once here for both the package and its stats
+                with stats.phase("share"):
+                    network = shared_network(dwidth, matrices, transform)
+            chunks = iter_vhdl_package(
+                cmdline,
+                name,
+                poly,
+                dwidth,
+                matrices[0],
+                matrices[1],
+                share_xor=args.share_xor,
+                params=params,
+                transform=transform,
+                network=network,
+            )
+            analysis = functools.partial(
+                package_stats, dwidth, matrices, transform, network
+            )
+        if args.stats:
+            if analysis is None:
+                analysis = functools.partial(equation_stats, dwidth, *matrices)
+            with stats.phase("analysis"):
+                stats.equations.append(analysis())
+        with stats.phase("emit"):
+            args.output_file.writelines(chunks)
+    if args.output_file is not sys.stdout:
+        args.output_file.close()
+
+
+def shared_network(dwidth, matrices, transform=None):
+    if transform is not None:
+        matrices = (transform.state_matrix, transform.data_matrix)
+    rows = matrix_rows(*matrices)
+    return share_xor_terms(rows, len(rows) + dwidth)
+
+
+def package_stats(dwidth, matrices, transform=None, network=None):
+    # Stats of the next state function as vhdl_package emits it, network is
+    # the shared XOR network when --share-xor is on
+    label = "flat"
+    if transform is not None:
+        matrices = (transform.state_matrix, transform.data_matrix)
+        label = "transformed"
+    if network is None:
+        return equation_stats(dwidth, *matrices, network=label)
+    label = "shared" if transform is None else "transformed, shared"
+    return network_stats(dwidth, network, label)
+
+
+def write_testbench_vectors(args, name, matrices):
+    vector_dir = args.vector_dir
+    if vector_dir is None:
+        vector_dir = os.path.dirname(getattr(args.output_file, "name", ""))
+        if args.output_file is sys.stdout:
+            vector_dir = ""
+    files = [
+        os.path.join(vector_dir, "{}_{}.txt".format(name, kind))
+        for kind in ("stimulus", "expected")
+    ]
+    with open(files[0], "w") as stimulus, open(files[1], "w") as expected:
+        write_vectors(
+            matrices[0], matrices[1], args.vectors, stimulus, expected, args.seed
+        )
+    return files
+
+
+def run_residual(
+    parser, args, cmdline, stats, poly, base_name, build_sweep, params=None
+):
+    if len(args.width) != 1:
+        parser.error("vhdl_residual takes a single data width")
+    if args.share_xor:
+        parser.error("--share-xor is not supported with vhdl_residual")
+    dwidth = args.width[0]
+    try:
+        with stats.phase("matrices"):
+            matrices = build_residual_matrices(
+                poly, dwidth, args.residual_step, args.reflect_input, build_sweep
+            )
+    except ValueError as e:
+        parser.error(str(e))
+    if args.stats:
+        with stats.phase("analysis"):
+            for width in sorted(matrices, reverse=True):
+                stats.equations.append(equation_stats(width, *matrices[width]))
+
+    if args.name is None:
+        name = "{}_{}b_be".format(base_name, dwidth)
+        prefix = base_name
+    else:
+        name = prefix = args.name
+    with stats.phase("emit"):
+        args.output_file.writelines(
+            iter_vhdl_residual_package(
+                cmdline,
+                name,
+                poly,
+                dwidth,
+                matrices,
+                args.reflect_input,
+                args.residual_step,
+                prefix,
+                params,
+            )
+        )
+    if args.output_file is not sys.stdout:
+        args.output_file.close()
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
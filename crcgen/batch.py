@@ -0,0 +1,207 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from .__main__ import main as generate_main
+
+# Manifest keys that map directly onto a generator command line option
+JOB_OPTIONS = {
+    "preset": "--preset",
+    "poly": "--poly",
+    "length": "--length",
+    "width": "--width",
+    "mode": "--mode",
+    "method": "--method",
+    "jobs": "--jobs",
+    "name": "--name",
+    "max_fanin": "--max-fanin",
+    "residual_step": "--residual-step",
+    "lanes": "--lanes",
+    "c_style": "--c-style",
+    "init": "--init",
+    "xorout": "--xorout",
+    "vectors": "--vectors",
+    "seed": "--seed",
+    "vector_dir": "--vector-dir",
+    "cache_dir": "--cache-dir",
+}
+JOB_FLAGS: Dict[str, Tuple[str, Optional[str]]] = {
+    "reflect_input": ("--reflect-input", "--no-reflect-input"),
+    "reflect_output": ("--reflect-output", "--no-reflect-output"),
+    "cache": ("--cache", "--no-cache"),
+    "share_xor": ("--share-xor", None),
+    "state_transform": ("--state-transform", None),
+}
+
+
+class JobResult(NamedTuple):
+    output: str
+    seconds: float
+    error: Optional[str]
+
+
+def load_manifest(path: str) -> List[Dict[str, Any]]:
+    with open(path, "rb") as f:
+        raw = f.read()
+    if path.endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:
+            raise ValueError("TOML manifests need Python 3.11 or newer, use JSON")
+        manifest = tomllib.loads(raw.decode("utf-8"))
+    else:
+        manifest = json.loads(raw)
+
+    if isinstance(manifest, list):
+        defaults, jobs = {}, manifest
+    else:
+        defaults = manifest.get("defaults", {})
+        jobs = manifest.get("jobs", manifest.get("job", []))
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    resolved = []
+    for i, job in enumerate(jobs):
+        job = dict(defaults, **job)
+        unknown = set(job) - set(JOB_OPTIONS) - set(JOB_FLAGS) - {"output"}
+        if unknown:
+            raise ValueError(
+                "job {}: unknown keys {}".format(i, ", ".join(sorted(unknown)))
+            )
+        if "output" not in job:
+            raise ValueError("job {}: missing output".format(i))
+        job["output"] = os.path.join(base_dir, job["output"])
+        if "vector_dir" in job:
+            job["vector_dir"] = os.path.join(base_dir, job["vector_dir"])
+        elif job.get("mode") == "vhdl_testbench":
+            # The output goes through stdout, so the generator cannot put the
+            # vector files next to it by itself
+            job["vector_dir"] = os.path.dirname(job["output"])
+        resolved.append(job)
+    return resolved
+
+
+def job_to_argv(job: Dict[str, Any]) -> List[str]:
+    argv = []
+    for key, option in JOB_OPTIONS.items():
+        if key in job:
+            value = job[key]
+            if key == "poly" and isinstance(value, int):
+                value = hex(value)
+            argv += [option, str(value)]
+    for key, (on, off) in JOB_FLAGS.items():
+        if key in job and (job[key] or off is not None):
+            argv.append(on if job[key] else off)
+    return argv
+
+
+def argparse_error(stderr: str) -> str:
+    # The message of the last "prog: error: ..." line argparse printed
+    lines = stderr.strip().splitlines()
+    if not lines:
+        return "invalid arguments"
+    return lines[-1].split(": error: ", 1)[-1]
+
+
+def run_job(job: Dict[str, Any]) -> JobResult:
+    output = job["output"]
+    tmp_path = "{}.{}.tmp".format(output, os.getpid())
+    stderr = io.StringIO()
+    start = time.perf_counter()
+    try:
+        # The generator writes to stdout by default, which keeps the temporary
+        # name out of the arguments recorded in the generated file. stderr is
+        # kept for the argparse message if the arguments are rejected
+        with open(tmp_path, "w") as f, contextlib.redirect_stdout(f):
+            with contextlib.redirect_stderr(stderr):
+                generate_main(job_to_argv(job))
+        os.replace(tmp_path, output)
+    except (Exception, SystemExit) as e:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        if isinstance(e, SystemExit):
+            message = argparse_error(stderr.getvalue())
+        else:
+            message = str(e)
+        return JobResult(output, time.perf_counter() - start, message)
+    sys.stderr.write(stderr.getvalue())
+    return JobResult(output, time.perf_counter() - start, None)
+
+
+def run_batch(
+    jobs: List[Dict[str, Any]], workers: Optional[int] = None
+) -> List[JobResult]:
+    if workers == 1 or len(jobs) <= 1:
+        return [run_job(job) for job in jobs]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run_job, jobs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="crcgen batch",
+        description="Generate many CRC implementations from a TOML or JSON manifest",
+    )
+    parser.add_argument("manifest", type=str, help="Manifest file (.toml or .json)")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true", help="Do not print the timing summary"
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        jobs = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    start = time.perf_counter()
+    results = run_batch(jobs, args.jobs)
+    elapsed = time.perf_counter() - start
+
+    failed = [result for result in results if result.error is not None]
+    if not args.quiet or failed:
+        for result in results:
+            status = "ok" if result.error is None else "FAILED: " + result.error
+            print(
+                "{:8.3f}s  {}  {}".format(result.seconds, result.output, status),
+                file=sys.stderr,
+            )
+        print(
+            "{} jobs, {} failed, {:.3f}s total ({:.3f}s wall)".format(
+                len(results),
+                len(failed),
+                sum(result.seconds for result in results),
+                elapsed,
+            ),
+            file=sys.stderr,
+        )
+    return 1 if failed else 0
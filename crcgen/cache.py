@@ -0,0 +1,259 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+from collections import OrderedDict
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from . import __version__
+from .crcgen import build_crc_matrices, build_crc_matrices_sweep, poly_to_int
+from .matrix import CrcMatrix
+
+Matrices = Tuple[Sequence[Sequence[int]], Sequence[Sequence[int]]]
+
+CACHE_MAGIC = b"CRCM"
+CACHE_FORMAT = 1
+# magic, format, CRC length, data width, reflect_input
+CACHE_HEADER = struct.Struct("<4sHII?")
+CACHE_SUFFIX = ".crcm"
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+DEFAULT_MEMORY_ENTRIES = 64
+
+
+def default_cache_dir() -> str:
+    directory = os.environ.get("CRCGEN_CACHE_DIR")
+    if directory:
+        return directory
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "crcgen")
+
+
+def cache_key(poly: Sequence[int], dwidth: int, reflect_input: bool) -> str:
+    params = "{}:{}:{:x}:{}:{}".format(
+        __version__, len(poly), poly_to_int(poly), dwidth, int(reflect_input)
+    )
+    return hashlib.sha256(params.encode("ascii")).hexdigest()
+
+
+def encode_matrices(length: int, reflect_input: bool, matrices: Matrices) -> bytes:
+    state_matrix, data_matrix = matrices
+    row_bytes = (length + 7) // 8
+    chunks = [
+        CACHE_HEADER.pack(
+            CACHE_MAGIC, CACHE_FORMAT, length, len(data_matrix), reflect_input
+        )
+    ]
+    for matrix in (state_matrix, data_matrix):
+        for row in CrcMatrix.coerce(matrix, length).rows:
+            chunks.append(row.to_bytes(row_bytes, "little"))
+    return b"".join(chunks)
+
+
+def decode_matrices(blob: bytes) -> Tuple[int, int, bool, Matrices]:
+    magic, version, length, dwidth, reflect_input = CACHE_HEADER.unpack_from(blob)
+    row_bytes = (length + 7) // 8
+    if (
+        magic != CACHE_MAGIC
+        or version != CACHE_FORMAT
+        or len(blob) != CACHE_HEADER.size + (length + dwidth) * row_bytes
+    ):
+        raise ValueError("Not a valid crcgen cache entry")
+
+    rows = []
+    for offset in range(CACHE_HEADER.size, len(blob), row_bytes):
+        row = int.from_bytes(blob[offset : offset + row_bytes], "little")
+        rows.append(row)
+    return (
+        length,
+        dwidth,
+        reflect_input,
+        (CrcMatrix(length, rows[:length]), CrcMatrix(length, rows[length:])),
+    )
+
+
+class MatrixCache:
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_size: int = DEFAULT_MAX_SIZE,
+        memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+    ):
+        self.directory = directory if directory is not None else default_cache_dir()
+        self.max_size = max_size
+        self.memory_entries = memory_entries
+        self._memo: "OrderedDict[str, Matrices]" = OrderedDict()
+        self.write_warned = False
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def get(
+        self, poly: Sequence[int], dwidth: int, reflect_input: bool
+    ) -> Optional[Matrices]:
+        key = cache_key(poly, dwidth, reflect_input)
+        if key in self._memo:
+            self._memo.move_to_end(key)
+            return self._memo[key]
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                blob = f.read()
+            length, cached_dwidth, cached_reflect, matrices = decode_matrices(blob)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, struct.error):
+            self._remove(path)
+            return None
+        if (length, cached_dwidth, cached_reflect) != (
+            len(poly),
+            dwidth,
+            reflect_input,
+        ):
+            return None
+
+        # Bump the modification time so eviction drops least recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._remember(key, matrices)
+        return matrices
+
+    def put(
+        self,
+        poly: Sequence[int],
+        dwidth: int,
+        reflect_input: bool,
+        matrices: Matrices,
+    ):
+        key = cache_key(poly, dwidth, reflect_input)
+        self._remember(key, matrices)
+
+        # An unwritable cache only costs the rebuild next time, it must not
+        # fail the generation
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        except OSError as e:
+            self._write_failed(e)
+            return
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(encode_matrices(len(poly), reflect_input, matrices))
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            self._remove(tmp_path)
+            self._write_failed(e)
+            return
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        self.evict()
+
+    def _write_failed(self, error: OSError):
+        if not self.write_warned:
+            self.write_warned = True
+            print("crcgen: not writing matrix cache: {}".format(error), file=sys.stderr)
+
+    def evict(self):
+        entries = []
+        total = 0
+        for path in self._entries():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+            total += stat.st_size
+        entries.sort()
+        for _, path, size in entries:
+            if total <= self.max_size:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        self._memo.clear()
+        for path in self._entries():
+            self._remove(path)
+
+    def build_crc_matrices(
+        self,
+        poly: Sequence[int],
+        dwidth: int,
+        reflect_input: bool = False,
+        method: str = "serial",
+        workers: Optional[int] = 1,
+    ) -> Matrices:
+        matrices = self.get(poly, dwidth, reflect_input)
+        if matrices is None:
+            matrices = build_crc_matrices(poly, dwidth, reflect_input, method, workers)
+            self.put(poly, dwidth, reflect_input, matrices)
+        return matrices
+
+    def build_crc_matrices_sweep(
+        self, poly: Sequence[int], dwidths: Iterable[int], reflect_input: bool = False
+    ) -> Iterator[Tuple[int, Matrices]]:
+        dwidths = sorted(set(dwidths))
+        cached = {}
+        for dwidth in dwidths:
+            matrices = self.get(poly, dwidth, reflect_input)
+            if matrices is not None:
+                cached[dwidth] = matrices
+
+        # Only the missing widths are swept, they come back in the same order
+        missing = build_crc_matrices_sweep(
+            poly, [w for w in dwidths if w not in cached], reflect_input
+        )
+        for dwidth in dwidths:
+            if dwidth in cached:
+                yield (dwidth, cached[dwidth])
+            else:
+                _, matrices = next(missing)
+                self.put(poly, dwidth, reflect_input, matrices)
+                yield (dwidth, matrices)
+
+    def _remember(self, key: str, matrices: Matrices):
+        self._memo[key] = matrices
+        self._memo.move_to_end(key)
+        while len(self._memo) > self.memory_entries:
+            self._memo.popitem(last=False)
+
+    def _entries(self) -> List[str]:
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return [
+            os.path.join(self.directory, name)
+            for name in names
+            if name.endswith(CACHE_SUFFIX)
+        ]
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
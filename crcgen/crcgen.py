@@ -15,37 +15,94 @@
 #
 
 import argparse
+import concurrent.futures
+import functools
+import os
 import sys
-from typing import Iterator, List, Sequence, Tuple
+from typing import (
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
+from .matrix import CrcMatrix, gf2_matrix_apply, gf2_matrix_multiply
+from .transform import StateTransform, feedback_fanin, vhdl_transform_lines
+from .xornet import (
+    XorNetwork,
+    flat_network,
+    matrix_rows,
+    share_xor_terms,
+    xor_gate_count,
+)
+
+try:
+    from . import gf2_numpy
+except ImportError:
+    gf2_numpy = None
 
-def lfsr_shift_bit(
-    poly: Sequence[int], cur_state: Sequence[int], data: int
-) -> List[int]:
 
-    next_state = list(cur_state)
-    state_msb = next_state[-1]
+class CrcParams(NamedTuple):
+    # Rocksoft model parameters. init and xorout are in the same bit order as
+    # the state register, and check is the CRC of b"123456789"
+    length: int
+    poly: int
+    init: int = 0
+    reflect_input: bool = True
+    reflect_output: bool = True
+    xorout: int = 0
+    check: Optional[int] = None
 
-    for j in range(len(cur_state) - 1, 0, -1):
-        if poly[j] != 0:
-            next_state[j] = next_state[j - 1] ^ state_msb ^ data
-        else:
-            next_state[j] = next_state[j - 1]
-    next_state[0] = state_msb ^ data
 
+def lfsr_shift_bit_int(poly: int, length: int, cur_state: int, data: int) -> int:
+    # Same LFSR as lfsr_shift_bit, with state bit i held in bit i of an int
+    feedback = ((cur_state >> (length - 1)) ^ data) & 1
+    next_state = (cur_state << 1) & ((1 << length) - 1)
+    if feedback:
+        next_state ^= poly | 1
     return next_state
 
 
+def lfsr_shift_serial_int(
+    poly: int, length: int, cur_state: int, data: int, dwidth: int
+) -> int:
+    # Data bits are shifted in LSB first, matching data[0] in lfsr_shift_serial
+    mask = (1 << length) - 1
+    taps = (poly | 1) & mask
+    msb = length - 1
+    next_state = cur_state
+    for i in range(dwidth):
+        feedback = ((next_state >> msb) ^ (data >> i)) & 1
+        next_state = (next_state << 1) & mask
+        if feedback:
+            next_state ^= taps
+    return next_state
+
+
+def lfsr_shift_bit(
+    poly: Sequence[int], cur_state: Sequence[int], data: int
+) -> List[int]:
+
+    length = len(cur_state)
+    next_state = lfsr_shift_bit_int(
+        poly_to_int(poly), length, poly_to_int(cur_state), data
+    )
+    return int_to_poly(length, next_state)
+
+
 def lfsr_shift_serial(
     poly: Sequence[int], cur_state: Sequence[int], data: Sequence[int]
 ) -> Sequence[int]:
 
-    next_state = list(cur_state)
-
-    for dbit in data:
-        next_state = lfsr_shift_bit(poly, next_state, dbit)
-
-    return next_state
+    length = len(cur_state)
+    next_state = lfsr_shift_serial_int(
+        poly_to_int(poly), length, poly_to_int(cur_state), poly_to_int(data), len(data)
+    )
+    return int_to_poly(length, next_state)
 
 
 def int_to_poly(length: int, poly: int) -> Sequence[int]:
@@ -74,105 +131,572 @@ def poly_to_str(poly: Sequence[int]) -> str:
     return ret
 
 
+def lfsr_transition_matrix(poly: int, length: int) -> List[int]:
+    # Column i is the state reached from state bit i after one zero data bit
+    return [lfsr_shift_bit_int(poly, length, 1 << i, 0) for i in range(length)]
+
+
+class LfsrPowers:
+    # The transition matrix A of one LFSR, its squarings A^(2^k) and the
+    # impulse responses of a data bit, all grown on demand so that they can
+    # be shared between data widths
+    __slots__ = ("length", "squares", "impulse")
+
+    def __init__(self, poly: int, length: int):
+        self.length = length
+        self.squares = [lfsr_transition_matrix(poly, length)]
+        self.impulse = [lfsr_shift_bit_int(poly, length, 0, 1)]
+
+    def square(self, k: int) -> List[int]:
+        while len(self.squares) <= k:
+            last = self.squares[-1]
+            self.squares.append(gf2_matrix_multiply(last, last))
+        return self.squares[k]
+
+    def power(self, exponent: int) -> List[int]:
+        result = [1 << i for i in range(self.length)]
+        k = 0
+        while exponent:
+            if exponent & 1:
+                result = gf2_matrix_multiply(self.square(k), result)
+            exponent >>= 1
+            k += 1
+        return result
+
+    def impulse_responses(self, count: int) -> List[int]:
+        # A data bit shifted in k bits before the end of the word leaves
+        # A^k * taps in the state, so the known responses double each step
+        impulse = self.impulse
+        while len(impulse) < count:
+            known = len(impulse)
+            if known & (known - 1) == 0:
+                power = self.square(known.bit_length() - 1)
+            else:
+                power = self.power(known)
+            impulse.extend(
+                gf2_matrix_apply(power, column) for column in impulse[: count - known]
+            )
+        return impulse
+
+    def columns(self, dwidth: int) -> Tuple[List[int], List[int]]:
+        state_columns = self.power(dwidth)
+        data_columns = (
+            self.impulse_responses(dwidth)[dwidth - 1 :: -1] if dwidth else []
+        )
+        return (state_columns, data_columns)
+
+    def matrices(
+        self, dwidth: int, reflect_input: bool = False
+    ) -> Tuple[CrcMatrix, CrcMatrix]:
+        return _columns_to_matrices(
+            self.length, *self.columns(dwidth), reflect_input=reflect_input
+        )
+
+
+def _build_crc_columns_serial(
+    poly: int, length: int, dwidth: int
+) -> Tuple[List[int], List[int]]:
+
+    state_columns = [
+        lfsr_shift_serial_int(poly, length, 1 << i, 0, dwidth) for i in range(length)
+    ]
+    data_columns = [
+        lfsr_shift_serial_int(poly, length, 0, 1 << i, dwidth) for i in range(dwidth)
+    ]
+    return (state_columns, data_columns)
+
+
+# Chunks per worker for the parallel serial build, so a slow worker does not
+# hold up the others
+COLUMN_CHUNKS_PER_WORKER = 4
+
+
+def _serial_column_chunk(chunk: Tuple[int, int, int, int, int]) -> List[int]:
+    # Impulse responses for columns start..stop-1 of the state columns
+    # followed by the data columns
+    poly, length, dwidth, start, stop = chunk
+    return [
+        (
+            lfsr_shift_serial_int(poly, length, 1 << i, 0, dwidth)
+            if i < length
+            else lfsr_shift_serial_int(poly, length, 0, 1 << (i - length), dwidth)
+        )
+        for i in range(start, stop)
+    ]
+
+
+def _build_crc_columns_parallel(
+    poly: int, length: int, dwidth: int, workers: Optional[int] = None
+) -> Tuple[List[int], List[int]]:
+
+    # Every column is an independent serial run of dwidth shifts, so the
+    # columns are split into contiguous chunks and joined back in order
+    total = length + dwidth
+    workers = workers or os.cpu_count() or 1
+    step = max(1, -(-total // (workers * COLUMN_CHUNKS_PER_WORKER)))
+    chunks = [
+        (poly, length, dwidth, start, min(start + step, total))
+        for start in range(0, total, step)
+    ]
+    if workers == 1 or len(chunks) == 1:
+        results = list(map(_serial_column_chunk, chunks))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_serial_column_chunk, chunks))
+    columns = [column for result in results for column in result]
+    return (columns[:length], columns[length:])
+
+
+def _build_crc_columns_matrix(
+    poly: int, length: int, dwidth: int
+) -> Tuple[List[int], List[int]]:
+
+    return LfsrPowers(poly, length).columns(dwidth)
+
+
+def _build_crc_columns_numpy(
+    poly: int, length: int, dwidth: int
+) -> Tuple[List[int], List[int]]:
+
+    if gf2_numpy is None:
+        # NumPy is optional, the pure-Python squaring gives the same result
+        return _build_crc_columns_matrix(poly, length, dwidth)
+
+    state_columns, data_columns = gf2_numpy.build_crc_columns(
+        lfsr_transition_matrix(poly, length),
+        lfsr_shift_bit_int(poly, length, 0, 1),
+        dwidth,
+    )
+    return (
+        gf2_numpy.unpack_columns(state_columns),
+        gf2_numpy.unpack_columns(data_columns),
+    )
+
+
+CRC_MATRIX_METHODS = {
+    "serial": _build_crc_columns_serial,
+    "matrix": _build_crc_columns_matrix,
+    "numpy": _build_crc_columns_numpy,
+}
+
+
 def build_crc_matrices(
-    poly: Sequence[int], dwidth: int, reflect_input: bool = False
-) -> Tuple[Sequence[Sequence[int]], Sequence[Sequence[int]]]:
-
-    propagate_state_bits = []
-    for i in range(len(poly)):
-        nulldata = [0] * dwidth
-        state = [0] * len(poly)
-        state[i] = 1
-        propagate_state_bits.append(lfsr_shift_serial(poly, state, nulldata))
-
-    propagate_data_bits = []
-    data_range = range(dwidth)
+    poly: Sequence[int],
+    dwidth: int,
+    reflect_input: bool = False,
+    method: str = "serial",
+    workers: Optional[int] = 1,
+) -> Tuple[CrcMatrix, CrcMatrix]:
+
+    # workers only applies to the serial method, None uses every CPU
+    length = len(poly)
+    if method == "serial" and workers != 1:
+        state_columns, data_columns = _build_crc_columns_parallel(
+            poly_to_int(poly), length, dwidth, workers
+        )
+    else:
+        state_columns, data_columns = CRC_MATRIX_METHODS[method](
+            poly_to_int(poly), length, dwidth
+        )
+    return _columns_to_matrices(length, state_columns, data_columns, reflect_input)
+
+
+def build_crc_matrices_sweep(
+    poly: Sequence[int], dwidths: Iterable[int], reflect_input: bool = False
+) -> Iterator[Tuple[int, Tuple[CrcMatrix, CrcMatrix]]]:
+
+    length = len(poly)
+    poly_int = poly_to_int(poly)
+
+    # Walk the widths upwards one data bit at a time: every step shifts the
+    # state columns once more, and the data columns of a narrower word are
+    # the most recent impulse responses of every wider one
+    dwidth = 0
+    state_columns = [1 << i for i in range(length)]
+    impulse: List[int] = []
+    for target in sorted(set(dwidths)):
+        while dwidth < target:
+            state_columns = [
+                lfsr_shift_bit_int(poly_int, length, column, 0)
+                for column in state_columns
+            ]
+            if impulse:
+                impulse.append(lfsr_shift_bit_int(poly_int, length, impulse[-1], 0))
+            else:
+                impulse.append(lfsr_shift_bit_int(poly_int, length, 0, 1))
+            dwidth += 1
+        data_columns = impulse[dwidth - 1 :: -1] if dwidth else []
+        yield (
+            dwidth,
+            _columns_to_matrices(length, state_columns, data_columns, reflect_input),
+        )
+
+
+def _columns_to_matrices(
+    length: int,
+    state_columns: Sequence[int],
+    data_columns: Sequence[int],
+    reflect_input: bool,
+) -> Tuple[CrcMatrix, CrcMatrix]:
+
+    propagate_state_bits = CrcMatrix(length, state_columns)
+
     # We will naturally reflect the input relative to the normal convention
     # for CRCs by going 0-up, reverse the data if not desired
     if not reflect_input:
-        data_range = reversed(data_range)
-    for i in data_range:
-        data = [0] * dwidth
-        data[i] = 1
-        nullstate = [0] * len(poly)
-        propagate_data_bits.append(lfsr_shift_serial(poly, nullstate, data))
+        data_columns = data_columns[::-1]
+    propagate_data_bits = CrcMatrix(length, data_columns)
 
     return (propagate_state_bits, propagate_data_bits)
 
 
-def gen_vhdl_package(
+def fold_init(state_matrix: Sequence[Sequence[int]], init: int) -> int:
+    # The state contribution of the first word only depends on init, so it
+    # is a constant that can be folded into the first-word equations
+    length = len(state_matrix)
+    return gf2_matrix_apply(CrcMatrix.coerce(state_matrix, length).rows, init)
+
+
+def emit_lines(func: Callable[..., Iterable[str]]) -> Callable[..., Iterator[str]]:
+    # Backends are written as generators of lines, this turns them into a
+    # stream of newline-terminated chunks that can be written out directly
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for line in func(*args, **kwargs):
+            yield line + "\n"
+
+    return wrapper
+
+
+def vhdl_next_state_lines(
+    length: int,
+    state_matrix: Sequence[Sequence[int]],
+    data_matrix: Sequence[Sequence[int]],
+) -> Iterator[str]:
+
+    state_rows = CrcMatrix.coerce(state_matrix, length).transpose()
+    data_rows = CrcMatrix.coerce(data_matrix, length).transpose()
+    for i in range(length):
+        terms = ["state({})".format(j) for j in state_rows.row_bits(i)]
+        terms += ["data({})".format(j) for j in data_rows.row_bits(i)]
+        yield "        next_state({}) := {};".format(i, " xor ".join(terms))
+
+
+def vhdl_xor(terms: Sequence[str], invert: bool = False) -> str:
+    # A constant one is folded in as an inverter, which is free in a LUT
+    if not terms:
+        return "'1'" if invert else "'0'"
+    expr = " xor ".join(terms)
+    if invert:
+        return "not ({})".format(expr) if len(terms) > 1 else "not " + expr
+    return expr
+
+
+def vhdl_first_state_lines(
+    length: int, first_state: int, data_matrix: Sequence[Sequence[int]]
+) -> Iterator[str]:
+
+    data_rows = CrcMatrix.coerce(data_matrix, length).transpose()
+    for i in range(length):
+        terms = ["data({})".format(j) for j in data_rows.row_bits(i)]
+        yield "        next_state({}) := {};".format(
+            i, vhdl_xor(terms, bool(first_state >> i & 1))
+        )
+
+
+def vhdl_output_terms(
+    length: int,
+    reflect_output: bool,
+    xorout: int,
+    output_matrix: Optional[Sequence[Sequence[int]]] = None,
+) -> List[str]:
+    # Output reflection is wiring and the final XOR is a set of inverters. An
+    # output transform of a transformed state is folded in as well
+    if output_matrix is None:
+        sources = [[i] for i in range(length)]
+    else:
+        rows = CrcMatrix.coerce(output_matrix, length).transpose()
+        sources = [list(rows.row_bits(i)) for i in range(length)]
+    terms = []
+    for i in range(length):
+        source = length - 1 - i if reflect_output else i
+        terms.append(
+            vhdl_xor(
+                ["state({})".format(j) for j in sources[source]],
+                bool(xorout >> i & 1),
+            )
+        )
+    return terms
+
+
+def vhdl_final_decl(name: str, length: int) -> str:
+    return "    function {}_final(state: std_logic_vector({} downto 0)) return std_logic_vector".format(
+        name, length - 1
+    )
+
+
+def vhdl_final_lines(
+    name: str,
+    params: CrcParams,
+    output_matrix: Optional[Sequence[Sequence[int]]] = None,
+) -> Iterator[str]:
+    yield vhdl_final_decl(name, params.length) + " is"
+    yield "        variable crc : std_logic_vector({} downto 0);".format(
+        params.length - 1
+    )
+    yield "    begin"
+    for i, term in enumerate(
+        vhdl_output_terms(
+            params.length, params.reflect_output, params.xorout, output_matrix
+        )
+    ):
+        yield "        crc({}) := {};".format(i, term)
+    yield "        return crc;"
+    yield "    end {}_final;".format(name)
+
+
+def vhdl_params_line(params: CrcParams) -> str:
+    digits = (params.length + 3) // 4
+    return "-- init: 0x{:0{d}X} reflect output: {} xorout: 0x{:0{d}X}".format(
+        params.init, params.reflect_output, params.xorout, d=digits
+    )
+
+
+@emit_lines
+def iter_vhdl_package(
     cmdline: str,
     name: str,
     poly: Sequence[int],
     dwidth: int,
     state_matrix: Sequence[Sequence[int]],
     data_matrix: Sequence[Sequence[int]],
-):
+    share_xor: bool = False,
+    params: Optional[CrcParams] = None,
+    transform: Optional[StateTransform] = None,
+    network: Optional[XorNetwork] = None,
+) -> Iterator[str]:
+
+    if transform is not None:
+        # The next state function runs on the transformed state
+        fanin_before = feedback_fanin(state_matrix)
+        state_matrix = transform.state_matrix
+        data_matrix = transform.data_matrix
+        fanin_after = feedback_fanin(state_matrix)
+    if share_xor:
+        # A network passed in must come from the same (transformed) matrices
+        rows = matrix_rows(state_matrix, data_matrix)
+        if network is None:
+            network = share_xor_terms(rows, len(poly) + dwidth)
+        flat_gates = xor_gate_count(flat_network(rows, len(poly) + dwidth))
 
-    lines = []
+    def term_name(var: int) -> str:
+        if var < len(poly):
+            return "state({})".format(var)
+        if var < len(poly) + dwidth:
+            return "data({})".format(var - len(poly))
+        return "shared({})".format(var - len(poly) - dwidth)
 
-    lines.append("----------------------------------------")
-    lines.append("-- Parallel CRC Calculation Package")
-    lines.append("-- CRC width:{} data width: {}".format(len(poly), dwidth))
-    lines.append(
-        "-- polynomial: {} (0x{:X})".format(poly_to_str(poly), poly_to_int(poly))
+    transform_decl = "    function {{}}_{{}}(state: std_logic_vector({} downto 0)) return std_logic_vector".format(
+        len(poly) - 1
     )
-    lines.append("-- Generated with crcgen")
-    lines.append("-- https://github.com/MegabytePhreak/crcgen")
-    lines.append("-- arguments: {}".format(cmdline))
-    lines.append("-- SPDX-License-Identifier: 0BSD")
-    lines.append("----------------------------------------")
-    lines.append("")
-    lines.append("library ieee;")
-    lines.append("use ieee.std_logic_1164.all;")
-    lines.append("")
-    lines.append("package {}_pkg is ".format(name))
-    lines.append("")
-    lines.append(
+    first_decl = "    function {}_first(data: std_logic_vector({} downto 0)) return std_logic_vector".format(
+        name, dwidth - 1
+    )
+
+    yield "----------------------------------------"
+    yield "-- Parallel CRC Calculation Package"
+    yield "-- CRC width:{} data width: {}".format(len(poly), dwidth)
+    yield "-- polynomial: {} (0x{:X})".format(poly_to_str(poly), poly_to_int(poly))
+    if params is not None:
+        yield vhdl_params_line(params)
+    yield "-- Generated with crcgen"
+    yield "-- https://github.com/MegabytePhreak/crcgen"
+    yield "-- arguments: {}".format(cmdline)
+    if transform is not None:
+        yield "-- state transform: next state works on T * state, see {}_in".format(
+            name
+        )
+        yield (
+            "-- feedback XOR fan-in: max {} total {} (untransformed max {} total {})".format(
+                max(fanin_after),
+                sum(fanin_after),
+                max(fanin_before),
+                sum(fanin_before),
+            )
+        )
+    if share_xor:
+        yield (
+            "-- XOR gates: {} ({} before sharing)".format(
+                xor_gate_count(network), flat_gates
+            )
+        )
+    yield "-- SPDX-License-Identifier: 0BSD"
+    yield "----------------------------------------"
+    yield ""
+    yield "library ieee;"
+    yield "use ieee.std_logic_1164.all;"
+    yield ""
+    yield "package {}_pkg is ".format(name)
+    yield ""
+    yield (
         "    function {}(state: std_logic_vector({} downto 0); data: std_logic_vector({} downto 0)) return std_logic_vector;".format(
             name, len(poly) - 1, dwidth - 1
         )
     )
-    lines.append("")
-    lines.append("end {}_pkg;".format(name))
-    lines.append("")
-    lines.append("library ieee;")
-    lines.append("use ieee.std_logic_1164.all;")
-    lines.append("")
-    lines.append("package body {}_pkg is".format(name))
-    lines.append("")
-    lines.append(
+    if params is not None:
+        yield first_decl + ";"
+        yield vhdl_final_decl(name, len(poly)) + ";"
+    if transform is not None:
+        yield transform_decl.format(name, "in") + ";"
+        yield transform_decl.format(name, "out") + ";"
+    yield ""
+    yield "end {}_pkg;".format(name)
+    yield ""
+    yield "library ieee;"
+    yield "use ieee.std_logic_1164.all;"
+    yield ""
+    yield "package body {}_pkg is".format(name)
+    yield ""
+    yield (
         "    function {}(state: std_logic_vector({} downto 0); data: std_logic_vector({} downto 0)) return std_logic_vector is".format(
             name, len(poly) - 1, dwidth - 1
         )
     )
-    lines.append(
+    yield (
         "        variable next_state : std_logic_vector({} downto 0);".format(
             len(poly) - 1
         )
     )
-    lines.append("    begin")
-    for i in range(len(poly)):
-        next_state = ""
-        first = True
-        for state_index, propagation in enumerate(state_matrix):
-            if propagation[i] != 0:
-                if first:
-                    next_state = "state({})".format(state_index)
-                    first = False
-                else:
-                    next_state += " xor state({})".format(state_index)
-        for data_index, propagation in enumerate(data_matrix):
-            if propagation[i] != 0:
-                next_state += " xor data({})".format(data_index)
-        lines.append("        next_state({}) := {};".format(i, next_state))
-    lines.append("        return next_state;")
-    lines.append("    end {};".format(name))
-    lines.append("")
-    lines.append("end {}_pkg;".format(name))
-    lines.append("")
-
-    return "\n".join(lines)
-
-
-PRESETS = {"CRC5-USB": (5, 0x5), "CRC32": (32, 0x04C11DB7)}
+    if share_xor and network.terms:
+        yield (
+            "        variable shared : std_logic_vector({} downto 0);".format(
+                len(network.terms) - 1
+            )
+        )
+    yield "    begin"
+    if share_xor:
+        for k, (a, b) in enumerate(network.terms):
+            yield (
+                "        shared({}) := {} xor {};".format(k, term_name(a), term_name(b))
+            )
+        for i, row in enumerate(network.rows):
+            yield (
+                "        next_state({}) := {};".format(
+                    i, " xor ".join(term_name(var) for var in row)
+                )
+            )
+    else:
+        yield from vhdl_next_state_lines(len(poly), state_matrix, data_matrix)
+    yield "        return next_state;"
+    yield "    end {};".format(name)
+    if params is not None:
+        # First word of a message, with the state fixed at init
+        init = params.init
+        if transform is not None:
+            init = gf2_matrix_apply(transform.forward.rows, init)
+        yield ""
+        yield first_decl + " is"
+        yield (
+            "        variable next_state : std_logic_vector({} downto 0);".format(
+                len(poly) - 1
+            )
+        )
+        yield "    begin"
+        yield from vhdl_first_state_lines(
+            len(poly), fold_init(state_matrix, init), data_matrix
+        )
+        yield "        return next_state;"
+        yield "    end {}_first;".format(name)
+        yield ""
+        yield from vhdl_final_lines(
+            name, params, transform.inverse if transform is not None else None
+        )
+    if transform is not None:
+        # Into and out of the transformed state, both outside the loop
+        for suffix, matrix in (("in", transform.forward), ("out", transform.inverse)):
+            yield ""
+            yield transform_decl.format(name, suffix) + " is"
+            yield (
+                "        variable result : std_logic_vector({} downto 0);".format(
+                    len(poly) - 1
+                )
+            )
+            yield "    begin"
+            yield from vhdl_transform_lines(len(poly), matrix)
+            yield "        return result;"
+            yield "    end {}_{};".format(name, suffix)
+    yield ""
+    yield "end {}_pkg;".format(name)
+
+
+def gen_vhdl_package(
+    cmdline: str,
+    name: str,
+    poly: Sequence[int],
+    dwidth: int,
+    state_matrix: Sequence[Sequence[int]],
+    data_matrix: Sequence[Sequence[int]],
+    share_xor: bool = False,
+    params: Optional[CrcParams] = None,
+    transform: Optional[StateTransform] = None,
+    network: Optional[XorNetwork] = None,
+) -> str:
+
+    return "".join(
+        iter_vhdl_package(
+            cmdline,
+            name,
+            poly,
+            dwidth,
+            state_matrix,
+            data_matrix,
+            share_xor,
+            params,
+            transform,
+            network,
+        )
+    )
+
+
+# Standard CRCs, with the parameters and check values of the CRC RevEng
+# catalogue. Entries can still be unpacked as (length, poly) from [:2]
+PRESETS = {
+    "CRC5-USB": CrcParams(5, 0x05, 0x1F, True, True, 0x1F, 0x19),
+    "CRC8-SMBUS": CrcParams(8, 0x07, 0x00, False, False, 0x00, 0xF4),
+    "CRC8-MAXIM": CrcParams(8, 0x31, 0x00, True, True, 0x00, 0xA1),
+    "CRC16-ARC": CrcParams(16, 0x8005, 0x0000, True, True, 0x0000, 0xBB3D),
+    "CRC16-CCITT-FALSE": CrcParams(16, 0x1021, 0xFFFF, False, False, 0x0000, 0x29B1),
+    "CRC16-KERMIT": CrcParams(16, 0x1021, 0x0000, True, True, 0x0000, 0x2189),
+    "CRC16-MODBUS": CrcParams(16, 0x8005, 0xFFFF, True, True, 0x0000, 0x4B37),
+    "CRC16-USB": CrcParams(16, 0x8005, 0xFFFF, True, True, 0xFFFF, 0xB4C8),
+    "CRC16-XMODEM": CrcParams(16, 0x1021, 0x0000, False, False, 0x0000, 0x31C3),
+    "CRC24-OPENPGP": CrcParams(
+        24, 0x864CFB, 0xB704CE, False, False, 0x000000, 0x21CF02
+    ),
+    "CRC32": CrcParams(32, 0x04C11DB7, 0xFFFFFFFF, True, True, 0xFFFFFFFF, 0xCBF43926),
+    "CRC32-BZIP2": CrcParams(
+        32, 0x04C11DB7, 0xFFFFFFFF, False, False, 0xFFFFFFFF, 0xFC891918
+    ),
+    "CRC32-MPEG2": CrcParams(
+        32, 0x04C11DB7, 0xFFFFFFFF, False, False, 0x00000000, 0x0376E6E7
+    ),
+    "CRC32C": CrcParams(32, 0x1EDC6F41, 0xFFFFFFFF, True, True, 0xFFFFFFFF, 0xE3069283),
+    "CRC64-ECMA": CrcParams(
+        64,
+        0x42F0E1EBA9EA3693,
+        0x0000000000000000,
+        False,
+        False,
+        0x0000000000000000,
+        0x6C40DF5F0B497347,
+    ),
+    "CRC64-XZ": CrcParams(
+        64,
+        0x42F0E1EBA9EA3693,
+        0xFFFFFFFFFFFFFFFF,
+        True,
+        True,
+        0xFFFFFFFFFFFFFFFF,
+        0x995DC9BBDF1939FA,
+    ),
+}
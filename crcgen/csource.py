@@ -0,0 +1,252 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+# C backend. The same state and data matrices as the HDL are turned into a
+# C function that advances the CRC state by one W-bit word per call, either
+# as one masked parity per output bit or as byte-indexed slice tables. The
+# state and word use the same bit numbering as the VHDL, so the testbench
+# vector files check both. Compiling with -DCRCGEN_BENCHMARK adds a main()
+# that checks vector files and measures throughput.
+
+from typing import Iterator, List, Optional, Sequence
+
+from .crcgen import CrcParams, emit_lines, fold_init, poly_to_int, poly_to_str
+from .matrix import CrcMatrix
+
+C_STYLES = ("table", "parity")
+MAX_C_WIDTH = 64
+
+
+def c_type(bits: int) -> str:
+    for size in (8, 16, 32, 64):
+        if bits <= size:
+            return "uint{}_t".format(size)
+    raise ValueError("{} bits do not fit in a C integer type".format(bits))
+
+
+def c_literal(value: int, bits: int) -> str:
+    suffix = "ull" if bits > 32 else "u"
+    return "0x{:0{}X}{}".format(value, (bits + 3) // 4, suffix)
+
+
+def slice_tables(
+    length: int,
+    state_matrix: Sequence[Sequence[int]],
+    data_matrix: Sequence[Sequence[int]],
+) -> List[List[int]]:
+    # One table per byte of the state and then of the data word, entry v
+    # being the contribution of that byte holding v. Bits past the width
+    # of the last byte of each are ignored
+    columns = list(CrcMatrix.coerce(state_matrix, length).rows)
+    columns += [0] * (-len(columns) % 8)
+    columns += CrcMatrix.coerce(data_matrix, length).rows
+    columns += [0] * (-len(columns) % 8)
+    tables = []
+    for offset in range(0, len(columns), 8):
+        table = [0]
+        for column in columns[offset : offset + 8]:
+            table += [entry ^ column for entry in table]
+        tables.append(table)
+    return tables
+
+
+@emit_lines
+def iter_c_source(
+    cmdline: str,
+    name: str,
+    poly: Sequence[int],
+    dwidth: int,
+    state_matrix: Sequence[Sequence[int]],
+    data_matrix: Sequence[Sequence[int]],
+    style: str = "table",
+    params: Optional[CrcParams] = None,
+) -> Iterator[str]:
+
+    if style not in C_STYLES:
+        raise ValueError("style must be one of {}".format(", ".join(C_STYLES)))
+    length = len(poly)
+    state_t = c_type(length)
+    data_t = c_type(dwidth)
+    state_bytes = (length + 7) // 8
+    data_bytes = (dwidth + 7) // 8
+    state_rows = CrcMatrix.coerce(state_matrix, length).transpose()
+    data_rows = CrcMatrix.coerce(data_matrix, length).transpose()
+
+    def body(constant: Optional[int]) -> Iterator[str]:
+        # constant replaces the state terms for the first word
+        if style == "table":
+            terms = []
+            if constant is None:
+                terms += [
+                    "{}_table[{}][(state >> {}) & 0xFF]".format(name, k, 8 * k)
+                    for k in range(state_bytes)
+                ]
+            else:
+                terms.append(c_literal(constant, length))
+            terms += [
+                "{}_table[{}][(data >> {}) & 0xFF]".format(name, state_bytes + k, 8 * k)
+                for k in range(data_bytes)
+            ]
+            yield "    return ({})({});".format(state_t, "\n        ^ ".join(terms))
+            return
+        yield "    {} next = {};".format(
+            state_t, "0" if constant is None else c_literal(constant, length)
+        )
+        for i in range(length):
+            parities = []
+            if constant is None and state_rows.rows[i]:
+                parities.append(
+                    "{}_parity(state & {})".format(
+                        name, c_literal(state_rows.rows[i], length)
+                    )
+                )
+            if data_rows.rows[i]:
+                parities.append(
+                    "{}_parity(data & {})".format(
+                        name, c_literal(data_rows.rows[i], dwidth)
+                    )
+                )
+            if parities:
+                yield "    next ^= ({})({}) << {};".format(
+                    state_t, " ^ ".join(parities), i
+                )
+        yield "    return next;"
+
+    yield "/*"
+    yield " * Parallel CRC Calculation, {} style".format(style)
+    yield " * CRC width:{} data width: {}".format(length, dwidth)
+    yield " * polynomial: {} (0x{:X})".format(poly_to_str(poly), poly_to_int(poly))
+    if params is not None:
+        digits = (length + 3) // 4
+        yield " * init: 0x{:0{d}X} reflect output: {} xorout: 0x{:0{d}X}".format(
+            params.init, params.reflect_output, params.xorout, d=digits
+        )
+    yield " * Generated with crcgen"
+    yield " * https://github.com/MegabytePhreak/crcgen"
+    yield " * arguments: {}".format(cmdline)
+    yield " * SPDX-License-Identifier: 0BSD"
+    yield " *"
+    yield " * Bit i of state and data is state(i) and data(i) of the VHDL package."
+    yield " */"
+    yield ""
+    yield "#include <stdint.h>"
+    yield ""
+    if style == "table":
+        tables = slice_tables(length, state_matrix, data_matrix)
+        yield "static const {} {}_table[{}][256] = {{".format(
+            state_t, name, len(tables)
+        )
+        for table in tables:
+            yield "    {"
+            for row in range(0, 256, 8):
+                yield "        {},".format(
+                    ", ".join(
+                        c_literal(entry, length) for entry in table[row : row + 8]
+                    )
+                )
+            yield "    },"
+        yield "};"
+    else:
+        yield "static inline unsigned {}_parity(uint64_t x)".format(name)
+        yield "{"
+        yield "#if defined(__GNUC__)"
+        yield "    return (unsigned)__builtin_parityll(x);"
+        yield "#else"
+        yield "    x ^= x >> 32;"
+        yield "    x ^= x >> 16;"
+        yield "    x ^= x >> 8;"
+        yield "    x ^= x >> 4;"
+        yield "    return (0x6996u >> (x & 0xF)) & 1u;"
+        yield "#endif"
+        yield "}"
+    yield ""
+    yield "{} {}({} state, {} data)".format(state_t, name, state_t, data_t)
+    yield "{"
+    yield from body(None)
+    yield "}"
+    if params is not None:
+        # First word with the state fixed at init, and the finalized CRC
+        yield ""
+        yield "{} {}_first({} data)".format(state_t, name, data_t)
+        yield "{"
+        yield from body(fold_init(state_matrix, params.init))
+        yield "}"
+        yield ""
+        yield "{} {}_final({} state)".format(state_t, name, state_t)
+        yield "{"
+        if params.reflect_output:
+            yield "    {} crc = 0;".format(state_t)
+            yield "    for (unsigned i = 0; i < {}; i++) {{".format(length)
+            yield "        crc |= ({})((state >> i) & 1u) << ({} - i);".format(
+                state_t, length - 1
+            )
+            yield "    }"
+        else:
+            yield "    {} crc = state;".format(state_t)
+        yield "    return crc ^ {};".format(c_literal(params.xorout, length))
+        yield "}"
+    yield ""
+    yield "#ifdef CRCGEN_BENCHMARK"
+    yield "#include <stdio.h>"
+    yield "#include <stdlib.h>"
+    yield "#include <time.h>"
+    yield ""
+    yield "/* Check against vector files: {} [stimulus expected] [words] */".format(
+        name
+    )
+    yield "int main(int argc, char **argv)"
+    yield "{"
+    yield "    unsigned long errors = 0, vectors = 0;"
+    yield "    if (argc >= 3) {"
+    yield '        FILE *stimulus = fopen(argv[1], "r");'
+    yield '        FILE *expected = fopen(argv[2], "r");'
+    yield "        unsigned long long state, data, next;"
+    yield "        if (!stimulus || !expected) {"
+    yield '            perror("fopen");'
+    yield "            return 2;"
+    yield "        }"
+    yield '        while (fscanf(stimulus, "%llx %llx", &state, &data) == 2'
+    yield '               && fscanf(expected, "%llx", &next) == 1) {'
+    yield "            if ({}(({}) state, ({}) data) != ({}) next) {{".format(
+        name, state_t, data_t, state_t
+    )
+    yield "                if (errors < 10) {"
+    yield '                    fprintf(stderr, "mismatch at vector %lu\\n", vectors);'
+    yield "                }"
+    yield "                errors++;"
+    yield "            }"
+    yield "            vectors++;"
+    yield "        }"
+    yield '        printf("%lu vectors, %lu errors\\n", vectors, errors);'
+    yield "    }"
+    yield ""
+    yield "    unsigned long words = argc >= 4 ? strtoul(argv[3], NULL, 0) : 10000000ul;"
+    yield "    {} state = 0;".format(state_t)
+    yield "    {} data = ({}) 0x0123456789ABCDEFull;".format(data_t, data_t)
+    yield "    clock_t start = clock();"
+    yield "    for (unsigned long i = 0; i < words; i++) {"
+    yield "        state = {}(state, data);".format(name)
+    yield "        data += ({}) 0x9E3779B97F4A7C15ull;".format(data_t)
+    yield "    }"
+    yield "    double seconds = (double)(clock() - start) / CLOCKS_PER_SEC;"
+    yield '    printf("%lu words in %.3f s, %.1f MB/s (state %llx)\\n", words, seconds,'
+    yield "           seconds > 0 ? words * {}.0 / 8 / seconds / 1e6 : 0.0,".format(
+        dwidth
+    )
+    yield "           (unsigned long long) state);"
+    yield "    return errors != 0;"
+    yield "}"
+    yield "#endif"
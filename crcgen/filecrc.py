@@ -0,0 +1,228 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+# CRC of files and streams. Files are memory-mapped a chunk at a time and the
+# chunks are processed in a process pool, each starting from a zero state.
+# The chunk states are then merged in order with SoftwareCrc.combine_state.
+
+import argparse
+import concurrent.futures
+import mmap
+import os
+import stat
+import sys
+from typing import BinaryIO, Dict, Iterable, Optional, Sequence, Tuple
+
+from .crcgen import PRESETS, CrcParams, int_to_poly
+from .software import SoftwareCrc
+
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+STREAM_BLOCK_SIZE = 1024 * 1024
+
+# Constructor arguments for SoftwareCrc, which is rebuilt in each worker
+CrcArgs = Tuple[Tuple[int, ...], bool, bool, int, int, int, bool]
+Chunk = Tuple[CrcArgs, str, int, int]
+
+_worker_crcs: Dict[CrcArgs, SoftwareCrc] = {}
+
+
+def crc_args(crc: SoftwareCrc) -> CrcArgs:
+    return (
+        tuple(crc.poly_bits),
+        crc.reflect_input,
+        crc.reflect_output,
+        crc.init,
+        crc.xorout,
+        crc.slices,
+        crc.native,
+    )
+
+
+def _chunk_state(args: Chunk) -> int:
+    params, path, offset, length = args
+    crc = _worker_crcs.get(params)
+    if crc is None:
+        crc = _worker_crcs[params] = SoftwareCrc(*params)
+    with open(path, "rb") as f:
+        with mmap.mmap(
+            f.fileno(), length, access=mmap.ACCESS_READ, offset=offset
+        ) as mapped:
+            return crc.update(0, mapped)
+
+
+def file_crc(
+    path: str,
+    crc: SoftwareCrc,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> int:
+    info = os.stat(path)
+    if not stat.S_ISREG(info.st_mode):
+        # Pipes and devices have no usable size and can't be mapped
+        with open(path, "rb") as f:
+            return stream_crc(f, crc)
+    size = info.st_size
+    if size == 0:
+        return crc.crc(b"")
+
+    # mmap offsets have to be a multiple of the allocation granularity
+    granularity = mmap.ALLOCATIONGRANULARITY
+    chunk_size = max(granularity, chunk_size - chunk_size % granularity)
+    params = crc_args(crc)
+    chunks = [
+        (params, path, offset, min(chunk_size, size - offset))
+        for offset in range(0, size, chunk_size)
+    ]
+
+    if workers == 1 or len(chunks) == 1:
+        return _merge_chunks(crc, chunks, map(_chunk_state, chunks))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        return _merge_chunks(crc, chunks, executor.map(_chunk_state, chunks))
+
+
+def _merge_chunks(
+    crc: SoftwareCrc, chunks: Sequence[Chunk], states: Iterable[int]
+) -> int:
+    state = crc.init
+    for (_, _, _, length), chunk_state in zip(chunks, states):
+        state = crc.combine_state(state, chunk_state, length)
+    return crc.finalize(state)
+
+
+def stream_crc(
+    stream: BinaryIO, crc: SoftwareCrc, block_size: int = STREAM_BLOCK_SIZE
+) -> int:
+    state = crc.init
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        state = crc.update(state, block)
+    return crc.finalize(state)
+
+
+def main(argv=None):
+    def auto_int(x):
+        return int(x, 0)
+
+    parser = argparse.ArgumentParser(
+        prog="crcgen file", description="Compute the CRC of files"
+    )
+    parser.add_argument(
+        "files", nargs="+", type=str, help="Files to checksum, - for stdin"
+    )
+    poly_group = parser.add_mutually_exclusive_group()
+    poly_group.add_argument(
+        "--preset",
+        type=str,
+        choices=PRESETS,
+        default=None,
+        help="Predefined CRC polynomial to use",
+    )
+    poly_group.add_argument(
+        "-p",
+        "--poly",
+        type=auto_int,
+        default=None,
+        help="CRC polynominal in normal (non-reversed, non-reciprocal) form",
+    )
+    parser.add_argument(
+        "-l",
+        "--length",
+        type=int,
+        default=None,
+        help="Length of the CRC polynomial in bits",
+    )
+    parser.add_argument(
+        "-r",
+        "--reflect-input",
+        help="Reflect input data before processing (Default True)",
+        action="store_true",
+        default=None,
+    )
+    parser.add_argument(
+        "-R",
+        "--no-reflect-input",
+        help="Do not reflect input data before processing",
+        action="store_false",
+        dest="reflect_input",
+    )
+    parser.add_argument(
+        "--reflect-output",
+        action="store_true",
+        default=None,
+        help="Reflect the CRC before the final XOR (Default: same as input)",
+    )
+    parser.add_argument(
+        "--no-reflect-output",
+        action="store_false",
+        dest="reflect_output",
+        help="Do not reflect the CRC before the final XOR",
+    )
+    parser.add_argument(
+        "--init", type=auto_int, default=None, help="Initial CRC state (Default 0)"
+    )
+    parser.add_argument(
+        "--xorout", type=auto_int, default=None, help="Final XOR value (Default 0)"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Bytes per parallel chunk (Default {})".format(DEFAULT_CHUNK_SIZE),
+    )
+    args = parser.parse_args(argv)
+
+    # Explicit options override the preset parameters
+    if args.preset is not None:
+        preset = PRESETS[args.preset]
+    elif args.length is None or args.poly is None:
+        parser.error(
+            "Need to specify both polynominal (-p) and length (-l) or use preset (--preset)"
+        )
+    else:
+        reflect_input = True if args.reflect_input is None else args.reflect_input
+        preset = CrcParams(args.length, args.poly, 0, reflect_input, reflect_input)
+    params = preset._replace(
+        **{
+            key: getattr(args, key)
+            for key in ("reflect_input", "reflect_output", "init", "xorout")
+            if getattr(args, key) is not None
+        }
+    )
+    length = params.length
+    crc = SoftwareCrc(
+        int_to_poly(length, params.poly),
+        params.reflect_input,
+        params.reflect_output,
+        params.init,
+        params.xorout,
+    )
+
+    digits = (length + 3) // 4
+    for path in args.files:
+        if path == "-":
+            value = stream_crc(sys.stdin.buffer, crc)
+        else:
+            value = file_crc(path, crc, args.jobs, args.chunk_size)
+        print("0x{:0{}X}  {}".format(value, digits, path))
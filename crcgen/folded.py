@@ -0,0 +1,338 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+# Folded CRC for wide buses. A W-bit word is split into K lanes of w = W / K
+# bits. Each lane runs the w-bit data matrix on its own, from a zero state,
+# and the lane results are merged by advancing each one over the lanes sent
+# after it:
+#
+#   next = A^W * state + sum over lanes of A^(w * later lanes) * D_w * lane
+#
+# The lane functions only see data, so they can be registered ahead of the
+# combine stage, which leaves the combine as the only logic in the state
+# feedback loop. That costs LUTs over the flat function but shortens the
+# critical path. The drop-in function of the package does not register
+# anything, so its loop is as deep as lanes and combine together.
+
+from typing import Iterator, List, NamedTuple, Optional, Sequence
+
+from .crcgen import (
+    CrcParams,
+    LfsrPowers,
+    emit_lines,
+    fold_init,
+    poly_to_int,
+    poly_to_str,
+    vhdl_final_decl,
+    vhdl_final_lines,
+    vhdl_params_line,
+    vhdl_xor,
+)
+from .matrix import CrcMatrix, gf2_matrix_apply
+from .stats import EquationStats, lut_count, lut_depth
+
+
+class FoldedPlan(NamedTuple):
+    dwidth: int
+    lane_width: int
+    state_matrix: CrcMatrix
+    lane_matrix: CrcMatrix
+    # combine[l] advances the result of lane l, lane l holding data bits
+    # l * lane_width up to (l + 1) * lane_width - 1
+    combine: List[CrcMatrix]
+
+    @property
+    def lanes(self) -> int:
+        return len(self.combine)
+
+
+class FoldedStats(NamedTuple):
+    lane_fanin: List[int]
+    combine_fanin: List[int]
+    xor_terms: int
+    max_fanin: int
+    lut6: int
+    # LUT levels of one lane and of the combine stage, which is all that is
+    # left in the state feedback loop when the lanes are registered
+    lane_depth: int
+    combine_depth: int
+
+    @property
+    def depth(self) -> int:
+        return self.lane_depth + self.combine_depth
+
+
+def lane_order(lanes: int, reflect_input: bool) -> List[int]:
+    # Lanes in transmission order: from the bottom of the word for reflected
+    # input and from the top for non-reflected input
+    order = list(range(lanes))
+    return order if reflect_input else order[::-1]
+
+
+def build_folded(
+    poly: Sequence[int], dwidth: int, lanes: int, reflect_input: bool = False
+) -> FoldedPlan:
+
+    if lanes < 1 or dwidth % lanes != 0:
+        raise ValueError(
+            "data width {} does not split into {} lanes".format(dwidth, lanes)
+        )
+    length = len(poly)
+    lane_width = dwidth // lanes
+    powers = LfsrPowers(poly_to_int(poly), length)
+    lane_matrix = powers.matrices(lane_width, reflect_input)[1]
+    combine: List[Optional[CrcMatrix]] = [None] * lanes
+    for sent, lane in enumerate(lane_order(lanes, reflect_input)):
+        later = lanes - 1 - sent
+        combine[lane] = CrcMatrix(length, powers.power(later * lane_width))
+    return FoldedPlan(
+        dwidth,
+        lane_width,
+        CrcMatrix(length, powers.power(dwidth)),
+        lane_matrix,
+        combine,
+    )
+
+
+def folded_next_state(plan: FoldedPlan, state: int, data: int) -> int:
+    mask = (1 << plan.lane_width) - 1
+    result = gf2_matrix_apply(plan.state_matrix.rows, state)
+    for lane, combine in enumerate(plan.combine):
+        lane_data = data >> (lane * plan.lane_width) & mask
+        partial = gf2_matrix_apply(plan.lane_matrix.rows, lane_data)
+        result ^= gf2_matrix_apply(combine.rows, partial)
+    return result
+
+
+def folded_stats(plan: FoldedPlan) -> FoldedStats:
+    length = len(plan.state_matrix)
+    lane_rows = plan.lane_matrix.transpose()
+    state_rows = plan.state_matrix.transpose()
+    combine_rows = [combine.transpose() for combine in plan.combine]
+    lane_fanin = [lane_rows.row_popcount(i) for i in range(length)]
+    combine_fanin = [
+        state_rows.row_popcount(i) + sum(rows.row_popcount(i) for rows in combine_rows)
+        for i in range(length)
+    ]
+    return FoldedStats(
+        lane_fanin,
+        combine_fanin,
+        plan.lanes * sum(lane_fanin) + sum(combine_fanin),
+        max(lane_fanin + combine_fanin),
+        plan.lanes * sum(lut_count(f) for f in lane_fanin)
+        + sum(lut_count(f) for f in combine_fanin),
+        max(lut_depth(f) for f in lane_fanin),
+        max(lut_depth(f) for f in combine_fanin),
+    )
+
+
+def folded_equation_stats(plan: FoldedPlan) -> EquationStats:
+    # The drop-in function is lanes and combine without registers between
+    stats = folded_stats(plan)
+    return EquationStats(
+        plan.dwidth,
+        stats.combine_fanin,
+        stats.xor_terms,
+        stats.max_fanin,
+        stats.lut6,
+        stats.depth,
+        "folded",
+    )
+
+
+def format_comparison(flat: EquationStats, folded: FoldedStats) -> List[str]:
+    lines = [
+        "{:8} {:>10} {:>10} {:>8} {:>6} {:>10}".format(
+            "", "xor_terms", "max_fanin", "lut6", "depth", "loop_depth"
+        )
+    ]
+    lines.append(
+        "{:8} {:10d} {:10d} {:8d} {:6d} {:10d}".format(
+            "flat", flat.xor_terms, flat.max_fanin, flat.lut6, flat.depth, flat.depth
+        )
+    )
+    lines.append(
+        "{:8} {:10d} {:10d} {:8d} {:6d} {:10d}".format(
+            "folded",
+            folded.xor_terms,
+            folded.max_fanin,
+            folded.lut6,
+            folded.depth,
+            folded.combine_depth,
+        )
+    )
+    return lines
+
+
+@emit_lines
+def iter_vhdl_folded_package(
+    cmdline: str,
+    name: str,
+    poly: Sequence[int],
+    plan: FoldedPlan,
+    flat: Optional[EquationStats] = None,
+    params: Optional[CrcParams] = None,
+) -> Iterator[str]:
+
+    length = len(poly)
+    lanes = plan.lanes
+    lane_width = plan.lane_width
+
+    lane_decl = "    function {}_lane(data: std_logic_vector({} downto 0)) return std_logic_vector".format(
+        name, lane_width - 1
+    )
+    combine_decl = "    function {}_combine(state: std_logic_vector({} downto 0); partial: std_logic_vector({} downto 0)) return std_logic_vector".format(
+        name, length - 1, lanes * length - 1
+    )
+    decl = "    function {}(state: std_logic_vector({} downto 0); data: std_logic_vector({} downto 0)) return std_logic_vector".format(
+        name, length - 1, plan.dwidth - 1
+    )
+    combine_first_decl = "    function {}_combine_first(partial: std_logic_vector({} downto 0)) return std_logic_vector".format(
+        name, lanes * length - 1
+    )
+    first_decl = "    function {}_first(data: std_logic_vector({} downto 0)) return std_logic_vector".format(
+        name, plan.dwidth - 1
+    )
+    state_rows = plan.state_matrix.transpose()
+    combine_rows = [combine.transpose() for combine in plan.combine]
+
+    def combine_lines(first_state: Optional[int]) -> Iterator[str]:
+        # With first_state the state terms are the constant init folds into
+        for i in range(length):
+            terms = []
+            if first_state is None:
+                terms += ["state({})".format(j) for j in state_rows.row_bits(i)]
+            for lane, rows in enumerate(combine_rows):
+                terms += [
+                    "partial({})".format(lane * length + j) for j in rows.row_bits(i)
+                ]
+            invert = first_state is not None and bool(first_state >> i & 1)
+            yield "        next_state({}) := {};".format(i, vhdl_xor(terms, invert))
+
+    def lane_calls() -> Iterator[str]:
+        for lane in range(lanes):
+            yield "        partial({} downto {}) := {}_lane(data({} downto {}));".format(
+                (lane + 1) * length - 1,
+                lane * length,
+                name,
+                (lane + 1) * lane_width - 1,
+                lane * lane_width,
+            )
+
+    yield "----------------------------------------"
+    yield "-- Folded Parallel CRC Calculation Package"
+    yield "-- CRC width:{} data width: {} in {} lanes of {} bits".format(
+        length, plan.dwidth, lanes, lane_width
+    )
+    yield "-- polynomial: {} (0x{:X})".format(poly_to_str(poly), poly_to_int(poly))
+    if params is not None:
+        yield vhdl_params_line(params)
+    yield "-- Generated with crcgen"
+    yield "-- https://github.com/MegabytePhreak/crcgen"
+    yield "-- arguments: {}".format(cmdline)
+    if flat is not None:
+        yield "--"
+        for line in format_comparison(flat, folded_stats(plan)):
+            yield "-- " + line
+        yield "-- loop_depth assumes the {}_lane results are registered ahead of".format(
+            name
+        )
+        yield "-- {}_combine. {}(state, data) is purely combinational, so its".format(
+            name, name
+        )
+        yield "-- state feedback loop has the full depth"
+    yield "-- SPDX-License-Identifier: 0BSD"
+    yield "----------------------------------------"
+    yield ""
+    yield "library ieee;"
+    yield "use ieee.std_logic_1164.all;"
+    yield ""
+    yield "package {}_pkg is ".format(name)
+    yield ""
+    yield lane_decl + ";"
+    yield combine_decl + ";"
+    yield decl + ";"
+    if params is not None:
+        yield combine_first_decl + ";"
+        yield first_decl + ";"
+        yield vhdl_final_decl(name, length) + ";"
+    yield ""
+    yield "end {}_pkg;".format(name)
+    yield ""
+    yield "library ieee;"
+    yield "use ieee.std_logic_1164.all;"
+    yield ""
+    yield "package body {}_pkg is".format(name)
+    yield ""
+    yield lane_decl + " is"
+    yield "        variable partial : std_logic_vector({} downto 0);".format(length - 1)
+    yield "    begin"
+    lane_rows = plan.lane_matrix.transpose()
+    for i in range(length):
+        terms = ["data({})".format(j) for j in lane_rows.row_bits(i)]
+        yield "        partial({}) := {};".format(i, vhdl_xor(terms))
+    yield "        return partial;"
+    yield "    end {}_lane;".format(name)
+    yield ""
+    yield combine_decl + " is"
+    yield (
+        "        variable next_state : std_logic_vector({} downto 0);".format(
+            length - 1
+        )
+    )
+    yield "    begin"
+    yield from combine_lines(None)
+    yield "        return next_state;"
+    yield "    end {}_combine;".format(name)
+    yield ""
+    yield decl + " is"
+    yield (
+        "        variable partial : std_logic_vector({} downto 0);".format(
+            lanes * length - 1
+        )
+    )
+    yield "    begin"
+    yield from lane_calls()
+    yield "        return {}_combine(state, partial);".format(name)
+    yield "    end {};".format(name)
+    if params is not None:
+        yield ""
+        yield combine_first_decl + " is"
+        yield (
+            "        variable next_state : std_logic_vector({} downto 0);".format(
+                length - 1
+            )
+        )
+        yield "    begin"
+        yield from combine_lines(fold_init(plan.state_matrix, params.init))
+        yield "        return next_state;"
+        yield "    end {}_combine_first;".format(name)
+        yield ""
+        yield first_decl + " is"
+        yield (
+            "        variable partial : std_logic_vector({} downto 0);".format(
+                lanes * length - 1
+            )
+        )
+        yield "    begin"
+        yield from lane_calls()
+        yield "        return {}_combine_first(partial);".format(name)
+        yield "    end {}_first;".format(name)
+    if params is not None:
+        yield ""
+        yield from vhdl_final_lines(name, params)
+    yield ""
+    yield "end {}_pkg;".format(name)
@@ -0,0 +1,110 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+# GF(2) matrix operations on packed uint64 NumPy arrays. Matrices are stored
+# one column per array row, with column bit i in bit i % 64 of word i // 64,
+# matching the packed-int columns used by crcgen.crcgen.
+
+from typing import List, Sequence, Tuple
+
+import numpy
+
+
+def pack_columns(columns: Sequence[int], length: int) -> numpy.ndarray:
+    words = (length + 63) // 64
+    packed = numpy.zeros((len(columns), words), dtype="<u8")
+    for i, column in enumerate(columns):
+        for word in range(words):
+            packed[i, word] = (column >> (64 * word)) & 0xFFFFFFFFFFFFFFFF
+    return packed
+
+
+def unpack_columns(packed: numpy.ndarray) -> List[int]:
+    return [int.from_bytes(column.tobytes(), "little") for column in packed]
+
+
+def column_bits(packed: numpy.ndarray, length: int) -> numpy.ndarray:
+    as_bytes = numpy.ascontiguousarray(packed, dtype="<u8").view(numpy.uint8)
+    return numpy.unpackbits(as_bytes, axis=1, bitorder="little")[:, :length]
+
+
+def matrix_multiply(a: numpy.ndarray, b: numpy.ndarray) -> numpy.ndarray:
+    # Column c of a * b is the XOR of the columns of a selected by column c of b
+    selected = column_bits(b, len(a)).astype(bool)
+    terms = numpy.where(selected[:, :, numpy.newaxis], a[numpy.newaxis, :, :], 0)
+    return numpy.bitwise_xor.reduce(terms, axis=1)
+
+
+def matrix_power(matrix: numpy.ndarray, exponent: int) -> numpy.ndarray:
+    length = len(matrix)
+    result = pack_columns([1 << i for i in range(length)], length)
+    power = matrix
+    while exponent:
+        if exponent & 1:
+            result = matrix_multiply(power, result)
+        exponent >>= 1
+        if exponent:
+            power = matrix_multiply(power, power)
+    return result
+
+
+def build_crc_columns(
+    transition: Sequence[int], taps: int, dwidth: int
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+
+    length = len(transition)
+    transition_packed = pack_columns(transition, length)
+    state_columns = matrix_power(transition_packed, dwidth)
+
+    impulse = pack_columns([taps], length)
+    power = transition_packed
+    while len(impulse) < dwidth:
+        extension = matrix_multiply(power, impulse[: dwidth - len(impulse)])
+        impulse = numpy.concatenate((impulse, extension))
+        power = matrix_multiply(power, power)
+    data_columns = impulse[dwidth - 1 :: -1] if dwidth else impulse[:0]
+
+    return (state_columns, data_columns)
+
+
+HEX_DIGITS = numpy.frombuffer(b"0123456789ABCDEF", dtype=numpy.uint8)
+
+
+def slices_to_hex(slices: Sequence[int], count: int) -> numpy.ndarray:
+    # Bit k of slice i is bit i of vector k. Returns one row of upper case hex
+    # digits per vector, most significant digit first
+    nbytes = (count + 7) // 8
+    packed = numpy.frombuffer(
+        b"".join(value.to_bytes(nbytes, "little") for value in slices),
+        dtype=numpy.uint8,
+    ).reshape(len(slices), nbytes)
+    bits = numpy.unpackbits(packed, axis=1, bitorder="little")[:, :count]
+    digits = (len(slices) + 3) // 4
+    padded = numpy.zeros((digits * 4, count), dtype=numpy.uint8)
+    padded[: len(slices)] = bits
+    weights = numpy.array([1, 2, 4, 8], dtype=numpy.uint8)[:, numpy.newaxis]
+    nibbles = (padded.reshape(digits, 4, count) * weights).sum(axis=1)
+    return HEX_DIGITS[nibbles[::-1].T]
+
+
+def hex_lines(fields: Sequence[Sequence[int]], count: int) -> str:
+    columns = []
+    for field in fields:
+        if columns:
+            columns.append(numpy.full((count, 1), ord(" "), dtype=numpy.uint8))
+        columns.append(slices_to_hex(field, count))
+    columns.append(numpy.full((count, 1), ord("\n"), dtype=numpy.uint8))
+    return numpy.concatenate(columns, axis=1).tobytes().decode("ascii")
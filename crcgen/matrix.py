@@ -0,0 +1,142 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+# Packed GF(2) matrices. A CrcMatrix holds one int per row, bit i of the row
+# being column i, which is the same layout as the column ints the matrix
+# builders produce. It still behaves as the old list of 0/1 lists: indexing or
+# iterating gives int_to_poly style lists, and it compares equal to them.
+# The gf2_matrix_* helpers work on plain lists of column ints.
+
+from collections.abc import Sequence as SequenceABC
+from typing import Iterable, Iterator, List, Sequence, Union
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+
+    def popcount(x: int) -> int:
+        return bin(x).count("1")
+
+
+def iter_bits(value: int) -> Iterator[int]:
+    # Indices of the set bits, lowest first. Scanning the binary string is
+    # several times faster than isolating the low bit for dense rows
+    return (i for i, bit in enumerate(bin(value)[:1:-1]) if bit == "1")
+
+
+def gf2_matrix_apply(matrix: Sequence[int], vector: int) -> int:
+    result = 0
+    i = 0
+    while vector:
+        if vector & 1:
+            result ^= matrix[i]
+        vector >>= 1
+        i += 1
+    return result
+
+
+def gf2_matrix_multiply(a: Sequence[int], b: Sequence[int]) -> List[int]:
+    return [gf2_matrix_apply(a, column) for column in b]
+
+
+def gf2_matrix_power(matrix: Sequence[int], exponent: int) -> List[int]:
+    result = [1 << i for i in range(len(matrix))]
+    power = list(matrix)
+    while exponent:
+        if exponent & 1:
+            result = gf2_matrix_multiply(power, result)
+        exponent >>= 1
+        if exponent:
+            power = gf2_matrix_multiply(power, power)
+    return result
+
+
+class CrcMatrix(SequenceABC):
+    __slots__ = ("width", "rows")
+
+    def __init__(self, width: int, rows: Iterable[int] = ()):
+        self.width = width
+        self.rows = list(rows)
+
+    @classmethod
+    def from_lists(cls, lists: Sequence[Sequence[int]], width: int) -> "CrcMatrix":
+        rows = []
+        for bits in lists:
+            row = 0
+            for i, bit in enumerate(bits):
+                if bit != 0:
+                    row |= 1 << i
+            rows.append(row)
+        return cls(width, rows)
+
+    @classmethod
+    def coerce(
+        cls, matrix: Union["CrcMatrix", Sequence[Sequence[int]]], width: int
+    ) -> "CrcMatrix":
+        if isinstance(matrix, cls):
+            return matrix
+        return cls.from_lists(matrix, width)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._row_list(row) for row in self.rows[index]]
+        return self._row_list(self.rows[index])
+
+    def __iter__(self) -> Iterator[List[int]]:
+        for row in self.rows:
+            yield self._row_list(row)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, CrcMatrix):
+            return self.width == other.width and self.rows == other.rows
+        if isinstance(other, SequenceABC) and not isinstance(other, (str, bytes)):
+            return self.tolist() == [list(row) for row in other]
+        return NotImplemented
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        return "CrcMatrix({}, [{}])".format(
+            self.width, ", ".join("0x{:X}".format(row) for row in self.rows)
+        )
+
+    def _row_list(self, row: int) -> List[int]:
+        return [(row >> i) & 1 for i in range(self.width)]
+
+    def tolist(self) -> List[List[int]]:
+        return [self._row_list(row) for row in self.rows]
+
+    def row_bits(self, index: int) -> Iterator[int]:
+        return iter_bits(self.rows[index])
+
+    def row_popcount(self, index: int) -> int:
+        return popcount(self.rows[index])
+
+    def popcount(self) -> int:
+        return sum(popcount(row) for row in self.rows)
+
+    def transpose(self) -> "CrcMatrix":
+        if not self.rows or not self.width:
+            return CrcMatrix(len(self.rows), [0] * self.width)
+        # zip() over the binary strings of the rows does the bit shuffling in
+        # C, which is much faster than walking the set bits
+        row_format = "0{}b".format(self.width)
+        strings = [format(row, row_format) for row in self.rows]
+        columns = [int("".join(bits)[::-1], 2) for bits in zip(*strings)]
+        return CrcMatrix(len(self.rows), columns[::-1])
@@ -0,0 +1,153 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+# Compiled Python models of the generated functions, for cocotb style
+# testbenches that run millions of transactions. The matrices are turned into
+# Python source once, either as byte slice tables (a lookup per byte of state
+# and data) or as one packed mask per output bit whose parity is taken with a
+# popcount, and the compiled functions are cached by matrix contents. State
+# and data are ints with bit i being state(i) and data(i) of the VHDL.
+
+from functools import lru_cache
+from typing import Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+
+from .crcgen import CrcParams
+from .csource import slice_tables
+from .matrix import CrcMatrix, popcount
+from .software import reflect
+
+MODEL_STYLES = ("table", "parity")
+MODEL_CACHE_SIZE = 64
+
+NextState = Callable[[int, int], int]
+
+
+class CrcModel(NamedTuple):
+    next_state: NextState
+    first: Optional[Callable[[int], int]]
+    final: Optional[Callable[[int], int]]
+
+
+def model_style(length: int, dwidth: int) -> str:
+    # Table lookups scale with the input bytes, parities with the state
+    # width, and a lookup costs about half as much as a masked popcount
+    lookups = (length + 7) // 8 + (dwidth + 7) // 8
+    return "table" if lookups <= 2 * length else "parity"
+
+
+def _table_source(length: int, dwidth: int) -> str:
+    terms = ["s0[state & 0xFF]"]
+    terms += [
+        "s{}[(state >> {}) & 0xFF]".format(k, 8 * k)
+        for k in range(1, (length + 7) // 8)
+    ]
+    terms += ["d0[data & 0xFF]"]
+    terms += [
+        "d{}[(data >> {}) & 0xFF]".format(k, 8 * k) for k in range(1, (dwidth + 7) // 8)
+    ]
+    return "\n".join(
+        [
+            "def next_state(state, data):",
+            "    return (",
+            "        " + "\n        ^ ".join(terms),
+            "    )",
+        ]
+    )
+
+
+def _parity_source(length: int, masks: Sequence[int]) -> str:
+    terms = [
+        "(popcount(x & 0x{:X}) & 1) << {}".format(m, i) for i, m in enumerate(masks)
+    ]
+    return "\n".join(
+        [
+            "def next_state(state, data):",
+            "    x = (state & 0x{:X}) | (data << {})".format((1 << length) - 1, length),
+            "    return (",
+            "        " + "\n        | ".join(terms or ["0"]),
+            "    )",
+        ]
+    )
+
+
+@lru_cache(maxsize=MODEL_CACHE_SIZE)
+def _compile(
+    length: int, state_rows: Tuple[int, ...], data_rows: Tuple[int, ...], style: str
+) -> NextState:
+    dwidth = len(data_rows)
+    namespace: Dict[str, object] = {}
+    if style == "table":
+        tables = slice_tables(
+            length, CrcMatrix(length, state_rows), CrcMatrix(length, data_rows)
+        )
+        state_bytes = (length + 7) // 8
+        for k, table in enumerate(tables):
+            if k < state_bytes:
+                namespace["s{}".format(k)] = table
+            else:
+                namespace["d{}".format(k - state_bytes)] = table
+        source = _table_source(length, dwidth)
+    else:
+        namespace["popcount"] = popcount
+        # Row i of the transpose over the state bits followed by the data bits
+        columns = CrcMatrix(length, state_rows + data_rows)
+        source = _parity_source(length, columns.transpose().rows)
+    exec(
+        compile(source, "<crcgen model {}x{}>".format(length, dwidth), "exec"),
+        namespace,
+    )
+    return namespace["next_state"]  # type: ignore
+
+
+def compile_next_state(
+    state_matrix: Sequence[Sequence[int]],
+    data_matrix: Sequence[Sequence[int]],
+    style: Optional[str] = None,
+) -> NextState:
+    length = len(state_matrix)
+    if style is None:
+        style = model_style(length, len(data_matrix))
+    if style not in MODEL_STYLES:
+        raise ValueError("style must be one of {}".format(", ".join(MODEL_STYLES)))
+    state_rows = tuple(CrcMatrix.coerce(state_matrix, length).rows)
+    data_rows = tuple(CrcMatrix.coerce(data_matrix, length).rows)
+    return _compile(length, state_rows, data_rows, style)
+
+
+def compile_crc_model(
+    state_matrix: Sequence[Sequence[int]],
+    data_matrix: Sequence[Sequence[int]],
+    params: Optional[CrcParams] = None,
+    style: Optional[str] = None,
+) -> CrcModel:
+    next_state = compile_next_state(state_matrix, data_matrix, style)
+    if params is None:
+        return CrcModel(next_state, None, None)
+    init = params.init
+
+    def first(data: int) -> int:
+        return next_state(init, data)
+
+    length = params.length
+    reflect_output = params.reflect_output
+    xorout = params.xorout
+
+    def final(state: int) -> int:
+        if reflect_output:
+            state = reflect(state, length)
+        return state ^ xorout
+
+    return CrcModel(next_state, first, final)
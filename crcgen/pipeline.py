@@ -0,0 +1,303 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+# Pipelined CRC generation. The data contribution D * data does not depend on
+# the CRC state, so it is reduced through register stages of bounded XOR
+# fan-in. The valid and first-word flags travel down the same pipeline, and
+# the state feedback A * state is only applied once the reduced data term
+# arrives, so the running CRC is the same as the single-cycle function.
+# With the full CRC parameters the init port is replaced by a constant folded
+# into the first-word equations, and the output reflection and final XOR are
+# folded into the crc output.
+
+from typing import Iterator, List, NamedTuple, Optional, Sequence
+
+from .crcgen import (
+    CrcParams,
+    emit_lines,
+    fold_init,
+    poly_to_int,
+    poly_to_str,
+    vhdl_output_terms,
+    vhdl_params_line,
+    vhdl_xor,
+)
+from .matrix import CrcMatrix
+from .stats import EquationStats, lut_count, lut_depth
+
+
+class PipelinePlan(NamedTuple):
+    # stages[s][k] lists the signals of stage s - 1 (data bits for s = 0)
+    # that are XORed into register k of stage s
+    stages: List[List[List[int]]]
+    # Signal of the last stage (or data bit when there are no stages) holding
+    # the data contribution of each output bit, None if it has none
+    outputs: List[Optional[int]]
+
+    @property
+    def latency(self) -> int:
+        # Data stages plus the CRC state register
+        return len(self.stages) + 1
+
+
+def plan_pipeline(rows: Sequence[Sequence[int]], max_fanin: int) -> PipelinePlan:
+    if max_fanin < 2:
+        raise ValueError("max_fanin must be at least 2")
+
+    current = [list(row) for row in rows]
+    stages = []
+    while any(len(signals) > 1 for signals in current):
+        stage: List[List[int]] = []
+        next_signals = []
+        for signals in current:
+            # Bits that are already reduced still get a register per stage to
+            # stay aligned with the rest of the word
+            ids = []
+            for k in range(0, len(signals), max_fanin):
+                ids.append(len(stage))
+                stage.append(signals[k : k + max_fanin])
+            next_signals.append(ids)
+        stages.append(stage)
+        current = next_signals
+
+    return PipelinePlan(
+        stages, [signals[0] if signals else None for signals in current]
+    )
+
+
+def pipeline_stats(
+    dwidth: int,
+    state_matrix: Sequence[Sequence[int]],
+    data_matrix: Sequence[Sequence[int]],
+    max_fanin: int = 6,
+) -> EquationStats:
+    # The data stages and the state feedback are separate register to
+    # register paths, so the depth is the deepest of them
+    length = len(state_matrix)
+    state_rows = CrcMatrix.coerce(state_matrix, length).transpose()
+    data_rows = CrcMatrix.coerce(data_matrix, length).transpose()
+    plan = plan_pipeline(
+        [list(data_rows.row_bits(i)) for i in range(length)], max_fanin
+    )
+    fanin = [
+        state_rows.row_popcount(i) + (plan.outputs[i] is not None)
+        for i in range(length)
+    ]
+    groups = [len(group) for stage in plan.stages for group in stage]
+    return EquationStats(
+        dwidth,
+        fanin,
+        sum(fanin) + sum(groups),
+        max(fanin + groups, default=0),
+        sum(lut_count(f) for f in fanin + groups),
+        max((lut_depth(f) for f in fanin + groups), default=0),
+        "pipelined",
+    )
+
+
+@emit_lines
+def iter_vhdl_pipeline(
+    cmdline: str,
+    name: str,
+    poly: Sequence[int],
+    dwidth: int,
+    state_matrix: Sequence[Sequence[int]],
+    data_matrix: Sequence[Sequence[int]],
+    max_fanin: int = 6,
+    params: Optional[CrcParams] = None,
+) -> Iterator[str]:
+
+    length = len(poly)
+    state_rows = CrcMatrix.coerce(state_matrix, length).transpose()
+    data_rows = CrcMatrix.coerce(data_matrix, length).transpose()
+    plan = plan_pipeline(
+        [list(data_rows.row_bits(i)) for i in range(length)], max_fanin
+    )
+    num_stages = len(plan.stages)
+    feedback_fanin = max(
+        state_rows.row_popcount(i) + (plan.outputs[i] is not None)
+        for i in range(length)
+    )
+
+    def stage_signal(stage: int, index: int) -> str:
+        if stage == 0:
+            return "data({})".format(index)
+        return "data_stage{}({})".format(stage, index)
+
+    yield "----------------------------------------"
+    yield "-- Pipelined Parallel CRC Calculation"
+    yield "-- CRC width:{} data width: {}".format(length, dwidth)
+    yield "-- polynomial: {} (0x{:X})".format(poly_to_str(poly), poly_to_int(poly))
+    if params is not None:
+        yield vhdl_params_line(params)
+    yield "-- maximum data XOR fan-in per stage: {}".format(max_fanin)
+    yield "-- latency: {} cycles".format(plan.latency)
+    yield "-- state feedback XOR fan-in: {}".format(feedback_fanin)
+    yield "-- Generated with crcgen"
+    yield "-- https://github.com/MegabytePhreak/crcgen"
+    yield "-- arguments: {}".format(cmdline)
+    yield "-- SPDX-License-Identifier: 0BSD"
+    yield "----------------------------------------"
+    yield ""
+    yield "library ieee;"
+    yield "use ieee.std_logic_1164.all;"
+    yield ""
+    yield "entity {} is".format(name)
+    yield "    port ("
+    yield "        clk        : in  std_logic;"
+    yield "        reset      : in  std_logic;"
+    if params is None:
+        yield (
+            "        init       : in  std_logic_vector({} downto 0);".format(length - 1)
+        )
+    yield "        data_valid : in  std_logic;"
+    yield "        data_first : in  std_logic;"
+    yield "        data       : in  std_logic_vector({} downto 0);".format(dwidth - 1)
+    yield "        crc_valid  : out std_logic;"
+    yield "        crc        : out std_logic_vector({} downto 0)".format(length - 1)
+    yield "    );"
+    yield "end {};".format(name)
+    yield ""
+    yield "architecture rtl of {} is".format(name)
+    yield "    constant LATENCY : natural := {};".format(plan.latency)
+    for stage, groups in enumerate(plan.stages, 1):
+        yield (
+            "    signal data_stage{} : std_logic_vector({} downto 0);".format(
+                stage, len(groups) - 1
+            )
+        )
+    if num_stages:
+        yield (
+            "    signal valid_pipe : std_logic_vector({} downto 0);".format(
+                num_stages - 1
+            )
+        )
+        yield (
+            "    signal first_pipe : std_logic_vector({} downto 0);".format(
+                num_stages - 1
+            )
+        )
+    yield "    signal state : std_logic_vector({} downto 0);".format(length - 1)
+    yield "begin"
+    yield ""
+    yield "    process(clk)"
+    yield "        variable cur : std_logic_vector({} downto 0);".format(length - 1)
+    yield "    begin"
+    yield "        if rising_edge(clk) then"
+    for stage, groups in enumerate(plan.stages, 1):
+        for k, group in enumerate(groups):
+            yield (
+                "            data_stage{}({}) <= {};".format(
+                    stage,
+                    k,
+                    " xor ".join(stage_signal(stage - 1, signal) for signal in group),
+                )
+            )
+    if num_stages == 1:
+        yield "            valid_pipe(0) <= data_valid;"
+        yield "            first_pipe(0) <= data_first;"
+    elif num_stages > 1:
+        yield (
+            "            valid_pipe <= valid_pipe({} downto 0) & data_valid;".format(
+                num_stages - 2
+            )
+        )
+        yield (
+            "            first_pipe <= first_pipe({} downto 0) & data_first;".format(
+                num_stages - 2
+            )
+        )
+    if num_stages:
+        last_valid = "valid_pipe({})".format(num_stages - 1)
+        last_first = "first_pipe({})".format(num_stages - 1)
+    else:
+        last_valid = "data_valid"
+        last_first = "data_first"
+    yield ""
+    yield "            crc_valid <= '0';"
+    yield "            if {} = '1' then".format(last_valid)
+    yield "                if {} = '1' then".format(last_first)
+    if params is None:
+        yield "                    cur := init;"
+        yield "                else"
+        yield "                    cur := state;"
+        yield "                end if;"
+        indent = " " * 16
+    else:
+        first_state = fold_init(state_matrix, params.init)
+        for i in range(length):
+            terms = []
+            if plan.outputs[i] is not None:
+                terms.append(stage_signal(num_stages, plan.outputs[i]))
+            yield "                    state({}) <= {};".format(
+                i, vhdl_xor(terms, bool(first_state >> i & 1))
+            )
+        yield "                else"
+        yield "                    cur := state;"
+        indent = " " * 20
+    for i in range(length):
+        terms = ["cur({})".format(j) for j in state_rows.row_bits(i)]
+        if plan.outputs[i] is not None:
+            terms.append(stage_signal(num_stages, plan.outputs[i]))
+        yield "{}state({}) <= {};".format(indent, i, " xor ".join(terms) or "'0'")
+    if params is not None:
+        yield "                end if;"
+    yield "                crc_valid <= '1';"
+    yield "            end if;"
+    yield ""
+    # Every register is reset, so no word in flight survives a reset
+    yield "            if reset = '1' then"
+    for stage in range(1, num_stages + 1):
+        yield "                data_stage{} <= (others => '0');".format(stage)
+    if num_stages:
+        yield "                valid_pipe <= (others => '0');"
+        yield "                first_pipe <= (others => '0');"
+    if params is None:
+        yield "                state <= init;"
+    else:
+        yield '                state <= "{:0{}b}";'.format(params.init, length)
+    yield "                crc_valid <= '0';"
+    yield "            end if;"
+    yield "        end if;"
+    yield "    end process;"
+    yield ""
+    if params is None:
+        yield "    crc <= state;"
+    else:
+        for i, term in enumerate(
+            vhdl_output_terms(length, params.reflect_output, params.xorout)
+        ):
+            yield "    crc({}) <= {};".format(i, term)
+    yield ""
+    yield "end rtl;"
+
+
+def gen_vhdl_pipeline(
+    cmdline: str,
+    name: str,
+    poly: Sequence[int],
+    dwidth: int,
+    state_matrix: Sequence[Sequence[int]],
+    data_matrix: Sequence[Sequence[int]],
+    max_fanin: int = 6,
+    params: Optional[CrcParams] = None,
+) -> str:
+
+    return "".join(
+        iter_vhdl_pipeline(
+            cmdline, name, poly, dwidth, state_matrix, data_matrix, max_fanin, params
+        )
+    )
@@ -0,0 +1,208 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+# Residual-width CRC functions for buses that end a packet on a byte
+# boundary. One package holds the update function for every multiple of the
+# byte width up to the bus width, plus a wrapper that picks one from the byte
+# enables. The bytes are taken in transmission order: from the bottom of the
+# word for reflected input, and from the top for non-reflected input.
+
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .crcgen import (
+    CrcParams,
+    build_crc_matrices_sweep,
+    emit_lines,
+    fold_init,
+    poly_to_int,
+    poly_to_str,
+    vhdl_final_decl,
+    vhdl_final_lines,
+    vhdl_first_state_lines,
+    vhdl_next_state_lines,
+    vhdl_params_line,
+)
+
+Matrices = Tuple[Sequence[Sequence[int]], Sequence[Sequence[int]]]
+
+
+def residual_widths(dwidth: int, step: int = 8) -> List[int]:
+    if step < 1 or dwidth % step != 0:
+        raise ValueError(
+            "data width {} is not a multiple of {} bits".format(dwidth, step)
+        )
+    return list(range(dwidth, 0, -step))
+
+
+def build_residual_matrices(
+    poly: Sequence[int],
+    dwidth: int,
+    step: int = 8,
+    reflect_input: bool = False,
+    build_sweep: Callable[
+        [Sequence[int], Iterable[int], bool], Iterator[Tuple[int, Matrices]]
+    ] = build_crc_matrices_sweep,
+) -> Dict[int, Matrices]:
+
+    # The sweep builds every narrower width on the way to the widest one
+    return dict(build_sweep(poly, residual_widths(dwidth, step), reflect_input))
+
+
+@emit_lines
+def iter_vhdl_residual_package(
+    cmdline: str,
+    name: str,
+    poly: Sequence[int],
+    dwidth: int,
+    matrices: Dict[int, Matrices],
+    reflect_input: bool = False,
+    step: int = 8,
+    function_prefix: Optional[str] = None,
+    params: Optional[CrcParams] = None,
+) -> Iterator[str]:
+
+    length = len(poly)
+    widths = residual_widths(dwidth, step)
+    lanes = len(widths)
+    if function_prefix is None:
+        function_prefix = name
+
+    def function_name(width: int) -> str:
+        return "{}_{}b".format(function_prefix, width)
+
+    def function_decl(width: int) -> str:
+        return "    function {}(state: std_logic_vector({} downto 0); data: std_logic_vector({} downto 0)) return std_logic_vector".format(
+            function_name(width), length - 1, width - 1
+        )
+
+    def first_decl(width: int) -> str:
+        return "    function {}_first(data: std_logic_vector({} downto 0)) return std_logic_vector".format(
+            function_name(width), width - 1
+        )
+
+    wrapper_decl = "    function {}(state: std_logic_vector({} downto 0); data: std_logic_vector({} downto 0); byte_en: std_logic_vector({} downto 0)) return std_logic_vector".format(
+        name, length - 1, dwidth - 1, lanes - 1
+    )
+    first_wrapper_decl = "    function {}_first(data: std_logic_vector({} downto 0); byte_en: std_logic_vector({} downto 0)) return std_logic_vector".format(
+        name, dwidth - 1, lanes - 1
+    )
+
+    def wrapper_lines(first: bool) -> Iterator[str]:
+        yield "    begin"
+        for count, width in enumerate(widths):
+            # The last of the valid bytes, in transmission order
+            last = lanes - 1 - count
+            if reflect_input:
+                lane = last
+                data = "data({} downto 0)".format(width - 1)
+            else:
+                lane = lanes - 1 - last
+                data = "data({} downto {})".format(dwidth - 1, dwidth - width)
+            yield "        {} byte_en({}) = '1' then".format(
+                "if" if count == 0 else "elsif", lane
+            )
+            if first:
+                yield "            return {}_first({});".format(
+                    function_name(width), data
+                )
+            else:
+                yield "            return {}(state, {});".format(
+                    function_name(width), data
+                )
+        yield "        else"
+        if first:
+            yield '            return "{:0{}b}";'.format(params.init, length)
+        else:
+            yield "            return state;"
+        yield "        end if;"
+
+    yield "----------------------------------------"
+    yield "-- Parallel CRC Calculation Package"
+    yield "-- CRC width:{} data width: {} in {} bit steps".format(length, dwidth, step)
+    yield "-- polynomial: {} (0x{:X})".format(poly_to_str(poly), poly_to_int(poly))
+    if params is not None:
+        yield vhdl_params_line(params)
+    yield "-- Generated with crcgen"
+    yield "-- https://github.com/MegabytePhreak/crcgen"
+    yield "-- arguments: {}".format(cmdline)
+    yield "-- SPDX-License-Identifier: 0BSD"
+    yield "----------------------------------------"
+    yield ""
+    yield "library ieee;"
+    yield "use ieee.std_logic_1164.all;"
+    yield ""
+    yield "package {}_pkg is ".format(name)
+    yield ""
+    for width in widths:
+        yield function_decl(width) + ";"
+    yield ""
+    yield wrapper_decl + ";"
+    if params is not None:
+        for width in widths:
+            yield first_decl(width) + ";"
+        yield first_wrapper_decl + ";"
+        yield vhdl_final_decl(name, length) + ";"
+    yield ""
+    yield "end {}_pkg;".format(name)
+    yield ""
+    yield "library ieee;"
+    yield "use ieee.std_logic_1164.all;"
+    yield ""
+    yield "package body {}_pkg is".format(name)
+    for width in widths:
+        state_matrix, data_matrix = matrices[width]
+        yield ""
+        yield function_decl(width) + " is"
+        yield (
+            "        variable next_state : std_logic_vector({} downto 0);".format(
+                length - 1
+            )
+        )
+        yield "    begin"
+        yield from vhdl_next_state_lines(length, state_matrix, data_matrix)
+        yield "        return next_state;"
+        yield "    end {};".format(function_name(width))
+    yield ""
+    yield wrapper_decl + " is"
+    yield from wrapper_lines(False)
+    yield "    end {};".format(name)
+    if params is not None:
+        # The first word of a packet starts from init, which is folded into
+        # constants, so the residual widths need their own first functions
+        for width in widths:
+            state_matrix, data_matrix = matrices[width]
+            yield ""
+            yield first_decl(width) + " is"
+            yield (
+                "        variable next_state : std_logic_vector({} downto 0);".format(
+                    length - 1
+                )
+            )
+            yield "    begin"
+            yield from vhdl_first_state_lines(
+                length, fold_init(state_matrix, params.init), data_matrix
+            )
+            yield "        return next_state;"
+            yield "    end {}_first;".format(function_name(width))
+        yield ""
+        yield first_wrapper_decl + " is"
+        yield from wrapper_lines(True)
+        yield "    end {}_first;".format(name)
+    if params is not None:
+        yield ""
+        yield from vhdl_final_lines(name, params)
+    yield ""
+    yield "end {}_pkg;".format(name)
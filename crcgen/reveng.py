@@ -0,0 +1,357 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+# CRC parameter recovery from (message, crc) samples.
+#
+# Feeding L message bits M(x) (first bit highest) through the LFSR from state I
+# leaves I * x^L + M * x^n mod g, and the CRC is that state, reflected or not,
+# XORed with xorout. Undoing the output reflection, every sample satisfies
+#
+#   T = M * x^n + crc = I * x^L + xorout   (mod g)
+#
+# so the differences of samples of the same length are multiples of g, and for
+# three different lengths (T1 + T2)(x^(L3-L1) + 1) + (T1 + T3)(x^(L2-L1) + 1)
+# is one. The GCD of these gives the polynomial. With the polynomial known the
+# equations are linear in the bits of init and xorout, which are solved by
+# Gaussian elimination on bit-packed rows.
+
+import argparse
+import itertools
+import sys
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from .crcgen import int_to_poly, poly_to_str
+from .matrix import popcount
+from .software import REVERSED_BYTES, SoftwareCrc, reflect
+
+# Constraint polynomials folded into the GCD before giving up on it shrinking
+MAX_CONSTRAINTS = 64
+# Largest CRC for which a GCD of too high degree is split by trial division
+MAX_FACTOR_LENGTH = 16
+
+
+class Sample(NamedTuple):
+    message: bytes
+    crc: int
+
+
+class RecoveredModel(NamedTuple):
+    length: int
+    poly: int
+    init: int
+    reflect_input: bool
+    reflect_output: bool
+    xorout: int
+    # False when the samples only fix the combined effect of init and
+    # xorout, because they all have the same length or the polynomial has a
+    # factor of x + 1
+    unique: bool
+
+    def software_crc(self) -> SoftwareCrc:
+        return SoftwareCrc(
+            int_to_poly(self.length, self.poly),
+            self.reflect_input,
+            self.reflect_output,
+            self.init,
+            self.xorout,
+        )
+
+
+def gf2_mod(value: int, divisor: int) -> int:
+    degree = divisor.bit_length()
+    while value.bit_length() >= degree:
+        value ^= divisor << (value.bit_length() - degree)
+    return value
+
+
+def gf2_divmod(value: int, divisor: int) -> Tuple[int, int]:
+    degree = divisor.bit_length()
+    quotient = 0
+    while value.bit_length() >= degree:
+        shift = value.bit_length() - degree
+        quotient |= 1 << shift
+        value ^= divisor << shift
+    return (quotient, value)
+
+
+def gf2_gcd(a: int, b: int) -> int:
+    while b:
+        a, b = b, gf2_mod(a, b)
+    return a
+
+
+def message_poly(message: bytes, reflect_input: bool) -> int:
+    # Message bits in the order the LFSR takes them, first bit highest
+    if reflect_input:
+        message = message.translate(REVERSED_BYTES)
+    return int.from_bytes(message, "big")
+
+
+def poly_constraints(
+    samples: Sequence[Sample], length: int, reflect_input: bool, reflect_output: bool
+) -> Iterator[int]:
+    by_bits: Dict[int, List[int]] = {}
+    for sample in samples:
+        crc = reflect(sample.crc, length) if reflect_output else sample.crc
+        augmented = (message_poly(sample.message, reflect_input) << length) ^ crc
+        by_bits.setdefault(8 * len(sample.message), []).append(augmented)
+
+    for values in by_bits.values():
+        for a, b in zip(values, values[1:]):
+            if a != b:
+                yield a ^ b
+    for l1, l2, l3 in itertools.combinations(sorted(by_bits), 3):
+        t1, t2, t3 = by_bits[l1][0], by_bits[l2][0], by_bits[l3][0]
+        d12, d13 = t1 ^ t2, t1 ^ t3
+        yield d12 ^ (d12 << (l3 - l1)) ^ d13 ^ (d13 << (l2 - l1))
+
+
+def recover_polys(constraints: Iterable[int], length: int) -> List[int]:
+    g = 0
+    for constraint in itertools.islice(constraints, MAX_CONSTRAINTS):
+        g = gf2_gcd(constraint, g)
+        # The generator has a +1 term, so any factor of x is spurious
+        while g and not g & 1:
+            g >>= 1
+        if g.bit_length() - 1 <= length:
+            break
+    if g.bit_length() - 1 > length and length > MAX_FACTOR_LENGTH:
+        # Lengths are whole bytes, so each difference x^(8k) + 1 = (x^k + 1)^8
+        # puts a common factor of (x + 1)^8 into constraints of mixed lengths
+        while g.bit_length() - 1 > length:
+            quotient, remainder = gf2_divmod(g, 0b11)
+            if remainder:
+                break
+            g = quotient
+    degree = g.bit_length() - 1
+    if degree < length:
+        return []
+    if degree == length:
+        full_polys = [g]
+    elif length <= MAX_FACTOR_LENGTH:
+        full_polys = [
+            p | (1 << length)
+            for p in range(1, 1 << length, 2)
+            if gf2_mod(g, p | (1 << length)) == 0
+        ]
+    else:
+        raise ValueError("not enough samples to determine the polynomial")
+    # The generator always has the +1 term
+    return [p & ((1 << length) - 1) for p in full_polys if p & 1]
+
+
+def _reduce(basis: Dict[int, int], row: int, unknowns: int) -> int:
+    for pivot in range(unknowns - 1, -1, -1):
+        if row >> pivot & 1 and pivot in basis:
+            row ^= basis[pivot]
+    return row
+
+
+def solve_init(samples: Sequence[Sample], crc: SoftwareCrc) -> Optional[RecoveredModel]:
+    # crc has the polynomial and reflections, init and xorout are solved for.
+    # Unknowns are init in bits 0..n-1 and the xorout seen before the output
+    # reflection in bits n..2n-1, the right-hand side is bit 2n.
+    n = crc.length
+    unknowns = 2 * n
+    basis: Dict[int, int] = {}
+    rows_by_bits: Dict[int, List[int]] = {}
+    seen: Dict[int, int] = {}
+    for sample in samples:
+        if len(basis) == unknowns:
+            break
+        nbytes = len(sample.message)
+        # Two samples of each length pin down everything they can
+        if seen.get(nbytes, 0) >= 2:
+            continue
+        seen[nbytes] = seen.get(nbytes, 0) + 1
+        rows = rows_by_bits.get(nbytes)
+        if rows is None:
+            columns = crc.advance_matrix(nbytes)
+            rows = rows_by_bits[nbytes] = [
+                sum(((column >> k) & 1) << j for j, column in enumerate(columns))
+                | (1 << (n + k))
+                for k in range(n)
+            ]
+        target = reflect(sample.crc, n) if crc.reflect_output else sample.crc
+        target ^= crc.update(0, sample.message)
+        for k, row in enumerate(rows):
+            row = _reduce(basis, row | ((target >> k & 1) << unknowns), unknowns)
+            coefficients = row & ((1 << unknowns) - 1)
+            if coefficients:
+                basis[coefficients.bit_length() - 1] = row
+            elif row:
+                # 0 = 1, these reflections and polynomial do not fit
+                return None
+
+    # Back substitution, lowest pivots first, free unknowns at zero
+    solution = 0
+    for pivot in sorted(basis):
+        row = basis[pivot]
+        value = (row >> unknowns) & 1
+        value ^= popcount(row & solution & ((1 << pivot) - 1)) & 1
+        solution |= value << pivot
+    unique = len(basis) == unknowns
+    init = solution & crc.mask
+
+    if not unique:
+        # Only init * x^L + xorout is known. Prefer the usual all-zeros or
+        # all-ones init and xorout when one of them fits
+        sample = samples[0]
+        for candidate in (0, crc.mask):
+            state = crc.update(candidate, sample.message)
+            xorout = crc.finalize(state) ^ sample.crc
+            if xorout in (0, crc.mask):
+                init = candidate
+                break
+
+    state = crc.update(init, samples[0].message)
+    xorout = crc.finalize(state) ^ samples[0].crc
+    return RecoveredModel(
+        n,
+        crc.poly,
+        init,
+        crc.reflect_input,
+        crc.reflect_output,
+        xorout,
+        unique,
+    )
+
+
+def recover(
+    samples: Sequence[Sample], length: int, poly: Optional[int] = None
+) -> List[RecoveredModel]:
+    if len(samples) < 2 and poly is None:
+        raise ValueError("need at least two samples to recover the polynomial")
+    models = []
+    error = None
+    for reflect_input, reflect_output in itertools.product((True, False), repeat=2):
+        if poly is None:
+            try:
+                polys = recover_polys(
+                    poly_constraints(samples, length, reflect_input, reflect_output),
+                    length,
+                )
+            except ValueError as e:
+                error = e
+                continue
+        else:
+            polys = [poly]
+        for candidate in polys:
+            crc = SoftwareCrc(
+                int_to_poly(length, candidate), reflect_input, reflect_output
+            )
+            model = solve_init(samples, crc)
+            if model is None:
+                continue
+            # The solver only looked at a few samples of each length
+            crc = model.software_crc()
+            if all(crc.crc(sample.message) == sample.crc for sample in samples):
+                models.append(model)
+    if not models and error is not None:
+        raise error
+    return models
+
+
+def preset_entry(name: str, model: RecoveredModel) -> str:
+    digits = (model.length + 3) // 4
+    return (
+        '"{}": CrcParams({}, 0x{:0{d}X}, 0x{:0{d}X}, {}, {}, 0x{:0{d}X}, '
+        "0x{:0{d}X}),".format(
+            name,
+            model.length,
+            model.poly,
+            model.init,
+            model.reflect_input,
+            model.reflect_output,
+            model.xorout,
+            model.software_crc().check,
+            d=digits,
+        )
+    )
+
+
+def parse_samples(lines: Iterable[str]) -> List[Sample]:
+    samples = []
+    for number, line in enumerate(lines, 1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        fields = line.replace(",", " ").split()
+        if len(fields) != 2:
+            raise ValueError("line {}: expected a message and a CRC".format(number))
+        message, crc = fields
+        try:
+            samples.append(Sample(bytes.fromhex(message), int(crc, 16)))
+        except ValueError:
+            raise ValueError("line {}: invalid hex".format(number))
+    return samples
+
+
+def main(argv=None):
+    def auto_int(x):
+        return int(x, 0)
+
+    parser = argparse.ArgumentParser(
+        prog="crcgen reveng",
+        description="Recover CRC parameters from sample messages and their CRCs",
+    )
+    parser.add_argument(
+        "samples",
+        type=argparse.FileType("r"),
+        help="File with one hex message and hex CRC per line, - for stdin",
+    )
+    parser.add_argument(
+        "-l", "--length", type=int, required=True, help="Length of the CRC in bits"
+    )
+    parser.add_argument(
+        "-p",
+        "--poly",
+        type=auto_int,
+        default=None,
+        help="Known polynomial in normal form, only solve for the rest",
+    )
+    parser.add_argument(
+        "--name",
+        type=str,
+        default=None,
+        help="Name of the printed preset (Default CRC<length>-RECOVERED)",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        with args.samples:
+            samples = parse_samples(args.samples)
+        if not samples:
+            raise ValueError("no samples")
+        if any(sample.crc >> args.length for sample in samples):
+            raise ValueError("CRC values do not fit in {} bits".format(args.length))
+        models = recover(samples, args.length, args.poly)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if not models:
+        print("No CRC model matches the samples", file=sys.stderr)
+        return 1
+    name = args.name or "CRC{}-RECOVERED".format(args.length)
+    for model in models:
+        print("# {}".format(poly_to_str(int_to_poly(model.length, model.poly))))
+        if not model.unique:
+            print(
+                "# init and xorout are one of several choices that match the "
+                "samples, use samples of different lengths to narrow them down"
+            )
+        print(preset_entry(name, model))
+    return 0
@@ -0,0 +1,421 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+# Hamming distance evaluation of CRC polynomials. An error pattern goes
+# undetected when the XOR of the syndromes x^i mod g(x) of its bits is zero.
+# The code is cyclic up to the codeword length, so only patterns with a bit at
+# position 0 are enumerated and each is counted once per shift that still fits.
+# The last bit of a pattern is found with a syndrome lookup, so weight w costs
+# O(N^(w-2)) for N codeword bits.
+
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from .crcgen import int_to_poly, lfsr_shift_bit_int, poly_to_str
+from .matrix import popcount
+
+CHECKPOINT_VERSION = 1
+DEFAULT_CHUNK_SIZE = 256
+DEFAULT_MAX_WEIGHT = 6
+
+
+class Evaluation(NamedTuple):
+    poly: int
+    # Lowest weight of an undetected error, max_weight + 1 if none was found
+    hd: int
+    # Number of undetected errors of weight hd
+    undetected: int
+
+
+def syndromes(poly: int, length: int, count: int) -> List[int]:
+    result = []
+    syndrome = 1
+    for _ in range(count):
+        result.append(syndrome)
+        syndrome = lfsr_shift_bit_int(poly, length, syndrome, 0)
+    return result
+
+
+def _count_patterns(
+    syn: Sequence[int],
+    index: Dict[int, int],
+    start: int,
+    remaining: int,
+    target: int,
+    limit: Optional[int],
+) -> int:
+    n = len(syn)
+    total = 0
+    if remaining == 2:
+        for a in range(start, n - 1):
+            last = index.get(target ^ syn[a])
+            if last is not None and last > a:
+                total += n - last
+                if limit is not None and total > limit:
+                    return total
+        return total
+    for a in range(start, n - remaining + 1):
+        total += _count_patterns(
+            syn, index, a + 1, remaining - 1, target ^ syn[a], limit
+        )
+        if limit is not None and total > limit:
+            return total
+    return total
+
+
+def undetected_errors(
+    syn: Sequence[int], weight: int, limit: Optional[int] = None
+) -> int:
+    # Number of undetected error patterns of the given weight in len(syn)
+    # codeword bits. The count stops as soon as it goes over limit
+    n = len(syn)
+    if weight == 2:
+        # x^b + 1 is a codeword when x^b = 1 mod g
+        total = 0
+        for b in range(1, n):
+            if syn[b] == 1:
+                total += n - b
+                if limit is not None and total > limit:
+                    return total
+        return total
+    # Syndromes are distinct when there are no weight 2 errors
+    index = {syndrome: i for i, syndrome in enumerate(syn)}
+    if weight == 3:
+        total = 0
+        for a in range(1, n - 1):
+            last = index.get(1 ^ syn[a])
+            if last is not None and last > a:
+                total += n - last
+                if limit is not None and total > limit:
+                    return total
+        return total
+    return _count_patterns(syn, index, 1, weight - 1, 1, limit)
+
+
+def evaluate(
+    poly: int,
+    length: int,
+    message_bits: int,
+    max_weight: int = DEFAULT_MAX_WEIGHT,
+    min_hd: int = 2,
+    max_undetected: Optional[int] = None,
+) -> Optional[Evaluation]:
+    # Returns None as soon as an undetected error below min_hd turns up, or
+    # more than max_undetected of them at min_hd
+    syn = syndromes(poly, length, message_bits + length)
+    # With a factor of x + 1 every codeword has even weight. The parity is of
+    # the polynomial the syndromes come from, which always has the +1 term
+    even_only = popcount(poly | 1 | (1 << length)) % 2 == 0
+    for weight in range(2, max_weight + 1):
+        if even_only and weight % 2:
+            continue
+        if weight < min_hd:
+            if undetected_errors(syn, weight, limit=0):
+                return None
+        else:
+            limit = max_undetected if weight == min_hd else None
+            count = undetected_errors(syn, weight, limit)
+            if limit is not None and count > limit:
+                return None
+            if count:
+                return Evaluation(poly, weight, count)
+    if max_weight + 1 < min_hd:
+        return None
+    return Evaluation(poly, max_weight + 1, 0)
+
+
+def reciprocal(poly: int, length: int) -> int:
+    full = poly | (1 << length)
+    return int("{:0{}b}".format(full, length + 1)[::-1], 2) & ((1 << length) - 1)
+
+
+def all_candidates(length: int) -> List[int]:
+    # Polynomials with a +1 term (the generator always sets it), keeping one
+    # of each reciprocal pair since both have the same weight distribution
+    return [
+        poly for poly in range(1, 1 << length, 2) if poly <= reciprocal(poly, length)
+    ]
+
+
+def _evaluate_chunk(
+    args: Tuple[int, int, int, int, Optional[int], Sequence[int]],
+) -> List[Evaluation]:
+    length, message_bits, max_weight, min_hd, max_undetected, candidates = args
+    results = []
+    for poly in candidates:
+        result = evaluate(
+            poly, length, message_bits, max_weight, min_hd, max_undetected
+        )
+        if result is not None:
+            results.append(result)
+    return results
+
+
+def rank(results: Iterable[Evaluation]) -> List[Evaluation]:
+    return sorted(results, key=lambda r: (-r.hd, r.undetected, r.poly))
+
+
+class SearchState:
+    # Completed chunks and the best results so far, saved as JSON so that an
+    # interrupted search can be resumed
+    def __init__(
+        self,
+        params: Dict[str, Any],
+        path: Optional[str] = None,
+        best_only: bool = False,
+        top: Optional[int] = None,
+    ):
+        self.params = params
+        self.path = path
+        self.best_only = best_only
+        self.top = top
+        self.done: Set[int] = set()
+        self.results: List[Evaluation] = []
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    @property
+    def best_hd(self) -> int:
+        return max((r.hd for r in self.results), default=0)
+
+    def add(self, chunk: int, results: Iterable[Evaluation]):
+        self.done.add(chunk)
+        results = list(self.results) + list(results)
+        if self.best_only:
+            best = max((r.hd for r in results), default=0)
+            results = [r for r in results if r.hd == best]
+        self.results = rank(results)[: self.top]
+
+    @property
+    def max_undetected(self) -> Optional[int]:
+        # Count a new candidate at the best distance must beat to be kept
+        if self.top is None or len(self.results) < self.top:
+            return None
+        return self.results[-1].undetected
+
+    def load(self):
+        with open(self.path) as f:
+            document = json.load(f)
+        if document.get("version") != CHECKPOINT_VERSION:
+            raise ValueError("{}: unsupported checkpoint version".format(self.path))
+        if document["params"] != self.params:
+            raise ValueError(
+                "{}: checkpoint was made with different parameters".format(self.path)
+            )
+        self.done = set(document["done"])
+        self.results = [Evaluation(*r) for r in document["results"]]
+
+    def save(self):
+        if self.path is None:
+            return
+        document = {
+            "version": CHECKPOINT_VERSION,
+            "params": self.params,
+            "done": sorted(self.done),
+            "results": [list(r) for r in self.results],
+        }
+        tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(document, f)
+        os.replace(tmp_path, self.path)
+
+
+def search(
+    length: int,
+    message_bits: int,
+    candidates: Optional[Sequence[int]] = None,
+    max_weight: int = DEFAULT_MAX_WEIGHT,
+    min_hd: int = 2,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    checkpoint: Optional[str] = None,
+    top: Optional[int] = None,
+) -> List[Evaluation]:
+    # With an explicit candidate list every candidate of at least min_hd is
+    # reported. An exhaustive search only keeps the top results at the best
+    # Hamming distance, and abandons a candidate as soon as it cannot make it.
+    exhaustive = candidates is None
+    if exhaustive:
+        candidates = all_candidates(length)
+    params = {
+        "length": length,
+        "message_bits": message_bits,
+        "max_weight": max_weight,
+        "min_hd": min_hd,
+        "chunk_size": chunk_size,
+        "top": top,
+    }
+    if not exhaustive:
+        params["candidates"] = list(candidates)
+    state = SearchState(params, checkpoint, exhaustive, top if exhaustive else None)
+
+    chunks = [
+        (i, candidates[offset : offset + chunk_size])
+        for i, offset in enumerate(range(0, len(candidates), chunk_size))
+    ]
+    pending = [chunk for chunk in chunks if chunk[0] not in state.done]
+
+    def task(chunk):
+        if not exhaustive:
+            return (length, message_bits, max_weight, min_hd, None, chunk[1])
+        bar = max(min_hd, state.best_hd)
+        max_undetected = state.max_undetected if bar == state.best_hd else None
+        return (length, message_bits, max_weight, bar, max_undetected, chunk[1])
+
+    def finish(chunk_id, results):
+        state.add(chunk_id, results)
+        state.save()
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(pending) <= 1:
+        for chunk in pending:
+            finish(chunk[0], _evaluate_chunk(task(chunk)))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            # Keep a few chunks in flight so that later chunks are submitted
+            # with the best Hamming distance found so far
+            limit = 2 * workers
+            queue = iter(pending)
+            running = {}
+            while True:
+                while len(running) < limit:
+                    chunk = next(queue, None)
+                    if chunk is None:
+                        break
+                    running[executor.submit(_evaluate_chunk, task(chunk))] = chunk[0]
+                if not running:
+                    break
+                done, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    finish(running.pop(future), future.result())
+
+    return state.results
+
+
+def main(argv=None):
+    def auto_int(x):
+        return int(x, 0)
+
+    parser = argparse.ArgumentParser(
+        prog="crcgen search",
+        description="Evaluate CRC polynomials for Hamming distance at a message length",
+    )
+    parser.add_argument(
+        "candidates",
+        nargs="*",
+        type=auto_int,
+        help="Polynomials to evaluate in normal form (default: all of the length)",
+    )
+    parser.add_argument(
+        "-l", "--length", type=int, required=True, help="Length of the CRC in bits"
+    )
+    parser.add_argument(
+        "-k",
+        "--message-bits",
+        type=int,
+        required=True,
+        help="Message length in bits, not counting the CRC",
+    )
+    parser.add_argument(
+        "--max-weight",
+        type=int,
+        default=DEFAULT_MAX_WEIGHT,
+        help="Highest error weight to check (Default {})".format(DEFAULT_MAX_WEIGHT),
+    )
+    parser.add_argument(
+        "--min-hd",
+        type=int,
+        default=2,
+        help="Drop candidates with a lower Hamming distance (Default 2)",
+    )
+    parser.add_argument(
+        "--top", type=int, default=10, help="Number of results to print (Default 10)"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Candidates per work unit (Default {})".format(DEFAULT_CHUNK_SIZE),
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=str,
+        default=None,
+        help="Save progress to this file and resume from it if it exists",
+    )
+    args = parser.parse_args(argv)
+
+    if args.length < 1 or args.message_bits < 1:
+        parser.error("length and message bits must be positive")
+    if args.max_weight < 2:
+        parser.error("--max-weight must be at least 2")
+    mask = (1 << args.length) - 1
+    if any(poly & ~mask for poly in args.candidates):
+        parser.error("candidates must fit in {} bits".format(args.length))
+    if any(not poly & 1 for poly in args.candidates):
+        parser.error("candidates must have a +1 term")
+
+    try:
+        results = search(
+            args.length,
+            args.message_bits,
+            args.candidates or None,
+            args.max_weight,
+            args.min_hd,
+            args.jobs,
+            args.chunk_size,
+            args.checkpoint,
+            args.top,
+        )
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    digits = (args.length + 3) // 4
+    print(
+        "{:>{w}}  {:>4}  {:>12}  {:>{w}}  polynomial".format(
+            "poly", "HD", "undetected", "recip", w=digits + 2
+        )
+    )
+    for result in results[: args.top]:
+        hd = (
+            ">{}".format(args.max_weight)
+            if result.hd > args.max_weight
+            else str(result.hd)
+        )
+        print(
+            "0x{:0{d}X}  {:>4}  {:12d}  0x{:0{d}X}  {}".format(
+                result.poly,
+                hd,
+                result.undetected,
+                reciprocal(result.poly, args.length),
+                poly_to_str(int_to_poly(args.length, result.poly)),
+                d=digits,
+            )
+        )
+    return 0
@@ -0,0 +1,237 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+# Long-running generation server. Requests and responses are JSON objects, one
+# per line, read from stdin or a Unix socket. Generation requests take the same
+# keys as a batch manifest job (without output) and return the generated text.
+# Matrix requests return the packed rows as hex strings.
+#
+#   {"id": 1, "op": "generate", "preset": "CRC32", "width": 64}
+#   {"id": 1, "ok": true, "output": "----..."}
+#
+# The LFSR powers of recently used polynomials stay in memory, so a request for
+# a new width of a known polynomial only has to combine existing squarings.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import socketserver
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence, TextIO, Tuple
+
+from .__main__ import generate
+from .batch import JOB_FLAGS, JOB_OPTIONS, argparse_error, job_to_argv
+from .crcgen import PRESETS, LfsrPowers, int_to_poly, poly_to_int
+from .matrix import CrcMatrix
+
+DEFAULT_MAX_POLYS = 32
+
+# Job keys that make no sense for a request, the server has its own cache and
+# only returns output, it does not write files or start worker processes
+SERVER_EXCLUDED_KEYS = {"cache", "cache_dir", "vector_dir", "jobs"}
+SERVER_EXCLUDED_MODES = {"vhdl_testbench"}
+
+
+class WarmMatrices:
+    # Matrix source for generate() backed by an LRU of LfsrPowers
+    def __init__(self, max_polys: int = DEFAULT_MAX_POLYS):
+        self.max_polys = max_polys
+        self._powers: "OrderedDict[Tuple[int, int], LfsrPowers]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._powers)
+
+    def powers(self, poly: Sequence[int]) -> LfsrPowers:
+        key = (len(poly), poly_to_int(poly))
+        powers = self._powers.get(key)
+        if powers is None:
+            self.misses += 1
+            powers = self._powers[key] = LfsrPowers(key[1], key[0])
+            while len(self._powers) > self.max_polys:
+                self._powers.popitem(last=False)
+        else:
+            self.hits += 1
+            self._powers.move_to_end(key)
+        return powers
+
+    def build_crc_matrices(
+        self,
+        poly: Sequence[int],
+        dwidth: int,
+        reflect_input: bool = False,
+        method: str = "matrix",
+        workers: Optional[int] = 1,
+    ) -> Tuple[CrcMatrix, CrcMatrix]:
+        return self.powers(poly).matrices(dwidth, reflect_input)
+
+    def build_crc_matrices_sweep(
+        self, poly: Sequence[int], dwidths: Iterable[int], reflect_input: bool = False
+    ) -> Iterator[Tuple[int, Tuple[CrcMatrix, CrcMatrix]]]:
+        powers = self.powers(poly)
+        for dwidth in sorted(set(dwidths)):
+            yield (dwidth, powers.matrices(dwidth, reflect_input))
+
+
+class Server:
+    def __init__(self, max_polys: int = DEFAULT_MAX_POLYS):
+        self.matrices = WarmMatrices(max_polys)
+        # generate() writes to sys.stdout, so requests run one at a time
+        self._lock = threading.Lock()
+
+    def handle_line(self, line: str) -> str:
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            request_id = request.pop("id", None)
+            op = request.pop("op", "generate")
+            with self._lock:
+                if op == "generate":
+                    response = self.generate(request)
+                elif op == "matrices":
+                    response = self.build_matrices(request)
+                elif op == "stats":
+                    response = {
+                        "polys": len(self.matrices),
+                        "hits": self.matrices.hits,
+                        "misses": self.matrices.misses,
+                    }
+                else:
+                    raise ValueError("unknown op {!r}".format(op))
+            response = dict(ok=True, **response)
+        except Exception as e:
+            response = {"ok": False, "error": str(e)}
+        return json.dumps(dict(id=request_id, **response))
+
+    def generate(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        unknown = set(request) - (set(JOB_OPTIONS) | set(JOB_FLAGS))
+        unknown |= set(request) & SERVER_EXCLUDED_KEYS
+        if unknown:
+            raise ValueError("unknown keys {}".format(", ".join(sorted(unknown))))
+        if request.get("mode") in SERVER_EXCLUDED_MODES:
+            raise ValueError("mode {} is not available".format(request["mode"]))
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                generate(job_to_argv(request), self.matrices)
+        except SystemExit:
+            raise ValueError(argparse_error(stderr.getvalue()))
+        return {"output": stdout.getvalue()}
+
+    def build_matrices(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        unknown = set(request) - {"preset", "poly", "length", "width", "reflect_input"}
+        if unknown:
+            raise ValueError("unknown keys {}".format(", ".join(sorted(unknown))))
+        # Same defaults as the command line: the preset's input reflection,
+        # or no reflection without a preset
+        if "preset" in request:
+            preset = PRESETS[request["preset"]]
+            length, poly = preset.length, preset.poly
+            reflect_input = preset.reflect_input
+        else:
+            length, poly = request["length"], request["poly"]
+            if isinstance(poly, str):
+                poly = int(poly, 0)
+            reflect_input = False
+        dwidth = int(request["width"])
+        state_matrix, data_matrix = self.matrices.build_crc_matrices(
+            int_to_poly(length, poly),
+            dwidth,
+            bool(request.get("reflect_input", reflect_input)),
+        )
+        return {
+            "length": length,
+            "width": dwidth,
+            "state": [hex(row) for row in state_matrix.rows],
+            "data": [hex(row) for row in data_matrix.rows],
+        }
+
+    def serve_stream(self, infile: TextIO, outfile: TextIO):
+        for line in infile:
+            if line.strip():
+                outfile.write(self.handle_line(line) + "\n")
+                outfile.flush()
+
+
+class _StreamHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            if raw.strip():
+                response = self.server.crcgen.handle_line(raw.decode("utf-8"))
+                self.wfile.write(response.encode("utf-8") + b"\n")
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def socket_server(server: Server, path: str) -> _UnixServer:
+    # Bound and listening, the caller runs serve_forever() and closes it
+    if os.path.exists(path):
+        os.remove(path)
+    unix_server = _UnixServer(path, _StreamHandler)
+    unix_server.crcgen = server
+    return unix_server
+
+
+def serve_socket(server: Server, path: str):
+    with socket_server(server, path) as unix_server:
+        unix_server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="crcgen serve",
+        description="Serve JSON-lines generation requests on stdin or a Unix socket",
+    )
+    parser.add_argument(
+        "--socket",
+        type=str,
+        default=None,
+        help="Listen on this Unix socket instead of stdin/stdout",
+    )
+    parser.add_argument(
+        "--max-polys",
+        type=int,
+        default=DEFAULT_MAX_POLYS,
+        help="Polynomials kept in the in-memory cache (Default {})".format(
+            DEFAULT_MAX_POLYS
+        ),
+    )
+    args = parser.parse_args(argv)
+
+    server = Server(args.max_polys)
+    if args.socket is None:
+        server.serve_stream(sys.stdin, sys.stdout)
+    else:
+        try:
+            serve_socket(server, args.socket)
+        except KeyboardInterrupt:
+            pass
+    return 0
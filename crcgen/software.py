@@ -0,0 +1,185 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+# Table-driven software CRC using the same LFSR model as the hardware
+# generator. The state passed in and out of update() is the hardware state
+# register, bit i of the int being state(i) of the generated VHDL.
+#
+# Internally the register is always processed in reflected (LSB first) form:
+# input that is not reflected is bit-reversed a byte at a time with
+# bytes.translate(), which is equivalent and lets one set of tables serve both
+# cases.
+
+import binascii
+import zlib
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+from .crcgen import build_crc_matrices, poly_to_int
+from .matrix import gf2_matrix_apply, gf2_matrix_power
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+SLICES = (1, 4, 8, 16)
+
+REVERSED_BYTES = bytes(int("{:08b}".format(i)[::-1], 2) for i in range(256))
+
+
+def reflect(value: int, width: int) -> int:
+    return int("{:0{}b}".format(value, width)[::-1], 2) if width else 0
+
+
+def _gen_slice_update(slices: int) -> Callable:
+    # Unrolled slice-by-N loop, one table lookup per byte of the chunk
+    lines = [
+        "def update(register, data, tables):",
+        "    ({},) = tables".format(", ".join("t{}".format(k) for k in range(slices))),
+        "    from_bytes = int.from_bytes",
+        "    end = len(data) - len(data) % {}".format(slices),
+        "    for offset in range(0, end, {}):".format(slices),
+        "        x = register ^ from_bytes(data[offset : offset + {}], 'little')".format(
+            slices
+        ),
+        "        register = (x >> {}) ^ {}".format(
+            8 * slices,
+            " ^ ".join(
+                "t{}[(x >> {}) & 0xFF]".format(slices - 1 - k, 8 * k)
+                for k in range(slices)
+            ),
+        ),
+        "    for byte in data[end:]:",
+        "        register = (register >> 8) ^ t0[(register ^ byte) & 0xFF]",
+        "    return register",
+    ]
+    namespace: Dict[str, Callable] = {}
+    exec("\n".join(lines), namespace)
+    return namespace["update"]
+
+
+_SLICE_UPDATES = {slices: _gen_slice_update(slices) for slices in SLICES}
+
+
+class SoftwareCrc:
+    def __init__(
+        self,
+        poly: Sequence[int],
+        reflect_input: bool = True,
+        reflect_output: Optional[bool] = None,
+        init: int = 0,
+        xorout: int = 0,
+        slices: int = 8,
+        native: bool = True,
+    ):
+        if slices not in SLICES:
+            raise ValueError("slices must be one of {}".format(SLICES))
+        self.length = len(poly)
+        self.poly = poly_to_int(poly)
+        self.poly_bits = list(poly)
+        self.reflect_input = reflect_input
+        self.reflect_output = (
+            reflect_input if reflect_output is None else reflect_output
+        )
+        self.init = init
+        self.xorout = xorout
+        self.slices = slices
+        self.mask = (1 << self.length) - 1
+        self.tables = self._build_tables()
+        self._update = _SLICE_UPDATES[slices]
+        self.native = native
+        self._native_update = self._find_native_update() if native else None
+        self._byte_advance: Optional[List[int]] = None
+        self._advance_cache: Dict[int, List[int]] = {}
+
+    def _build_tables(self) -> List[List[int]]:
+        taps = reflect((self.poly | 1) & self.mask, self.length)
+        table = []
+        for i in range(256):
+            register = i
+            for _ in range(8):
+                register = (register >> 1) ^ taps if register & 1 else register >> 1
+            table.append(register)
+        tables = [table]
+        for _ in range(1, self.slices):
+            prev = tables[-1]
+            tables.append([(entry >> 8) ^ table[entry & 0xFF] for entry in prev])
+        return tables
+
+    def _find_native_update(self) -> Optional[Callable[[int, Buffer], int]]:
+        # Use the C implementations in the standard library where they match
+        if self.length == 32 and self.poly == 0x04C11DB7 and self.reflect_input:
+
+            def crc32_update(state: int, data: Buffer) -> int:
+                register = reflect(state, 32) ^ 0xFFFFFFFF
+                return reflect(zlib.crc32(data, register) ^ 0xFFFFFFFF, 32)
+
+            return crc32_update
+        if self.length == 16 and self.poly == 0x1021 and not self.reflect_input:
+
+            def crc_hqx_update(state: int, data: Buffer) -> int:
+                return binascii.crc_hqx(data, state)
+
+            return crc_hqx_update
+        return None
+
+    def update(self, state: int, data: Buffer) -> int:
+        if self._native_update is not None:
+            return self._native_update(state, data)
+        if not self.reflect_input:
+            data = bytes(data).translate(REVERSED_BYTES)
+        register = self._update(reflect(state, self.length), data, self.tables)
+        return reflect(register, self.length)
+
+    def finalize(self, state: int) -> int:
+        if self.reflect_output:
+            state = reflect(state, self.length)
+        return state ^ self.xorout
+
+    def crc(self, data: Buffer) -> int:
+        return self.finalize(self.update(self.init, data))
+
+    def advance(self, state: int, nbytes: int) -> int:
+        # State after nbytes zero bytes, from the state-propagation matrix
+        return gf2_matrix_apply(self.advance_matrix(nbytes), state)
+
+    def advance_matrix(self, nbytes: int) -> List[int]:
+        matrix = self._advance_cache.get(nbytes)
+        if matrix is None:
+            if self._byte_advance is None:
+                state_matrix, _ = build_crc_matrices(self.poly_bits, 8)
+                self._byte_advance = list(state_matrix.rows)
+            matrix = gf2_matrix_power(self._byte_advance, nbytes)
+            if len(self._advance_cache) < 16:
+                self._advance_cache[nbytes] = matrix
+        return matrix
+
+    def combine_state(self, state_a: int, state_b: int, len_b: int) -> int:
+        # state_a is the state after message A, state_b the state after
+        # message B starting from zero; returns the state after A + B
+        return self.advance(state_a, len_b) ^ state_b
+
+    def combine(self, crc_a: int, crc_b: int, len_b: int) -> int:
+        # Combine two finalized CRCs, like zlib's crc32_combine. The CRC is
+        # affine in the message, so the init and xorout terms cancel out
+        state = crc_a ^ self.finalize(self.init)
+        if self.reflect_output:
+            state = reflect(state, self.length)
+        state = self.advance(state, len_b)
+        if self.reflect_output:
+            state = reflect(state, self.length)
+        return state ^ crc_b
+
+    @property
+    def check(self) -> int:
+        return self.crc(b"123456789")
@@ -0,0 +1,146 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+# Generation statistics: wall time per phase, and size estimates for the
+# generated equations. Each output bit is an XOR of fan-in f terms, which a
+# tree of 6-input LUTs implements with ceil((f - 1) / 5) LUTs and a depth of
+# ceil(log6(f)) levels. The estimates are taken from the network a mode
+# actually emits, which is named in the network column.
+
+import contextlib
+import time
+from typing import Dict, Iterator, List, NamedTuple, Sequence
+
+from .matrix import CrcMatrix
+from .xornet import XorNetwork
+
+LUT_INPUTS = 6
+
+
+class EquationStats(NamedTuple):
+    dwidth: int
+    fanin: List[int]
+    xor_terms: int
+    max_fanin: int
+    lut6: int
+    depth: int
+    network: str = "flat"
+
+
+def lut_count(fanin: int, lut_inputs: int = LUT_INPUTS) -> int:
+    return max(0, -(-(fanin - 1) // (lut_inputs - 1)))
+
+
+def lut_depth(fanin: int, lut_inputs: int = LUT_INPUTS) -> int:
+    depth = 0
+    reach = 1
+    while reach < fanin:
+        reach *= lut_inputs
+        depth += 1
+    return depth
+
+
+def equation_stats(
+    dwidth: int,
+    state_matrix: Sequence[Sequence[int]],
+    data_matrix: Sequence[Sequence[int]],
+    network: str = "flat",
+) -> EquationStats:
+    length = len(state_matrix)
+    state_rows = CrcMatrix.coerce(state_matrix, length).transpose()
+    data_rows = CrcMatrix.coerce(data_matrix, length).transpose()
+    fanin = [
+        state_rows.row_popcount(i) + data_rows.row_popcount(i) for i in range(length)
+    ]
+    return EquationStats(
+        dwidth,
+        fanin,
+        sum(fanin),
+        max(fanin, default=0),
+        sum(lut_count(f) for f in fanin),
+        max((lut_depth(f) for f in fanin), default=0),
+        network,
+    )
+
+
+def network_stats(
+    dwidth: int, network: XorNetwork, label: str = "shared"
+) -> EquationStats:
+    # Each shared term is a two input XOR of its own, so it costs a LUT and
+    # a level on top of the deepest of its operands
+    levels = [0] * network.num_inputs
+    for a, b in network.terms:
+        levels.append(1 + max(levels[a], levels[b]))
+    fanin = [len(row) for row in network.rows]
+    return EquationStats(
+        dwidth,
+        fanin,
+        sum(fanin) + 2 * len(network.terms),
+        max(fanin, default=0),
+        len(network.terms) + sum(lut_count(f) for f in fanin),
+        max(
+            (
+                max((levels[var] for var in row), default=0) + lut_depth(len(row))
+                for row in network.rows
+            ),
+            default=0,
+        ),
+        label,
+    )
+
+
+class GenerationStats:
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.equations: List[EquationStats] = []
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.phases.values())
+
+    def format(self) -> str:
+        lines = ["{:10} {:>10}".format("phase", "seconds")]
+        for name, seconds in self.phases.items():
+            lines.append("{:10} {:10.6f}".format(name, seconds))
+        lines.append("{:10} {:10.6f}".format("total", self.total_seconds))
+        if self.equations:
+            lines.append("")
+            lines.append(
+                "{:>6} {:>10} {:>10} {:>8} {:>6}  {}".format(
+                    "width", "xor_terms", "max_fanin", "lut6", "depth", "network"
+                )
+            )
+            for eq in self.equations:
+                lines.append(
+                    "{:6d} {:10d} {:10d} {:8d} {:6d}  {}".format(
+                        eq.dwidth,
+                        eq.xor_terms,
+                        eq.max_fanin,
+                        eq.lut6,
+                        eq.depth,
+                        eq.network,
+                    )
+                )
+        return "\n".join(lines)
@@ -0,0 +1,145 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+# State-space transformation of the CRC recurrence (Derby's method). With a
+# change of state basis y = T * x the recurrence x' = A * x + D * d becomes
+#
+#   y' = (T * A * T^-1) * y + (T * D) * d
+#
+# Taking the columns of T^-1 as the Krylov basis b, A * b, ..., A^(n-1) * b
+# of a vector b puts T * A * T^-1 in companion form: every state bit is fed
+# by its neighbour and at most the top bit, so the state feedback in the
+# loop-carried path is at most two XOR inputs wide. The input and output
+# transforms T and T^-1 sit outside the loop. When A^W has no cyclic vector,
+# which happens when the polynomial has repeated factors, the basis is built
+# from several such chains and the feedback is one input wider per chain.
+
+import random
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+from .matrix import CrcMatrix, gf2_matrix_apply, gf2_matrix_multiply
+
+# Random starting vectors tried after the unit vectors
+RANDOM_CANDIDATES = 16
+
+
+class StateTransform(NamedTuple):
+    # Matrices hold one column int per row, like the matrix builders
+    forward: CrcMatrix
+    inverse: CrcMatrix
+    state_matrix: CrcMatrix
+    data_matrix: CrcMatrix
+    original_state_matrix: CrcMatrix
+
+
+def gf2_matrix_inverse(matrix: Sequence[int], length: int) -> Optional[List[int]]:
+    # Gauss-Jordan elimination on [M | I], one int per row
+    rows = CrcMatrix(length, matrix).transpose().rows
+    augmented = [row | 1 << (length + i) for i, row in enumerate(rows)]
+    for col in range(length):
+        pivot = next((r for r in range(col, length) if augmented[r] >> col & 1), None)
+        if pivot is None:
+            return None
+        augmented[col], augmented[pivot] = augmented[pivot], augmented[col]
+        for r in range(length):
+            if r != col and augmented[r] >> col & 1:
+                augmented[r] ^= augmented[col]
+    return CrcMatrix(length, [row >> length for row in augmented]).transpose().rows
+
+
+def krylov_basis(state_matrix: Sequence[int], starts: Sequence[int]) -> List[int]:
+    # Chains start, A * start, ... taken until they stop adding rank. One
+    # chain gives the companion form. When A has no cyclic vector further
+    # chains are needed, which costs one more feedback input per chain
+    length = len(state_matrix)
+    basis: List[int] = []
+    reduced: Dict[int, int] = {}
+    for vector in starts:
+        while len(basis) < length:
+            row = vector
+            for pivot in sorted(reduced, reverse=True):
+                if row >> pivot & 1:
+                    row ^= reduced[pivot]
+            if not row:
+                break
+            reduced[row.bit_length() - 1] = row
+            basis.append(vector)
+            vector = gf2_matrix_apply(state_matrix, vector)
+        if len(basis) == length:
+            break
+    return basis
+
+
+def feedback_fanin(state_matrix: Sequence[Sequence[int]]) -> List[int]:
+    length = len(state_matrix)
+    rows = CrcMatrix.coerce(state_matrix, length).transpose()
+    return [rows.row_popcount(i) for i in range(length)]
+
+
+def derby_transform(
+    state_matrix: Sequence[Sequence[int]],
+    data_matrix: Sequence[Sequence[int]],
+    seed: int = 0,
+) -> StateTransform:
+
+    length = len(state_matrix)
+    state = CrcMatrix.coerce(state_matrix, length)
+    data = CrcMatrix.coerce(data_matrix, length)
+    rng = random.Random(seed)
+    candidates = [1 << i for i in range(length)]
+    candidates += [rng.getrandbits(length) | 1 for _ in range(RANDOM_CANDIDATES)]
+
+    # Keep the basis with the fewest feedback chains, then the fewest data
+    # and output transform terms
+    best = None
+    for k in range(len(candidates)):
+        inverse = krylov_basis(state.rows, candidates[k:] + candidates[:k])
+        forward = gf2_matrix_inverse(inverse, length)
+        if forward is None:
+            continue
+        transformed_data = gf2_matrix_multiply(forward, data.rows)
+        companion = gf2_matrix_multiply(
+            forward, gf2_matrix_multiply(state.rows, inverse)
+        )
+        cost = (
+            max(feedback_fanin(CrcMatrix(length, companion))),
+            CrcMatrix(length, transformed_data).popcount(),
+            CrcMatrix(length, inverse).popcount(),
+        )
+        if best is None or cost < best[0]:
+            best = (cost, forward, inverse, transformed_data)
+    if best is None:
+        raise ValueError("the state matrix has no companion form")
+
+    _, forward, inverse, transformed_data = best
+    companion = gf2_matrix_multiply(forward, gf2_matrix_multiply(state.rows, inverse))
+    return StateTransform(
+        CrcMatrix(length, forward),
+        CrcMatrix(length, inverse),
+        CrcMatrix(length, companion),
+        CrcMatrix(length, transformed_data),
+        state,
+    )
+
+
+def vhdl_transform_lines(
+    length: int, matrix: Sequence[Sequence[int]], target: str = "result"
+) -> Iterator[str]:
+
+    rows = CrcMatrix.coerce(matrix, length).transpose()
+    for i in range(length):
+        terms = " xor ".join("state({})".format(j) for j in rows.row_bits(i))
+        yield "        {}({}) := {};".format(target, i, terms or "'0'")
@@ -0,0 +1,206 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+# Random test vectors and a VHDL testbench for the generated next-state
+# functions. Vectors are evaluated bit-sliced: slice i is an int holding bit i
+# of every vector in a block, so one big-int XOR per matrix entry evaluates a
+# whole block at once. The slices are turned back into one hex line per
+# vector a digit column at a time, with NumPy when it is installed.
+
+import random
+from typing import Iterator, List, Optional, Sequence, TextIO
+
+from .crcgen import emit_lines
+from .matrix import CrcMatrix
+
+try:
+    from . import gf2_numpy
+except ImportError:
+    gf2_numpy = None
+
+DEFAULT_VECTORS = 100000
+BLOCK_SIZE = 65536
+
+BIT_BYTES = bytes.maketrans(b"01", b"\x00\x01")
+HEX_DIGITS = bytes(b"0123456789ABCDEF"[i % 16] for i in range(256))
+
+
+def random_slices(rng: random.Random, nbits: int, count: int) -> List[int]:
+    return [rng.getrandbits(count) for _ in range(nbits)]
+
+
+def evaluate_slices(
+    state_matrix: Sequence[Sequence[int]],
+    data_matrix: Sequence[Sequence[int]],
+    state_slices: Sequence[int],
+    data_slices: Sequence[int],
+) -> List[int]:
+
+    length = len(state_slices)
+    state_rows = CrcMatrix.coerce(state_matrix, length).transpose()
+    data_rows = CrcMatrix.coerce(data_matrix, length).transpose()
+    outputs = []
+    for i in range(length):
+        value = 0
+        for j in state_rows.row_bits(i):
+            value ^= state_slices[j]
+        for j in data_rows.row_bits(i):
+            value ^= data_slices[j]
+        outputs.append(value)
+    return outputs
+
+
+def _bytes_per_vector(value: int, count: int) -> int:
+    # One byte per vector, vector 0 first, holding its bit of the slice
+    bits = "{:0{}b}".format(value, count)[::-1].encode("ascii")
+    return int.from_bytes(bits.translate(BIT_BYTES), "big")
+
+
+def slices_to_hex(slices: Sequence[int], count: int) -> List[bytes]:
+    # Returns one string of hex digits per output digit, most significant
+    # digit first, with the character for vector k at index k. Four slices
+    # are combined into a nibble per byte with whole-block int arithmetic
+    digits = []
+    for low in reversed(range(0, len(slices), 4)):
+        nibble = 0
+        for bit in range(low, min(low + 4, len(slices))):
+            nibble += _bytes_per_vector(slices[bit], count) << (bit - low)
+        digits.append(nibble.to_bytes(count, "big").translate(HEX_DIGITS))
+    return digits
+
+
+def hex_lines(
+    fields: Sequence[Sequence[int]], count: int, use_numpy: Optional[bool] = None
+) -> str:
+    if use_numpy is None:
+        use_numpy = gf2_numpy is not None
+    if use_numpy:
+        return gf2_numpy.hex_lines(fields, count)
+
+    columns = []
+    for field in fields:
+        if columns:
+            columns.append(b" " * count)
+        columns += slices_to_hex(field, count)
+    columns.append(b"\n" * count)
+    # Interleave the columns into lines with strided slice assignment
+    lines = bytearray(count * len(columns))
+    for i, column in enumerate(columns):
+        lines[i :: len(columns)] = column
+    return lines.decode("ascii")
+
+
+def write_vectors(
+    state_matrix: Sequence[Sequence[int]],
+    data_matrix: Sequence[Sequence[int]],
+    count: int,
+    stimulus: TextIO,
+    expected: TextIO,
+    seed: int = 0,
+    block_size: int = BLOCK_SIZE,
+    use_numpy: Optional[bool] = None,
+) -> None:
+
+    length = len(state_matrix)
+    dwidth = len(data_matrix)
+    rng = random.Random(seed)
+    for start in range(0, count, block_size):
+        block = min(block_size, count - start)
+        state_slices = random_slices(rng, length, block)
+        data_slices = random_slices(rng, dwidth, block)
+        next_slices = evaluate_slices(
+            state_matrix, data_matrix, state_slices, data_slices
+        )
+        stimulus.write(hex_lines([state_slices, data_slices], block, use_numpy))
+        expected.write(hex_lines([next_slices], block, use_numpy))
+
+
+@emit_lines
+def iter_vhdl_testbench(
+    cmdline: str,
+    name: str,
+    length: int,
+    dwidth: int,
+    stimulus_file: str,
+    expected_file: str,
+) -> Iterator[str]:
+
+    yield "----------------------------------------"
+    yield "-- Parallel CRC Testbench (VHDL-2008)"
+    yield "-- CRC width:{} data width: {}".format(length, dwidth)
+    yield "-- Checks {} from {}_pkg against file vectors".format(name, name)
+    yield "-- Generated with crcgen"
+    yield "-- https://github.com/MegabytePhreak/crcgen"
+    yield "-- arguments: {}".format(cmdline)
+    yield "-- SPDX-License-Identifier: 0BSD"
+    yield "----------------------------------------"
+    yield ""
+    yield "library ieee;"
+    yield "use ieee.std_logic_1164.all;"
+    yield "use std.textio.all;"
+    yield "use work.{}_pkg.all;".format(name)
+    yield ""
+    yield "entity {}_tb is".format(name)
+    yield "    generic ("
+    yield '        STIMULUS_FILE : string := "{}";'.format(stimulus_file)
+    yield '        EXPECTED_FILE : string := "{}"'.format(expected_file)
+    yield "    );"
+    yield "end {}_tb;".format(name)
+    yield ""
+    yield "architecture sim of {}_tb is".format(name)
+    yield "begin"
+    yield ""
+    yield "    process"
+    yield "        file stimulus : text open read_mode is STIMULUS_FILE;"
+    yield "        file expected : text open read_mode is EXPECTED_FILE;"
+    yield "        variable stimulus_line : line;"
+    yield "        variable expected_line : line;"
+    yield "        variable state : std_logic_vector({} downto 0);".format(length - 1)
+    yield "        variable data : std_logic_vector({} downto 0);".format(dwidth - 1)
+    yield (
+        "        variable next_state : std_logic_vector({} downto 0);".format(
+            length - 1
+        )
+    )
+    yield "        variable vectors : natural := 0;"
+    yield "        variable errors : natural := 0;"
+    yield "    begin"
+    yield "        while not endfile(stimulus) loop"
+    yield "            readline(stimulus, stimulus_line);"
+    yield "            hread(stimulus_line, state);"
+    yield "            hread(stimulus_line, data);"
+    yield "            readline(expected, expected_line);"
+    yield "            hread(expected_line, next_state);"
+    yield "            if {}(state, data) /= next_state then".format(name)
+    yield "                if errors < 10 then"
+    yield (
+        '                    report "mismatch at vector " & integer\'image(vectors)'
+        " severity error;"
+    )
+    yield "                end if;"
+    yield "                errors := errors + 1;"
+    yield "            end if;"
+    yield "            vectors := vectors + 1;"
+    yield "        end loop;"
+    yield (
+        '        report integer\'image(vectors) & " vectors, " & '
+        'integer\'image(errors) & " errors";'
+    )
+    yield '        assert errors = 0 report "{} failed" severity failure;'.format(name)
+    yield "        wait;"
+    yield "    end process;"
+    yield ""
+    yield "end sim;"
@@ -0,0 +1,114 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+# XOR network helpers. An XOR network is described by its output rows, each a
+# list of variable indices to be XORed together. Variables 0..len(state)-1 are
+# state bits, followed by the data bits, followed by any shared intermediate
+# terms, which are defined as the XOR of exactly two earlier variables.
+
+import heapq
+from typing import List, NamedTuple, Sequence, Tuple
+
+from .matrix import CrcMatrix, popcount
+
+
+class XorNetwork(NamedTuple):
+    num_inputs: int
+    terms: List[Tuple[int, int]]
+    rows: List[List[int]]
+
+
+def matrix_rows(
+    state_matrix: Sequence[Sequence[int]], data_matrix: Sequence[Sequence[int]]
+) -> List[List[int]]:
+    length = len(state_matrix)
+    state_rows = CrcMatrix.coerce(state_matrix, length).transpose()
+    data_rows = CrcMatrix.coerce(data_matrix, length).transpose()
+    return [
+        list(state_rows.row_bits(i)) + [length + j for j in data_rows.row_bits(i)]
+        for i in range(length)
+    ]
+
+
+def xor_gate_count(network: XorNetwork) -> int:
+    return len(network.terms) + sum(max(len(row) - 1, 0) for row in network.rows)
+
+
+def flat_network(rows: Sequence[Sequence[int]], num_inputs: int) -> XorNetwork:
+    return XorNetwork(num_inputs, [], [list(row) for row in rows])
+
+
+def share_xor_terms(rows: Sequence[Sequence[int]], num_inputs: int) -> XorNetwork:
+    # Paar's greedy algorithm: repeatedly pull out the pair of variables that
+    # appears together in the most rows as a new shared term, until no pair is
+    # used more than once.
+    occurrences = [0] * num_inputs
+    for row_index, row in enumerate(rows):
+        for var in row:
+            occurrences[var] |= 1 << row_index
+    new_rows = [set(row) for row in rows]
+    terms: List[Tuple[int, int]] = []
+
+    heap = []
+    active = [var for var in range(num_inputs) if occurrences[var]]
+    for i, a in enumerate(active):
+        occ_a = occurrences[a]
+        for b in active[i + 1 :]:
+            count = popcount(occ_a & occurrences[b])
+            if count > 1:
+                heap.append((-count, a, b))
+    heapq.heapify(heap)
+    live = active
+
+    while heap:
+        neg_count, a, b = heapq.heappop(heap)
+        shared = occurrences[a] & occurrences[b]
+        if popcount(shared) != -neg_count:
+            # Stale entry, the current count was pushed when it changed
+            continue
+
+        term = len(occurrences)
+        terms.append((a, b))
+        occurrences.append(shared)
+        occurrences[a] &= ~shared
+        occurrences[b] &= ~shared
+        row_mask = shared
+        row_index = 0
+        while row_mask:
+            if row_mask & 1:
+                row = new_rows[row_index]
+                row.discard(a)
+                row.discard(b)
+                row.add(term)
+            row_mask >>= 1
+            row_index += 1
+
+        # Pairs with a or b only lost the rows now covered by the new term,
+        # pairs with the new term are all fresh
+        live = [var for var in live if occurrences[var]]
+        for other in live:
+            occ_other = occurrences[other]
+            if occ_other & shared:
+                for var in (a, b):
+                    count = popcount(occurrences[var] & occ_other)
+                    if count > 1:
+                        heapq.heappush(heap, (-count, min(var, other), max(var, other)))
+                count = popcount(shared & occ_other)
+                if count > 1:
+                    heapq.heappush(heap, (-count, other, term))
+        live.append(term)
+
+    return XorNetwork(num_inputs, terms, [sorted(row) for row in new_rows])
@@ -8,6 +8,9 @@ setup(
     author_email="roukemap@gmail.com",
     license="0BSD",
     test_suite="unittest",
+    extras_require={
+        "numpy": ["numpy"],
+    },
     entry_points={
         "console_scripts": [
             "crcgen = crcgen.__main__:main",
@@ -0,0 +1,119 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from crcgen.__main__ import main
+from crcgen.batch import load_manifest, run_batch
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write_manifest(self, manifest):
+        path = os.path.join(self.tmpdir.name, "manifest.json")
+        with open(path, "w") as f:
+            json.dump(manifest, f)
+        return path
+
+    @staticmethod
+    def generate(argv):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            main(argv)
+        return output.getvalue()
+
+    def test_batch(self):
+        path = self.write_manifest(
+            {
+                "defaults": {"reflect_input": False},
+                "jobs": [
+                    {"preset": "CRC32", "width": 16, "output": "crc32.vhd"},
+                    {"poly": 0x5, "length": 5, "width": "4:8:4", "output": "c5.vhd"},
+                ],
+            }
+        )
+        jobs = load_manifest(path)
+        for workers in (1, 2):
+            results = run_batch(jobs, workers)
+            self.assertEqual([r.error for r in results], [None, None])
+            with open(os.path.join(self.tmpdir.name, "crc32.vhd")) as f:
+                self.assertEqual(
+                    f.read(),
+                    self.generate(
+                        ["--preset", "CRC32", "--width", "16", "--no-reflect-input"]
+                    ),
+                )
+            with open(os.path.join(self.tmpdir.name, "c5.vhd")) as f:
+                self.assertEqual(
+                    f.read(),
+                    self.generate(
+                        [
+                            "--poly",
+                            "0x5",
+                            "--length",
+                            "5",
+                            "--width",
+                            "4:8:4",
+                            "--no-reflect-input",
+                        ]
+                    ),
+                )
+
+    def test_failed_job(self):
+        path = self.write_manifest(
+            [{"preset": "CRC32", "width": "bad", "output": "bad.vhd"}]
+        )
+        with contextlib.redirect_stderr(io.StringIO()):
+            results = run_batch(load_manifest(path))
+        self.assertEqual(results[0].error, "argument -w/--width: invalid width: 'bad'")
+        self.assertEqual(os.listdir(self.tmpdir.name), ["manifest.json"])
+
+    def test_testbench_vectors(self):
+        # Vector files go next to the output unless vector_dir is given
+        os.mkdir(os.path.join(self.tmpdir.name, "out"))
+        path = self.write_manifest(
+            [
+                {
+                    "preset": "CRC8-SMBUS",
+                    "width": 8,
+                    "mode": "vhdl_testbench",
+                    "vectors": 10,
+                    "output": os.path.join("out", "tb.vhd"),
+                }
+            ]
+        )
+        jobs = load_manifest(path)
+        self.assertEqual(jobs[0]["vector_dir"], os.path.join(self.tmpdir.name, "out"))
+        results = run_batch(jobs, 1)
+        self.assertEqual(results[0].error, None)
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.tmpdir.name, "out"))),
+            ["crc8_smbus_8b_expected.txt", "crc8_smbus_8b_stimulus.txt", "tb.vhd"],
+        )
+
+    def test_unknown_key(self):
+        path = self.write_manifest([{"preset": "CRC32", "output": "x", "bogus": 1}])
+        with self.assertRaises(ValueError):
+            load_manifest(path)
@@ -0,0 +1,121 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from bench.bench_crcgen import (
+    PHASES,
+    BenchRun,
+    Result,
+    compare_results,
+    load_results,
+    load_run,
+    main,
+    run_benchmarks,
+    run_mismatch,
+    save_results,
+)
+
+
+class TestBench(unittest.TestCase):
+    def test_run(self):
+        results = run_benchmarks(["CRC5-USB", "CRC32"], [8, 16], repeat=1)
+        self.assertEqual(len(results), 2 * 2 * len(PHASES))
+        for result in results:
+            self.assertGreater(result.seconds, 0)
+            self.assertGreater(result.peak_bytes, 0)
+
+    def test_save_load(self):
+        results = [Result("CRC32", 8, "matrices", 0.5, 1000)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "baseline.json")
+            save_results(path, results, "matrix")
+            self.assertEqual(load_results(path), results)
+            self.assertEqual(load_run(path), BenchRun("matrix", [8], results))
+
+    def test_compare(self):
+        baseline = [
+            Result("CRC32", 8, "matrices", 0.1, 1000),
+            Result("CRC32", 8, "vhdl", 0.0001, 1000),
+            Result("CRC32", 16, "vhdl", 0.1, 1000),
+        ]
+        current = [
+            Result("CRC32", 8, "matrices", 0.2, 1100),
+            Result("CRC32", 8, "vhdl", 0.0005, 1000),
+            Result("CRC32", 16, "vhdl", 0.11, 2000),
+            Result("CRC64-ECMA", 8, "vhdl", 1.0, 1000),
+        ]
+        regressions = compare_results(baseline, current, threshold=0.25)
+        self.assertEqual(
+            [(r.key, r.metric) for r in regressions],
+            [
+                (("CRC32", 8, "matrices"), "seconds"),
+                (("CRC32", 16, "vhdl"), "peak_bytes"),
+            ],
+        )
+        self.assertAlmostEqual(regressions[0].ratio, 2.0)
+        self.assertEqual(compare_results(baseline, current, threshold=1.5), [])
+
+    def test_main_compare(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = os.path.join(tmp, "baseline.json")
+            current = os.path.join(tmp, "current.json")
+            save_results(baseline, [Result("CRC32", 8, "matrices", 0.1, 1000)], "")
+            save_results(current, [Result("CRC32", 8, "matrices", 0.3, 1000)], "")
+            stderr = io.StringIO()
+            with contextlib.redirect_stderr(stderr):
+                self.assertEqual(main(["compare", baseline, baseline]), 0)
+                self.assertEqual(main(["compare", baseline, current]), 1)
+            self.assertIn("REGRESSION CRC32 8 matrices seconds", stderr.getvalue())
+
+    def test_mismatch(self):
+        results = [Result("CRC32", 8, "matrices", 0.1, 1000)]
+        base = BenchRun("serial", [8, 16], results)
+        self.assertEqual(run_mismatch(base, base), [])
+        problems = run_mismatch(base, BenchRun("numpy", [8], results))
+        self.assertEqual(len(problems), 2)
+        self.assertIn("--method serial, not numpy", problems[0])
+        self.assertIn("widths 8,16 differ from 8", problems[1])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = os.path.join(tmp, "baseline.json")
+            current = os.path.join(tmp, "current.json")
+            save_results(baseline, results, "serial")
+            save_results(current, results, "numpy")
+            stderr = io.StringIO()
+            with contextlib.redirect_stderr(stderr):
+                for argv in (
+                    ["compare", baseline, current],
+                    ["compare", baseline, "--method", "numpy", "-w", "8"],
+                ):
+                    with self.assertRaises(SystemExit):
+                        main(argv)
+            self.assertIn("--method serial, not numpy", stderr.getvalue())
+
+            # Different widths only warn
+            save_results(
+                current, results + [Result("CRC32", 16, "vhdl", 0.1, 1)], "serial"
+            )
+            stderr = io.StringIO()
+            with contextlib.redirect_stderr(stderr):
+                self.assertEqual(main(["compare", baseline, current]), 0)
+            self.assertIn(
+                "WARNING baseline widths 8 differ from 8,16", stderr.getvalue()
+            )
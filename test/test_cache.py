@@ -0,0 +1,92 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from crcgen.cache import MatrixCache, decode_matrices, encode_matrices
+from crcgen.crcgen import build_crc_matrices, int_to_poly
+
+CRC32_POLY = int_to_poly(32, 0x04C11DB7)
+
+
+class TestMatrixCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_encode_roundtrip(self):
+        matrices = build_crc_matrices(CRC32_POLY, 24, True)
+        blob = encode_matrices(32, True, matrices)
+        self.assertEqual(decode_matrices(blob), (32, 24, True, matrices))
+        with self.assertRaises(ValueError):
+            decode_matrices(blob[:-1])
+
+    def test_warm_run_skips_build(self):
+        expected = build_crc_matrices(CRC32_POLY, 16, False)
+        MatrixCache(self.tmpdir.name).build_crc_matrices(CRC32_POLY, 16, False)
+
+        cache = MatrixCache(self.tmpdir.name)
+        with mock.patch("crcgen.cache.build_crc_matrices") as build:
+            self.assertEqual(cache.build_crc_matrices(CRC32_POLY, 16, False), expected)
+            build.assert_not_called()
+
+    def test_sweep(self):
+        cache = MatrixCache(self.tmpdir.name)
+        cache.build_crc_matrices(CRC32_POLY, 16, True)
+        sweep = list(cache.build_crc_matrices_sweep(CRC32_POLY, [24, 8, 16], True))
+        self.assertEqual([dwidth for dwidth, _ in sweep], [8, 16, 24])
+        for dwidth, matrices in sweep:
+            self.assertEqual(matrices, build_crc_matrices(CRC32_POLY, dwidth, True))
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 3)
+
+    def test_unwritable_directory(self):
+        # A directory below a regular file can never be created
+        blocker = os.path.join(self.tmpdir.name, "file")
+        open(blocker, "w").close()
+        cache = MatrixCache(os.path.join(blocker, "cache"))
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            for dwidth in (8, 16):
+                self.assertEqual(
+                    cache.build_crc_matrices(CRC32_POLY, dwidth, True),
+                    build_crc_matrices(CRC32_POLY, dwidth, True),
+                )
+        self.assertTrue(cache.write_warned)
+        self.assertEqual(stderr.getvalue().count("not writing matrix cache"), 1)
+        # Entries are still remembered in memory
+        with mock.patch("crcgen.cache.build_crc_matrices") as build:
+            cache.build_crc_matrices(CRC32_POLY, 8, True)
+            build.assert_not_called()
+
+    def test_evict_and_clear(self):
+        cache = MatrixCache(self.tmpdir.name, max_size=1000)
+        for dwidth in (8, 16, 32, 64):
+            cache.build_crc_matrices(CRC32_POLY, dwidth, True)
+        self.assertLessEqual(
+            sum(
+                os.path.getsize(os.path.join(self.tmpdir.name, name))
+                for name in os.listdir(self.tmpdir.name)
+            ),
+            1000,
+        )
+        cache.clear()
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+        self.assertIsNone(cache.get(CRC32_POLY, 64, True))
@@ -15,17 +15,36 @@
 #
 
 
+import contextlib
+import io
 import os.path
+import re
 import types
 import unittest
+from unittest import mock
 
+from crcgen.__main__ import main
 from crcgen.crcgen import (
+    PRESETS,
+    LfsrPowers,
+    _build_crc_columns_parallel,
+    _build_crc_columns_serial,
     build_crc_matrices,
+    build_crc_matrices_sweep,
+    fold_init,
+    gen_vhdl_package,
     int_to_poly,
+    iter_vhdl_package,
+    lfsr_shift_bit,
+    lfsr_shift_bit_int,
     lfsr_shift_serial,
+    lfsr_shift_serial_int,
+    lfsr_transition_matrix,
     poly_to_int,
     poly_to_str,
 )
+from crcgen.matrix import gf2_matrix_power
+from crcgen.software import SoftwareCrc
 
 CRC5_USB_POLY = [1, 0, 1, 0, 0]
 CRC32_POLY = int_to_poly(32, 0x04C11DB7)
@@ -142,6 +161,29 @@ class TestLfsrShiftSerial(unittest.TestCase):
         self.assertEqual(shifted, str_to_bits("11101101101110001000001100100000"))
 
 
+class TestLfsrShiftInt(unittest.TestCase):
+    def test_crc5_usb_bit(self):
+        poly = poly_to_int(CRC5_USB_POLY)
+        self.assertEqual(lfsr_shift_bit_int(poly, 5, 0b00001, 0), 0b00010)
+        self.assertEqual(lfsr_shift_bit_int(poly, 5, 0b10000, 0), 0b00101)
+        self.assertEqual(lfsr_shift_bit_int(poly, 5, 0b00000, 1), 0b00101)
+        self.assertEqual(lfsr_shift_bit_int(poly, 5, 0b10000, 1), 0b00000)
+        self.assertEqual(
+            lfsr_shift_bit(CRC5_USB_POLY, [0, 0, 0, 0, 1], 0), [1, 0, 1, 0, 0]
+        )
+
+    def test_crc32_64(self):
+        poly = poly_to_int(CRC32_POLY)
+        self.assertEqual(
+            lfsr_shift_serial_int(poly, 32, 1 << 0, 0, 64),
+            poly_to_int(str_to_bits("10110001111001101011000010010010")),
+        )
+        self.assertEqual(
+            lfsr_shift_serial_int(poly, 32, 0, 1 << 63, 64),
+            poly_to_int(str_to_bits("11101101101110001000001100100000")),
+        )
+
+
 class TestBuildCRCMatrices(unittest.TestCase):
     def test_crc5_usb_4(self):
         prop_state, prop_data = build_crc_matrices(CRC5_USB_POLY, 4, True)
@@ -274,6 +316,101 @@ class TestBuildCRCMatrices(unittest.TestCase):
             ],
         )
 
+    def test_matrix_method(self):
+        for poly in (CRC5_USB_POLY, CRC32_POLY):
+            for dwidth in (1, 4, 5, 8, 16, 33, 64):
+                for reflect_input in (True, False):
+                    self.assertEqual(
+                        build_crc_matrices(poly, dwidth, reflect_input, "matrix"),
+                        build_crc_matrices(poly, dwidth, reflect_input, "serial"),
+                    )
+
+    def test_numpy_method(self):
+        poly = int_to_poly(64, 0x42F0E1EBA9EA3693)
+        for dwidth in (1, 8, 63, 64, 65, 200):
+            for reflect_input in (True, False):
+                expected = build_crc_matrices(poly, dwidth, reflect_input)
+                self.assertEqual(
+                    build_crc_matrices(poly, dwidth, reflect_input, "numpy"), expected
+                )
+                with mock.patch("crcgen.crcgen.gf2_numpy", None):
+                    self.assertEqual(
+                        build_crc_matrices(poly, dwidth, reflect_input, "numpy"),
+                        expected,
+                    )
+
+    def test_parallel_serial(self):
+        poly = int_to_poly(64, 0x42F0E1EBA9EA3693)
+        for dwidth, workers in ((1, 2), (8, 3), (200, 4), (65, None)):
+            for reflect_input in (True, False):
+                self.assertEqual(
+                    build_crc_matrices(poly, dwidth, reflect_input, "serial", workers),
+                    build_crc_matrices(poly, dwidth, reflect_input),
+                    (dwidth, workers),
+                )
+        # The chunked path without a pool gives the same columns
+        self.assertEqual(
+            _build_crc_columns_parallel(0x04C11DB7, 32, 48, 1),
+            _build_crc_columns_serial(0x04C11DB7, 32, 48),
+        )
+
+    def test_main_jobs(self):
+        def generate(*argv):
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout):
+                main(["--preset", "CRC32", "-w", "64"] + list(argv))
+            return stdout.getvalue().splitlines()
+
+        # Only the recorded arguments differ
+        serial = generate()
+        for jobs in ("2", "0"):
+            parallel = generate("-j", jobs)
+            self.assertEqual(len(parallel), len(serial))
+            self.assertEqual(
+                [line for line in parallel if "arguments" not in line],
+                [line for line in serial if "arguments" not in line],
+            )
+        with contextlib.redirect_stderr(io.StringIO()):
+            for argv in (
+                ("-j", "-1"),
+                ("-j", "2", "--method", "matrix"),
+                ("-j", "0", "--method", "numpy"),
+                ("-j", "2", "-w", "8:32:8"),
+                ("-j", "2", "-m", "vhdl_residual"),
+            ):
+                with self.assertRaises(SystemExit):
+                    generate(*argv)
+
+    def test_sweep(self):
+        for reflect_input in (True, False):
+            widths = [32, 1, 8, 16, 24, 5]
+            sweep = list(build_crc_matrices_sweep(CRC32_POLY, widths, reflect_input))
+            self.assertEqual([dwidth for dwidth, _ in sweep], sorted(widths))
+            for dwidth, matrices in sweep:
+                self.assertEqual(
+                    matrices, build_crc_matrices(CRC32_POLY, dwidth, reflect_input)
+                )
+
+    def test_gf2_matrix_power(self):
+        poly = poly_to_int(CRC32_POLY)
+        transition = lfsr_transition_matrix(poly, 32)
+        for exponent in (0, 1, 2, 7, 64, 100):
+            power = gf2_matrix_power(transition, exponent)
+            for i in range(32):
+                self.assertEqual(
+                    power[i], lfsr_shift_serial_int(poly, 32, 1 << i, 0, exponent)
+                )
+
+    def test_lfsr_powers(self):
+        # Reused between widths, including ones that are not a power of two
+        powers = LfsrPowers(poly_to_int(CRC32_POLY), 32)
+        for dwidth in (5, 3, 100, 64, 257, 1):
+            for reflect_input in (True, False):
+                self.assertEqual(
+                    powers.matrices(dwidth, reflect_input),
+                    build_crc_matrices(CRC32_POLY, dwidth, reflect_input),
+                )
+
 
 class TestCrcCalculation(unittest.TestCase):
     @staticmethod
@@ -371,3 +508,106 @@ class TestCrcCalculation(unittest.TestCase):
         self.check_crc32_16([0xAA0F, 0x5500], int_to_poly(32, 0xB6C9B287))
         self.check_crc32_16([0xFF00, 0x1155], int_to_poly(32, 0x32A06212))
         self.check_crc32_16([0xFFFF, 0xFFFF], int_to_poly(32, 0xFFFFFFFF))
+
+
+class TestVhdlPackage(unittest.TestCase):
+    def test_streaming(self):
+        state_matrix, data_matrix = build_crc_matrices(CRC32_POLY, 16, True)
+        chunks = iter_vhdl_package(
+            "-w 16", "crc32_16b", CRC32_POLY, 16, state_matrix, data_matrix
+        )
+        self.assertIsInstance(chunks, types.GeneratorType)
+        chunks = list(chunks)
+        self.assertTrue(all(chunk.endswith("\n") for chunk in chunks))
+        package = gen_vhdl_package(
+            "-w 16", "crc32_16b", CRC32_POLY, 16, state_matrix, data_matrix
+        )
+        self.assertEqual("".join(chunks), package)
+        self.assertEqual(
+            sum(chunk.startswith("        next_state(") for chunk in chunks), 32
+        )
+        self.assertTrue(package.endswith("end crc32_16b_pkg;\n"))
+
+    def vhdl_function(self, package, name):
+        # Evaluate the bit assignments of one generated function
+        body = package.split("function {}(".format(name))[-1]
+        body = body.split("end {};".format(name))[0]
+        equations = {}
+        for target, expr in re.findall(r"\w+\((\d+)\) := (.*);", body):
+            expr = expr.replace("not ", "1 ^ ").replace(" xor ", " ^ ")
+            expr = re.sub(r"(data|state)\((\d+)\)", r"(\1 >> \2 & 1)", expr)
+            equations[int(target)] = compile(expr.replace("'", ""), name, "eval")
+
+        def function(**values):
+            return sum(eval(expr, values) << i for i, expr in equations.items())
+
+        return function
+
+    def test_params(self):
+        for preset, dwidth in (
+            ("CRC32", 32),
+            ("CRC16-CCITT-FALSE", 16),
+            ("CRC5-USB", 8),
+        ):
+            params = PRESETS[preset]
+            poly = int_to_poly(params.length, params.poly)
+            crc = SoftwareCrc(poly, *params[3:5], params.init, params.xorout)
+            matrices = build_crc_matrices(poly, dwidth, params.reflect_input)
+            self.assertEqual(
+                fold_init(matrices[0], params.init),
+                crc.update(params.init, bytes(dwidth // 8)),
+            )
+            package = gen_vhdl_package(
+                "", "crc", poly, dwidth, *matrices, params=params
+            )
+            first = self.vhdl_function(package, "crc_first")
+            next_state = self.vhdl_function(package, "crc")
+            final = self.vhdl_function(package, "crc_final")
+            byteorder = "little" if params.reflect_input else "big"
+            message = b"123456789abcdefg"
+            words = [
+                int.from_bytes(message[k : k + dwidth // 8], byteorder)
+                for k in range(0, len(message), dwidth // 8)
+            ]
+            state = first(data=words[0])
+            for word in words[1:]:
+                state = next_state(state=state, data=word)
+            self.assertEqual(final(state=state), crc.crc(message), preset)
+
+        # Without parameters only the next state function is generated
+        matrices = build_crc_matrices(CRC32_POLY, 8, True)
+        package = gen_vhdl_package("", "crc", CRC32_POLY, 8, *matrices)
+        self.assertNotIn("_first", package)
+        self.assertNotIn("-- init:", package)
+
+    def test_main_params(self):
+        def generate(*argv):
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout):
+                main(["-l", "16", "-p", "0x1021", "-w", "16"] + list(argv))
+            return stdout.getvalue()
+
+        self.assertNotIn("crc16_16b_first", generate())
+        package = generate("-R", "--init", "0xFFFF")
+        self.assertIn("-- init: 0xFFFF reflect output: False xorout: 0x0000", package)
+        self.assertIn("function crc16_16b_first(", package)
+        self.assertIn("        crc(0) := state(0);", package)
+        package = generate("--xorout", "1")
+        self.assertIn("        crc(0) := not state(15);", package)
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                generate("--init", "0x10000")
+
+
+class TestPresets(unittest.TestCase):
+    def test_check(self):
+        for name, params in PRESETS.items():
+            self.assertEqual(PRESETS[name][:2], (params.length, params.poly))
+            crc = SoftwareCrc(
+                int_to_poly(params.length, params.poly),
+                params.reflect_input,
+                params.reflect_output,
+                params.init,
+                params.xorout,
+            )
+            self.assertEqual(crc.check, params.check, name)
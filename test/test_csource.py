@@ -0,0 +1,199 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+import contextlib
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from crcgen.__main__ import main
+from crcgen.crcgen import PRESETS, build_crc_matrices, int_to_poly
+from crcgen.csource import c_type, iter_c_source, slice_tables
+from crcgen.matrix import gf2_matrix_apply
+from crcgen.software import SoftwareCrc
+from crcgen.vectors import write_vectors
+
+CRC32_POLY = int_to_poly(32, 0x04C11DB7)
+CC = shutil.which("cc") or shutil.which("gcc")
+
+# Runs the generated functions over a message given as words on the command
+# line, printing the finalized CRC
+CHECK_MAIN = """
+#include <stdio.h>
+#include <stdlib.h>
+#include "{source}"
+
+int main(int argc, char **argv)
+{{
+    {state_t} state = {name}_first(({data_t}) strtoull(argv[1], NULL, 16));
+    for (int i = 2; i < argc; i++) {{
+        state = {name}(state, ({data_t}) strtoull(argv[i], NULL, 16));
+    }}
+    printf("%llx\\n", (unsigned long long) {name}_final(state));
+    return 0;
+}}
+"""
+
+
+class TestCSource(unittest.TestCase):
+    def test_c_type(self):
+        self.assertEqual(c_type(5), "uint8_t")
+        self.assertEqual(c_type(16), "uint16_t")
+        self.assertEqual(c_type(24), "uint32_t")
+        self.assertEqual(c_type(64), "uint64_t")
+        with self.assertRaises(ValueError):
+            c_type(65)
+
+    def test_slice_tables(self):
+        state_matrix, data_matrix = build_crc_matrices(CRC32_POLY, 16, True)
+        tables = slice_tables(32, state_matrix, data_matrix)
+        self.assertEqual(len(tables), 6)
+        crc = SoftwareCrc(CRC32_POLY, True)
+        for state, data in ((0x12345678, 0xABCD), (0xFFFFFFFF, 0), (0, 0x8001)):
+            value = 0
+            for k in range(4):
+                value ^= tables[k][state >> 8 * k & 0xFF]
+            for k in range(2):
+                value ^= tables[4 + k][data >> 8 * k & 0xFF]
+            self.assertEqual(value, crc.update(state, data.to_bytes(2, "little")))
+
+        # State bytes are padded so the data tables start on a byte boundary
+        poly = int_to_poly(5, 0x05)
+        state_matrix, data_matrix = build_crc_matrices(poly, 8, True)
+        tables = slice_tables(5, state_matrix, data_matrix)
+        self.assertEqual(len(tables), 2)
+        self.assertEqual(tables[1][0xA5], gf2_matrix_apply(data_matrix.rows, 0xA5))
+
+    def test_source(self):
+        state_matrix, data_matrix = build_crc_matrices(CRC32_POLY, 8, True)
+        table = "".join(
+            iter_c_source("", "crc", CRC32_POLY, 8, state_matrix, data_matrix)
+        )
+        self.assertIn("static const uint32_t crc_table[5][256]", table)
+        self.assertIn("uint32_t crc(uint32_t state, uint8_t data)", table)
+        self.assertNotIn("crc_first", table)
+        parity = "".join(
+            iter_c_source("", "crc", CRC32_POLY, 8, state_matrix, data_matrix, "parity")
+        )
+        self.assertNotIn("crc_table", parity)
+        self.assertEqual(parity.count("crc_parity(data &"), 32)
+        with self.assertRaises(ValueError):
+            "".join(
+                iter_c_source(
+                    "", "crc", CRC32_POLY, 8, state_matrix, data_matrix, "slice"
+                )
+            )
+
+    def test_main(self):
+        def generate(*argv):
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout):
+                main(["-m", "c_source"] + list(argv))
+            return stdout.getvalue()
+
+        source = generate("--preset", "CRC16-XMODEM", "-w", "32", "--c-style", "parity")
+        self.assertIn("uint16_t crc16_xmodem_32b_first(uint32_t data)", source)
+        self.assertIn("crc16_xmodem_32b_parity", source)
+        with contextlib.redirect_stderr(io.StringIO()):
+            for argv in (
+                ("--preset", "CRC32", "-w", "8", "16"),
+                ("--preset", "CRC32", "-w", "128"),
+                ("--preset", "CRC32", "-w", "32", "--share-xor"),
+            ):
+                with self.assertRaises(SystemExit):
+                    generate(*argv)
+
+
+@unittest.skipIf(CC is None, "no C compiler")
+class TestCompiledSource(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+
+    def write(self, source, name):
+        path = os.path.join(self.tempdir.name, name)
+        with open(path + ".c", "w") as f:
+            f.write(source)
+        return path
+
+    def compile(self, source, name, *defines):
+        path = self.write(source, name)
+        subprocess.run(
+            [CC, "-std=c99", "-O2", "-Wall", "-Werror", "-o", path, path + ".c"]
+            + ["-D" + define for define in defines],
+            check=True,
+        )
+        return path
+
+    def test_vectors(self):
+        # The benchmark harness checks the testbench vector files
+        for poly, dwidth, reflect, style in (
+            (CRC32_POLY, 32, True, "table"),
+            (CRC32_POLY, 64, False, "parity"),
+            (int_to_poly(5, 0x05), 12, True, "table"),
+            (int_to_poly(64, 0x42F0E1EBA9EA3693), 8, True, "parity"),
+        ):
+            matrices = build_crc_matrices(poly, dwidth, reflect)
+            files = [
+                os.path.join(self.tempdir.name, kind)
+                for kind in ("stimulus.txt", "expected.txt")
+            ]
+            with open(files[0], "w") as stimulus, open(files[1], "w") as expected:
+                write_vectors(*matrices, 500, stimulus, expected, seed=dwidth)
+            source = "".join(iter_c_source("", "crc", poly, dwidth, *matrices, style))
+            binary = self.compile(source, "bench", "CRCGEN_BENCHMARK")
+            result = subprocess.run(
+                [binary] + files + ["1000"], check=True, stdout=subprocess.PIPE
+            )
+            self.assertIn(b"500 vectors, 0 errors", result.stdout)
+
+    def test_params(self):
+        message = b"123456789abcdefg"
+        for preset, dwidth, style in (
+            ("CRC32", 32, "table"),
+            ("CRC16-CCITT-FALSE", 16, "parity"),
+            ("CRC5-USB", 8, "parity"),
+            ("CRC64-XZ", 64, "table"),
+        ):
+            params = PRESETS[preset]
+            poly = int_to_poly(params.length, params.poly)
+            matrices = build_crc_matrices(poly, dwidth, params.reflect_input)
+            source = "".join(
+                iter_c_source("", "crc", poly, dwidth, *matrices, style, params)
+            )
+            self.write(source, "crc")
+            binary = self.compile(
+                CHECK_MAIN.format(
+                    source="crc.c",
+                    name="crc",
+                    state_t=c_type(params.length),
+                    data_t=c_type(dwidth),
+                ),
+                "check",
+            )
+            byteorder = "little" if params.reflect_input else "big"
+            words = [
+                "{:x}".format(int.from_bytes(message[k : k + dwidth // 8], byteorder))
+                for k in range(0, len(message), dwidth // 8)
+            ]
+            result = subprocess.run(
+                [binary] + words, check=True, stdout=subprocess.PIPE
+            )
+            crc = SoftwareCrc(poly, *params[3:5], params.init, params.xorout)
+            self.assertEqual(int(result.stdout, 16), crc.crc(message), preset)
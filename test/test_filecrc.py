@@ -0,0 +1,90 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+
+import io
+import mmap
+import os
+import random
+import tempfile
+import threading
+import unittest
+
+from crcgen.crcgen import int_to_poly
+from crcgen.filecrc import file_crc, stream_crc
+from crcgen.software import SoftwareCrc
+
+
+class TestFileCrc(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(5)
+        self.data = bytes(
+            rng.getrandbits(8) for _ in range(3 * mmap.ALLOCATIONGRANULARITY + 123)
+        )
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, "wb") as f:
+            f.write(self.data)
+        self.addCleanup(os.remove, self.path)
+
+    def test_file_crc(self):
+        cases = [
+            SoftwareCrc(
+                int_to_poly(32, 0x04C11DB7), True, True, 0xFFFFFFFF, 0xFFFFFFFF
+            ),
+            SoftwareCrc(int_to_poly(16, 0x8005), False, False, 0xFFFF, 0),
+        ]
+        for crc in cases:
+            expected = crc.crc(self.data)
+            for workers in (1, 2):
+                self.assertEqual(
+                    file_crc(self.path, crc, workers, mmap.ALLOCATIONGRANULARITY),
+                    expected,
+                )
+            self.assertEqual(file_crc(self.path, crc, 1), expected)
+            self.assertEqual(stream_crc(io.BytesIO(self.data), crc, 1000), expected)
+
+    def test_empty_file(self):
+        crc = SoftwareCrc(
+            int_to_poly(32, 0x04C11DB7), True, True, 0xFFFFFFFF, 0xFFFFFFFF
+        )
+        with open(self.path, "wb"):
+            pass
+        self.assertEqual(file_crc(self.path, crc), 0)
+
+    @unittest.skipUnless(hasattr(os, "mkfifo"), "needs named pipes")
+    def test_fifo(self):
+        crc = SoftwareCrc(
+            int_to_poly(32, 0x04C11DB7), True, True, 0xFFFFFFFF, 0xFFFFFFFF
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "fifo")
+            os.mkfifo(path)
+
+            def write():
+                with open(path, "wb") as f:
+                    f.write(self.data)
+
+            writer = threading.Thread(target=write)
+            writer.start()
+            try:
+                self.assertEqual(file_crc(path, crc), crc.crc(self.data))
+            finally:
+                # Unblock the writer if file_crc never opened the pipe
+                writer.join(1)
+                if writer.is_alive():
+                    with open(path, "rb") as f:
+                        f.read()
+                    writer.join()
@@ -0,0 +1,164 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+import contextlib
+import io
+import random
+import re
+import unittest
+
+from crcgen.__main__ import main
+from crcgen.crcgen import PRESETS, build_crc_matrices, int_to_poly
+from crcgen.folded import (
+    build_folded,
+    folded_next_state,
+    folded_stats,
+    iter_vhdl_folded_package,
+)
+from crcgen.matrix import gf2_matrix_apply
+from crcgen.software import SoftwareCrc
+from crcgen.stats import equation_stats
+
+CRC32_POLY = int_to_poly(32, 0x04C11DB7)
+
+
+def vhdl_function(package, name):
+    body = package.split("function {}(".format(name))[-1]
+    body = body.split("end {};".format(name))[0]
+    equations = {}
+    for target, expr in re.findall(r"\w+\((\d+)\) := (.*);", body):
+        expr = expr.replace("not ", "1 ^ ").replace(" xor ", " ^ ")
+        expr = re.sub(r"(\w+)\((\d+)\)", r"(\1 >> \2 & 1)", expr)
+        equations[int(target)] = compile(expr.replace("'", ""), name, "eval")
+
+    def function(**values):
+        return sum(eval(expr, values) << i for i, expr in equations.items())
+
+    return function
+
+
+class TestFolded(unittest.TestCase):
+    def test_next_state(self):
+        rng = random.Random(5)
+        for reflect_input in (True, False):
+            for dwidth, lanes in ((64, 4), (96, 3), (32, 1), (256, 8)):
+                state_matrix, data_matrix = build_crc_matrices(
+                    CRC32_POLY, dwidth, reflect_input
+                )
+                plan = build_folded(CRC32_POLY, dwidth, lanes, reflect_input)
+                self.assertEqual(plan.lanes, lanes)
+                for _ in range(20):
+                    state = rng.getrandbits(32)
+                    data = rng.getrandbits(dwidth)
+                    self.assertEqual(
+                        folded_next_state(plan, state, data),
+                        gf2_matrix_apply(state_matrix.rows, state)
+                        ^ gf2_matrix_apply(data_matrix.rows, data),
+                    )
+        with self.assertRaises(ValueError):
+            build_folded(CRC32_POLY, 60, 8)
+
+    def test_stats(self):
+        plan = build_folded(CRC32_POLY, 512, 8, True)
+        flat = equation_stats(512, *build_crc_matrices(CRC32_POLY, 512, True))
+        stats = folded_stats(plan)
+        self.assertLess(stats.max_fanin, flat.max_fanin)
+        self.assertLess(stats.combine_depth, flat.depth)
+        self.assertEqual(stats.depth, stats.lane_depth + stats.combine_depth)
+        self.assertGreater(stats.lut6, flat.lut6)
+
+    def test_vhdl(self):
+        rng = random.Random(6)
+        plan = build_folded(CRC32_POLY, 64, 4, False)
+        package = "".join(iter_vhdl_folded_package("", "crc", CRC32_POLY, plan))
+        self.assertIn(
+            "        partial(127 downto 96) := crc_lane(data(63 downto 48));", package
+        )
+        lane = vhdl_function(package, "crc_lane")
+        combine = vhdl_function(package, "crc_combine")
+        for _ in range(10):
+            state = rng.getrandbits(32)
+            data = rng.getrandbits(64)
+            partial = sum(
+                lane(data=data >> (16 * k) & 0xFFFF) << (32 * k) for k in range(4)
+            )
+            self.assertEqual(
+                combine(state=state, partial=partial),
+                folded_next_state(plan, state, data),
+            )
+
+    def test_params(self):
+        message = b"123456789abcdefghijklmno"
+        for preset, dwidth, lanes in (
+            ("CRC32", 64, 4),
+            ("CRC16-CCITT-FALSE", 32, 2),
+            ("CRC64-XZ", 96, 3),
+        ):
+            params = PRESETS[preset]
+            poly = int_to_poly(params.length, params.poly)
+            length = params.length
+            lane_width = dwidth // lanes
+            plan = build_folded(poly, dwidth, lanes, params.reflect_input)
+            package = "".join(
+                iter_vhdl_folded_package("", "crc", poly, plan, params=params)
+            )
+            self.assertIn("return crc_combine_first(partial);", package)
+            lane = vhdl_function(package, "crc_lane")
+            combine = vhdl_function(package, "crc_combine")
+            combine_first = vhdl_function(package, "crc_combine_first")
+            final = vhdl_function(package, "crc_final")
+
+            def partial(data):
+                mask = (1 << lane_width) - 1
+                return sum(
+                    lane(data=data >> (lane_width * k) & mask) << (length * k)
+                    for k in range(lanes)
+                )
+
+            byteorder = "little" if params.reflect_input else "big"
+            words = [
+                int.from_bytes(message[k : k + dwidth // 8], byteorder)
+                for k in range(0, len(message), dwidth // 8)
+            ]
+            state = combine_first(partial=partial(words[0]))
+            for word in words[1:]:
+                state = combine(state=state, partial=partial(word))
+            crc = SoftwareCrc(poly, *params[3:5], params.init, params.xorout)
+            self.assertEqual(final(state=state), crc.crc(message), preset)
+
+    def test_main(self):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            main(["--preset", "CRC32", "-w", "128", "-m", "vhdl_folded"])
+        self.assertIn(
+            "-- CRC width:32 data width: 128 in 4 lanes of 32 bits", stdout.getvalue()
+        )
+        self.assertIn("-- folded ", stdout.getvalue())
+        self.assertIn(
+            "-- loop_depth assumes the crc32_128b_lane results are registered",
+            stdout.getvalue(),
+        )
+        self.assertIn("function crc32_128b_first(", stdout.getvalue())
+        self.assertIn("function crc32_128b_final(", stdout.getvalue())
+
+        with contextlib.redirect_stderr(io.StringIO()):
+            for argv in (
+                ["-w", "30"],
+                ["-w", "32", "--lanes", "0"],
+                ["-w", "32", "--share-xor"],
+            ):
+                with self.assertRaises(SystemExit):
+                    main(["--preset", "CRC32", "-m", "vhdl_folded"] + argv)
@@ -0,0 +1,79 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+import random
+import unittest
+
+from crcgen.crcgen import build_crc_matrices, int_to_poly
+from crcgen.matrix import CrcMatrix, iter_bits, popcount
+
+CRC32_POLY = int_to_poly(32, 0x04C11DB7)
+
+
+class TestCrcMatrix(unittest.TestCase):
+    def setUp(self):
+        self.lists = [[1, 0, 1], [0, 0, 0], [1, 1, 0], [0, 1, 1]]
+        self.matrix = CrcMatrix.from_lists(self.lists, 3)
+
+    def test_list_view(self):
+        self.assertEqual(self.matrix.rows, [0b101, 0b000, 0b011, 0b110])
+        self.assertEqual(len(self.matrix), 4)
+        self.assertEqual(self.matrix[2], [1, 1, 0])
+        self.assertEqual(self.matrix[-1], [0, 1, 1])
+        self.assertEqual(self.matrix[1:3], [[0, 0, 0], [1, 1, 0]])
+        self.assertEqual(list(self.matrix), self.lists)
+        self.assertEqual(self.matrix[2][1], 1)
+        self.assertEqual(self.matrix.tolist(), self.lists)
+
+    def test_equality(self):
+        self.assertEqual(self.matrix, self.lists)
+        self.assertEqual(self.lists, self.matrix)
+        self.assertEqual(self.matrix, CrcMatrix(3, [5, 0, 3, 6]))
+        self.assertNotEqual(self.matrix, CrcMatrix(4, [5, 0, 3, 6]))
+        self.assertNotEqual(self.matrix, self.lists[:3])
+        self.assertNotEqual(self.matrix, "abc")
+        self.assertIs(CrcMatrix.coerce(self.matrix, 3), self.matrix)
+        self.assertEqual(CrcMatrix.coerce(self.lists, 3), self.matrix)
+
+    def test_bits(self):
+        self.assertEqual(list(iter_bits(0b1010011)), [0, 1, 4, 6])
+        self.assertEqual(list(self.matrix.row_bits(3)), [1, 2])
+        self.assertEqual(self.matrix.row_popcount(0), 2)
+        self.assertEqual(self.matrix.popcount(), 6)
+        self.assertEqual(popcount(0xF0F0), 8)
+
+    def test_transpose(self):
+        transposed = self.matrix.transpose()
+        self.assertEqual(transposed.width, 4)
+        self.assertEqual(transposed, [list(column) for column in zip(*self.lists)])
+        self.assertEqual(transposed.transpose(), self.matrix)
+        self.assertEqual(CrcMatrix(3, []).transpose(), CrcMatrix(0, [0, 0, 0]))
+
+        rng = random.Random(1)
+        wide = CrcMatrix(64, [rng.getrandbits(64) for _ in range(300)])
+        slow = [0] * 64
+        for j, row in enumerate(wide.rows):
+            for i in iter_bits(row):
+                slow[i] |= 1 << j
+        self.assertEqual(wide.transpose().rows, slow)
+
+    def test_build(self):
+        state_matrix, data_matrix = build_crc_matrices(CRC32_POLY, 16, True)
+        self.assertIsInstance(state_matrix, CrcMatrix)
+        self.assertIsInstance(data_matrix, CrcMatrix)
+        self.assertEqual(state_matrix.width, 32)
+        self.assertEqual(len(data_matrix), 16)
+        self.assertEqual(data_matrix[0], int_to_poly(32, data_matrix.rows[0]))
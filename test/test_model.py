@@ -0,0 +1,120 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+import random
+import unittest
+
+from crcgen.crcgen import PRESETS, build_crc_matrices, int_to_poly
+from crcgen.matrix import gf2_matrix_apply
+from crcgen.model import (
+    MODEL_STYLES,
+    compile_crc_model,
+    compile_next_state,
+    model_style,
+)
+from crcgen.software import SoftwareCrc
+
+CRC32_POLY = int_to_poly(32, 0x04C11DB7)
+
+
+def reference_next_state(matrices, state, data):
+    return gf2_matrix_apply(matrices[0].rows, state) ^ gf2_matrix_apply(
+        matrices[1].rows, data
+    )
+
+
+class TestModel(unittest.TestCase):
+    def test_model_style(self):
+        self.assertEqual(model_style(32, 32), "table")
+        self.assertEqual(model_style(5, 128), "parity")
+        self.assertEqual(model_style(64, 16384), "parity")
+
+    def test_next_state(self):
+        rng = random.Random(5)
+        for poly, dwidth, reflect in (
+            (CRC32_POLY, 32, True),
+            (CRC32_POLY, 12, False),
+            (int_to_poly(5, 0x05), 11, True),
+            (int_to_poly(64, 0x42F0E1EBA9EA3693), 200, False),
+        ):
+            matrices = build_crc_matrices(poly, dwidth, reflect)
+            length = len(poly)
+            for style in MODEL_STYLES:
+                next_state = compile_next_state(*matrices, style=style)
+                for _ in range(20):
+                    state = rng.getrandbits(length)
+                    data = rng.getrandbits(dwidth)
+                    self.assertEqual(
+                        next_state(state, data),
+                        reference_next_state(matrices, state, data),
+                        (length, dwidth, style),
+                    )
+                # Bits past the widths are ignored
+                state = rng.getrandbits(length)
+                data = rng.getrandbits(dwidth)
+                self.assertEqual(
+                    next_state(state | 1 << length + 3, data | 1 << dwidth),
+                    next_state(state, data),
+                )
+
+    def test_software(self):
+        crc = SoftwareCrc(CRC32_POLY, True)
+        next_state = compile_next_state(*build_crc_matrices(CRC32_POLY, 64, True))
+        data = bytes(range(8))
+        self.assertEqual(
+            next_state(0x1234, int.from_bytes(data, "little")),
+            crc.update(0x1234, data),
+        )
+
+    def test_cache(self):
+        matrices = build_crc_matrices(CRC32_POLY, 16, True)
+        first = compile_next_state(*matrices)
+        self.assertIs(compile_next_state(*matrices), first)
+        # Equal matrices from a separate build share the compiled function
+        self.assertIs(
+            compile_next_state(*build_crc_matrices(CRC32_POLY, 16, True)), first
+        )
+        self.assertIsNot(compile_next_state(*matrices, style="parity"), first)
+        with self.assertRaises(ValueError):
+            compile_next_state(*matrices, style="slice")
+
+    def test_crc_model(self):
+        message = b"123456789abcdefg"
+        for preset, dwidth in (
+            ("CRC32", 32),
+            ("CRC16-CCITT-FALSE", 16),
+            ("CRC5-USB", 8),
+            ("CRC64-XZ", 64),
+        ):
+            params = PRESETS[preset]
+            poly = int_to_poly(params.length, params.poly)
+            model = compile_crc_model(
+                *build_crc_matrices(poly, dwidth, params.reflect_input), params
+            )
+            byteorder = "little" if params.reflect_input else "big"
+            words = [
+                int.from_bytes(message[k : k + dwidth // 8], byteorder)
+                for k in range(0, len(message), dwidth // 8)
+            ]
+            state = model.first(words[0])
+            for word in words[1:]:
+                state = model.next_state(state, word)
+            crc = SoftwareCrc(poly, *params[3:5], params.init, params.xorout)
+            self.assertEqual(model.final(state), crc.crc(message), preset)
+
+        model = compile_crc_model(*build_crc_matrices(CRC32_POLY, 8, True))
+        self.assertIsNone(model.first)
+        self.assertIsNone(model.final)
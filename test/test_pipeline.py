@@ -0,0 +1,257 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+
+import random
+import re
+import unittest
+
+from crcgen.crcgen import PRESETS, build_crc_matrices, int_to_poly
+from crcgen.pipeline import gen_vhdl_pipeline, plan_pipeline
+from crcgen.software import SoftwareCrc
+from crcgen.xornet import matrix_rows
+
+CRC32_POLY = int_to_poly(32, 0x04C11DB7)
+
+
+def evaluate_plan(plan, data_bits):
+    signals = data_bits
+    for stage in plan.stages:
+        next_signals = []
+        for group in stage:
+            bit = 0
+            for signal in group:
+                bit ^= signals[signal]
+            next_signals.append(bit)
+        signals = next_signals
+    return [0 if output is None else signals[output] for output in plan.outputs]
+
+
+class PipelineSim:
+    # Cycle model of the generated entity, interpreting the statements of the
+    # clocked process and the concurrent crc assignments
+    def __init__(self, vhdl):
+        process = vhdl.split("if rising_edge(clk) then")[1]
+        process = process.split("    end process;")[0]
+        self.lines = [line.strip() for line in process.splitlines()]
+        self.lines = [line for line in self.lines if line][:-1]
+        self.statements, _ = self.parse(0)
+        body = vhdl.split("    end process;")[1]
+        self.outputs = re.findall(r"^    (crc(?:\(\d+\))?) <= (.*);$", body, re.M)
+        self.signals = {}
+        self.variables = {}
+
+    def parse(self, pos):
+        statements = []
+        while pos < len(self.lines):
+            line = self.lines[pos]
+            if line in ("else", "end if;"):
+                break
+            if line.startswith("if "):
+                cond = line[3 : -len(" = '1' then")]
+                then, pos = self.parse(pos + 1)
+                otherwise = []
+                if self.lines[pos] == "else":
+                    otherwise, pos = self.parse(pos + 1)
+                statements.append((cond, then, otherwise))
+            else:
+                statements.append(line)
+            pos += 1
+        return statements, pos
+
+    def value(self, name):
+        if name in self.variables:
+            return self.variables[name]
+        return self.signals.get(name, 0)
+
+    def evaluate(self, expr):
+        if expr == "(others => '0')":
+            return 0
+        if expr.startswith('"'):
+            return int(expr.strip('"'), 2)
+        concat = re.match(r"(\w+)\((\d+) downto 0\) & (\w+)$", expr)
+        if concat:
+            high = int(concat.group(2))
+            low = self.value(concat.group(1)) & ((2 << high) - 1)
+            return low << 1 | self.value(concat.group(3)) & 1
+        expr = expr.replace("not ", "1 ^ ").replace(" xor ", " ^ ")
+        expr = expr.replace("'0'", "0").replace("'1'", "1")
+        expr = re.sub(r"(\w+)\((\d+)\)", r'(v("\1") >> \2 & 1)', expr)
+        expr = re.sub(r'(?<!["\w])([a-z_]\w*)(?![\w"(])', r'v("\1")', expr)
+        return eval(expr, {"v": self.value})
+
+    def execute(self, statements, pending):
+        for statement in statements:
+            if isinstance(statement, tuple):
+                cond, then, otherwise = statement
+                branch = then if self.evaluate(cond) & 1 else otherwise
+                self.execute(branch, pending)
+                continue
+            target, index, op, expr = re.match(
+                r"(\w+)(?:\((\d+)\))? (<=|:=) (.*);$", statement
+            ).groups()
+            value = self.evaluate(expr)
+            if op == ":=":
+                store = self.variables
+            else:
+                store = pending
+            if index is None:
+                store[target] = value
+            else:
+                bit = 1 << int(index)
+                old = store.get(target, 0)
+                store[target] = (old & ~bit) | (bit if value & 1 else 0)
+
+    def clock(self, **inputs):
+        self.signals.update(inputs)
+        pending = dict(self.signals)
+        self.execute(self.statements, pending)
+        self.signals = pending
+        crc = 0
+        for target, expr in self.outputs:
+            if target == "crc":
+                crc = self.evaluate(expr)
+            else:
+                crc |= (self.evaluate(expr) & 1) << int(target[4:-1])
+        return self.signals.get("crc_valid", 0), crc
+
+
+class TestPlanPipeline(unittest.TestCase):
+    def test_data_contribution(self):
+        rng = random.Random(2)
+        state_matrix, data_matrix = build_crc_matrices(CRC32_POLY, 128, True)
+        rows = [
+            [var - 32 for var in row if var >= 32]
+            for row in matrix_rows(state_matrix, data_matrix)
+        ]
+        for max_fanin in (2, 3, 6, 16, 200):
+            plan = plan_pipeline(rows, max_fanin)
+            for stage in plan.stages:
+                self.assertLessEqual(max(len(group) for group in stage), max_fanin)
+            for _ in range(10):
+                data = [rng.getrandbits(1) for _ in range(128)]
+                expected = []
+                for row in rows:
+                    bit = 0
+                    for index in row:
+                        bit ^= data[index]
+                    expected.append(bit)
+                self.assertEqual(evaluate_plan(plan, data), expected)
+
+    def test_latency(self):
+        self.assertEqual(plan_pipeline([[0], [1]], 2).latency, 1)
+        self.assertEqual(plan_pipeline([[0, 1], [1]], 2).latency, 2)
+        self.assertEqual(plan_pipeline([list(range(36)), [1]], 6).latency, 3)
+        self.assertEqual(plan_pipeline([list(range(37)), []], 6).latency, 4)
+        with self.assertRaises(ValueError):
+            plan_pipeline([[0, 1]], 1)
+
+    def test_vhdl(self):
+        state_matrix, data_matrix = build_crc_matrices(CRC32_POLY, 64, True)
+        vhdl = gen_vhdl_pipeline(
+            "", "crc32_64b", CRC32_POLY, 64, state_matrix, data_matrix, 4
+        )
+        self.assertIn("entity crc32_64b is", vhdl)
+        self.assertIn("-- latency: 4 cycles", vhdl)
+        self.assertIn("constant LATENCY : natural := 4;", vhdl)
+        self.assertIn("        init       : in  std_logic_vector(31 downto 0);", vhdl)
+        self.assertIn("    crc <= state;", vhdl)
+
+        vhdl = gen_vhdl_pipeline(
+            "",
+            "crc32_64b",
+            CRC32_POLY,
+            64,
+            state_matrix,
+            data_matrix,
+            4,
+            PRESETS["CRC32"],
+        )
+        self.assertNotIn("init       :", vhdl)
+        self.assertIn(
+            "-- init: 0xFFFFFFFF reflect output: True xorout: 0xFFFFFFFF", vhdl
+        )
+        self.assertIn("    crc(0) <= not state(31);", vhdl)
+        self.assertIn("                    cur := state;", vhdl)
+
+    def test_simulation(self):
+        rng = random.Random(8)
+        message = b"123456789abcdefghijklmnopqrstuvw"
+        for preset, dwidth, max_fanin in (
+            ("CRC32", 64, 4),
+            ("CRC32", 32, 6),
+            ("CRC16-CCITT-FALSE", 16, 3),
+            ("CRC5-USB", 8, 2),
+        ):
+            params = PRESETS[preset]
+            poly = int_to_poly(params.length, params.poly)
+            crc = SoftwareCrc(poly, *params[3:5], params.init, params.xorout)
+            matrices = build_crc_matrices(poly, dwidth, params.reflect_input)
+            byteorder = "little" if params.reflect_input else "big"
+            words = [
+                int.from_bytes(message[k : k + dwidth // 8], byteorder)
+                for k in range(0, len(message), dwidth // 8)
+            ]
+            for with_params in (True, False):
+                vhdl = gen_vhdl_pipeline(
+                    "",
+                    "crc",
+                    poly,
+                    dwidth,
+                    *matrices,
+                    max_fanin,
+                    params if with_params else None,
+                )
+                sim = PipelineSim(vhdl)
+                inputs = {"init": params.init, "reset": 0}
+
+                # Junk words are in flight when reset is asserted, including
+                # one presented in the reset cycle itself
+                for k in range(3):
+                    sim.clock(
+                        data_valid=1,
+                        data_first=int(k == 0),
+                        data=rng.getrandbits(dwidth),
+                        **inputs,
+                    )
+                sim.clock(
+                    data_valid=1,
+                    data_first=1,
+                    data=rng.getrandbits(dwidth),
+                    init=0,
+                    reset=1,
+                )
+                for signal, value in sim.signals.items():
+                    if signal.startswith(("data_stage", "valid_pipe", "first_pipe")):
+                        self.assertEqual(value, 0, signal)
+                self.assertEqual(sim.signals["state"], inputs["init"] * with_params)
+                results = []
+                cycle_inputs = [
+                    dict(data_valid=1, data_first=int(k == 0), data=word)
+                    for k, word in enumerate(words)
+                ]
+                cycle_inputs += [dict(data_valid=0, data_first=0, data=0)] * 8
+                for values in cycle_inputs:
+                    valid, state = sim.clock(**values, **inputs)
+                    if valid:
+                        results.append(state)
+                self.assertEqual(len(results), len(words), (preset, with_params))
+                if with_params:
+                    self.assertEqual(results[-1], crc.crc(message), preset)
+                else:
+                    self.assertEqual(
+                        crc.finalize(results[-1]), crc.crc(message), preset
+                    )
@@ -0,0 +1,134 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+import contextlib
+import io
+import re
+import unittest
+
+from crcgen.__main__ import main
+from crcgen.crcgen import PRESETS, build_crc_matrices, int_to_poly
+from crcgen.residual import (
+    build_residual_matrices,
+    iter_vhdl_residual_package,
+    residual_widths,
+)
+from crcgen.software import SoftwareCrc
+
+CRC32_POLY = int_to_poly(32, 0x04C11DB7)
+
+
+def vhdl_function(package, name):
+    body = package.split("function {}(".format(name))[-1]
+    body = body.split("end {};".format(name))[0]
+    equations = {}
+    for target, expr in re.findall(r"\w+\((\d+)\) := (.*);", body):
+        expr = expr.replace("not ", "1 ^ ").replace(" xor ", " ^ ")
+        expr = re.sub(r"(data|state)\((\d+)\)", r"(\1 >> \2 & 1)", expr)
+        equations[int(target)] = compile(expr.replace("'", ""), name, "eval")
+
+    def function(**values):
+        return sum(eval(expr, values) << i for i, expr in equations.items())
+
+    return function
+
+
+class TestResidual(unittest.TestCase):
+    def test_widths(self):
+        self.assertEqual(residual_widths(32), [32, 24, 16, 8])
+        self.assertEqual(residual_widths(12, 4), [12, 8, 4])
+        with self.assertRaises(ValueError):
+            residual_widths(20)
+
+    def test_matrices(self):
+        for reflect_input in (True, False):
+            matrices = build_residual_matrices(CRC32_POLY, 32, 8, reflect_input)
+            self.assertEqual(sorted(matrices), [8, 16, 24, 32])
+            for width, (state_matrix, data_matrix) in matrices.items():
+                expected = build_crc_matrices(CRC32_POLY, width, reflect_input)
+                self.assertEqual(state_matrix, expected[0])
+                self.assertEqual(data_matrix, expected[1])
+
+    def test_package(self):
+        matrices = build_residual_matrices(CRC32_POLY, 24, 8, False)
+        package = "".join(
+            iter_vhdl_residual_package(
+                "", "crc32_be", CRC32_POLY, 24, matrices, False, 8, "crc32"
+            )
+        )
+        for width in (24, 16, 8):
+            self.assertEqual(package.count("function crc32_{}b(".format(width)), 2)
+            self.assertIn("end crc32_{}b;".format(width), package)
+        self.assertIn("byte_en: std_logic_vector(2 downto 0)", package)
+        self.assertIn("return crc32_16b(state, data(23 downto 8));", package)
+        self.assertTrue(package.endswith("end crc32_be_pkg;\n"))
+
+        matrices = build_residual_matrices(CRC32_POLY, 24, 8, True)
+        package = "".join(
+            iter_vhdl_residual_package("", "crc32_be", CRC32_POLY, 24, matrices, True)
+        )
+        self.assertIn(
+            "        elsif byte_en(1) = '1' then\n"
+            "            return crc32_be_16b(state, data(15 downto 0));\n",
+            package,
+        )
+
+    def test_params(self):
+        params = PRESETS["CRC32"]
+        crc = SoftwareCrc(CRC32_POLY, True, True, params.init, params.xorout)
+        matrices = build_residual_matrices(CRC32_POLY, 32, 8, True)
+        package = "".join(
+            iter_vhdl_residual_package(
+                "", "crc", CRC32_POLY, 32, matrices, True, params=params
+            )
+        )
+        self.assertIn(
+            "function crc_first(data: std_logic_vector(31 downto 0); "
+            "byte_en: std_logic_vector(3 downto 0))",
+            package,
+        )
+        self.assertIn('            return "{:032b}";'.format(params.init), package)
+        final = vhdl_function(package, "crc_final")
+        message = b"123456789"
+        for first_bytes in (1, 2, 3, 4):
+            # A first word of first_bytes bytes, then full and residual words
+            first = vhdl_function(package, "crc_{}b_first".format(8 * first_bytes))
+            state = first(data=int.from_bytes(message[:first_bytes], "little"))
+            for offset in range(first_bytes, len(message), 4):
+                word = message[offset : offset + 4]
+                next_state = vhdl_function(package, "crc_{}b".format(8 * len(word)))
+                state = next_state(state=state, data=int.from_bytes(word, "little"))
+            self.assertEqual(final(state=state), crc.crc(message), first_bytes)
+        self.assertEqual(crc.crc(message), params.check)
+
+        # Without parameters there are no first or final functions
+        package = "".join(
+            iter_vhdl_residual_package("", "crc", CRC32_POLY, 32, matrices, True)
+        )
+        self.assertNotIn("_first", package)
+
+    def test_main(self):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            main(["--preset", "CRC32", "-w", "32", "-m", "vhdl_residual"])
+        self.assertIn("package crc32_32b_be_pkg is", stdout.getvalue())
+        self.assertIn("function crc32_8b(", stdout.getvalue())
+        self.assertIn("function crc32_32b_be_final(", stdout.getvalue())
+
+        with contextlib.redirect_stderr(io.StringIO()):
+            for argv in (["-w", "20"], ["-w", "16:32:8"], ["-w", "32", "--share-xor"]):
+                with self.assertRaises(SystemExit):
+                    main(["--preset", "CRC32", "-m", "vhdl_residual"] + argv)
@@ -0,0 +1,149 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+import contextlib
+import io
+import os
+import random
+import tempfile
+import unittest
+
+from crcgen.__main__ import main
+from crcgen.crcgen import int_to_poly
+from crcgen.reveng import (
+    Sample,
+    gf2_divmod,
+    gf2_gcd,
+    parse_samples,
+    recover,
+    recover_polys,
+)
+from crcgen.software import SoftwareCrc
+
+MODELS = (
+    # length, poly, init, reflect_input, reflect_output, xorout
+    (32, 0x04C11DB7, 0xFFFFFFFF, True, True, 0xFFFFFFFF),
+    (32, 0x04C11DB7, 0xFFFFFFFF, False, False, 0),
+    (16, 0x1021, 0xFFFF, False, False, 0),
+    (16, 0x8005, 0, True, True, 0),
+    (8, 0x07, 0, False, False, 0),
+    (5, 0x05, 0x1F, True, True, 0x1F),
+)
+
+
+def make_samples(model, lengths, seed=1):
+    length, poly, init, reflect_input, reflect_output, xorout = model
+    crc = SoftwareCrc(
+        int_to_poly(length, poly), reflect_input, reflect_output, init, xorout
+    )
+    rng = random.Random(seed)
+    messages = [bytes(rng.getrandbits(8) for _ in range(n)) for n in lengths]
+    return crc, [Sample(message, crc.crc(message)) for message in messages]
+
+
+class TestReveng(unittest.TestCase):
+    def test_gf2(self):
+        self.assertEqual(gf2_divmod(0b1111, 0b11), (0b101, 0))
+        self.assertEqual(gf2_divmod(0b1000, 0b11), (0b111, 1))
+        self.assertEqual(gf2_gcd(0b1111, 0b1001), 0b11)
+
+    def test_recover_polys(self):
+        self.assertEqual(recover_polys(iter([0x104C11DB7 << 3]), 32), [0x04C11DB7])
+        self.assertEqual(recover_polys(iter([]), 32), [])
+        # (x + 1)^8 factors from mixed lengths are stripped
+        constraint = 0x104C11DB7
+        for _ in range(8):
+            constraint ^= constraint << 1
+        self.assertEqual(recover_polys(iter([constraint]), 32), [0x04C11DB7])
+
+    def test_recover(self):
+        for model in MODELS:
+            crc, samples = make_samples(model, [3, 8, 8, 12, 30, 31])
+            models = recover(samples, model[0])
+            self.assertEqual(len(models), 1, model)
+            recovered = models[0].software_crc()
+            # Equivalent on every message, even where init is not unique
+            for message in (b"", b"123456789", bytes(100), b"\xff" * 7):
+                self.assertEqual(recovered.crc(message), crc.crc(message), model)
+            if models[0].unique:
+                self.assertEqual(
+                    (
+                        models[0].poly,
+                        models[0].init,
+                        models[0].reflect_input,
+                        models[0].reflect_output,
+                        models[0].xorout,
+                    ),
+                    model[1:],
+                )
+
+    def test_same_length(self):
+        crc, samples = make_samples(MODELS[0], [16] * 6)
+        (model,) = recover(samples, 32)
+        self.assertFalse(model.unique)
+        # All-ones init and xorout are preferred when they fit
+        self.assertEqual((model.init, model.xorout), (0xFFFFFFFF, 0xFFFFFFFF))
+
+    def test_many_samples(self):
+        _, samples = make_samples(MODELS[1], [n % 97 + 1 for n in range(3000)])
+        (model,) = recover(samples, 32)
+        self.assertTrue(model.unique)
+        self.assertEqual((model.poly, model.init), (0x04C11DB7, 0xFFFFFFFF))
+
+    def test_known_poly(self):
+        crc, samples = make_samples(MODELS[2], [10])
+        with self.assertRaises(ValueError):
+            recover(samples, 16)
+        # A single sample fits every reflection with some init and xorout
+        models = recover(samples, 16, 0x1021)
+        self.assertEqual(len(models), 4)
+        for model in models:
+            self.assertEqual(model.poly, 0x1021)
+            self.assertFalse(model.unique)
+            self.assertEqual(
+                model.software_crc().crc(samples[0].message), samples[0].crc
+            )
+
+    def test_no_match(self):
+        _, samples = make_samples(MODELS[2], [10, 11, 12, 13])
+        samples[1] = Sample(samples[1].message, samples[1].crc ^ 1)
+        self.assertEqual(recover(samples, 16, 0x1021), [])
+
+    def test_parse(self):
+        self.assertEqual(
+            parse_samples(["# comment", "", "313233 0x1a2b", "00ff,FFFF  # x"]),
+            [Sample(b"123", 0x1A2B), Sample(b"\x00\xff", 0xFFFF)],
+        )
+        with self.assertRaises(ValueError):
+            parse_samples(["0011"])
+        with self.assertRaises(ValueError):
+            parse_samples(["xyz 12"])
+
+    def test_main(self):
+        _, samples = make_samples(MODELS[0], [4, 9, 9, 17])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "samples.txt")
+            with open(path, "w") as f:
+                for sample in samples:
+                    f.write("{} {:08x}\n".format(sample.message.hex(), sample.crc))
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout):
+                self.assertEqual(main(["reveng", "-l", "32", path]), 0)
+        self.assertIn(
+            '"CRC32-RECOVERED": CrcParams(32, 0x04C11DB7, 0xFFFFFFFF, True, True, '
+            "0xFFFFFFFF, 0xCBF43926),",
+            stdout.getvalue(),
+        )
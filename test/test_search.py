@@ -0,0 +1,136 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+import contextlib
+import io
+import itertools
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from crcgen import search as search_module
+from crcgen.__main__ import main
+from crcgen.search import (
+    Evaluation,
+    all_candidates,
+    evaluate,
+    reciprocal,
+    search,
+    syndromes,
+    undetected_errors,
+)
+
+
+def gf2_mod(value, divisor):
+    while value.bit_length() >= divisor.bit_length():
+        value ^= divisor << (value.bit_length() - divisor.bit_length())
+    return value
+
+
+def brute_force_weights(poly, length, codeword_bits, max_weight):
+    full = poly | (1 << length)
+    counts = {}
+    for weight in range(2, max_weight + 1):
+        counts[weight] = sum(
+            1
+            for bits in itertools.combinations(range(codeword_bits), weight)
+            if gf2_mod(sum(1 << bit for bit in bits), full) == 0
+        )
+    return counts
+
+
+class TestSearch(unittest.TestCase):
+    def test_undetected_errors(self):
+        for length, poly, message_bits in (
+            (4, 0x3, 6),
+            (5, 0x5, 12),
+            (6, 0x21, 10),
+            (8, 0x07, 16),
+            (8, 0x2F, 20),
+        ):
+            codeword_bits = message_bits + length
+            syn = syndromes(poly, length, codeword_bits)
+            expected = brute_force_weights(poly, length, codeword_bits, 5)
+            for weight, count in expected.items():
+                self.assertEqual(undetected_errors(syn, weight), count, (poly, weight))
+                if count:
+                    self.assertGreater(undetected_errors(syn, weight, limit=0), 0)
+
+    def test_evaluate(self):
+        # HD 4 up to 32751 bits for CCITT, HD 6 at 64 bits for the DNP CRC
+        self.assertEqual(evaluate(0x1021, 16, 64).hd, 4)
+        self.assertEqual(evaluate(0x3D65, 16, 64, max_weight=6).hd, 6)
+        self.assertEqual(evaluate(0x3D65, 16, 64, max_weight=5), (0x3D65, 6, 0))
+        self.assertIsNone(evaluate(0x1021, 16, 64, min_hd=5))
+        expected = brute_force_weights(0x07, 8, 24, 4)
+        self.assertEqual(evaluate(0x07, 8, 16), Evaluation(0x07, 4, expected[4]))
+        self.assertIsNone(evaluate(0x07, 8, 16, min_hd=4, max_undetected=10))
+        # Without its +1 term 0x2 looks even, but x^3 + x + 1 is evaluated
+        self.assertEqual(evaluate(0x2, 3, 4, max_weight=5).hd, 3)
+        self.assertEqual(evaluate(0x2, 3, 4, max_weight=5).hd, evaluate(0x3, 3, 4).hd)
+
+    def test_candidates(self):
+        self.assertEqual(reciprocal(0x1021, 16), 0x0811)
+        self.assertEqual(reciprocal(0x0811, 16), 0x1021)
+        candidates = all_candidates(6)
+        self.assertTrue(all(poly & 1 for poly in candidates))
+        self.assertEqual(
+            sorted(set(candidates) | {reciprocal(poly, 6) for poly in candidates}),
+            list(range(1, 64, 2)),
+        )
+
+    def test_search(self):
+        expected = sorted(
+            (evaluate(poly, 6, 20) for poly in range(1, 64, 2)),
+            key=lambda r: (-r.hd, r.undetected, r.poly),
+        )
+        best = [r for r in expected if r.hd == expected[0].hd]
+        best = [r for r in best if r.poly <= reciprocal(r.poly, 6)]
+        self.assertEqual(search(6, 20, workers=1, chunk_size=4), best)
+        self.assertEqual(search(6, 20, workers=1, chunk_size=4, top=3), best[:3])
+        self.assertEqual(
+            search(6, 20, [0x21, 0x03], workers=1),
+            [evaluate(0x03, 6, 20), evaluate(0x21, 6, 20)],
+        )
+
+    def test_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "search.json")
+            results = search(6, 20, workers=1, chunk_size=4, checkpoint=path)
+            self.assertTrue(os.path.exists(path))
+            # Everything is done, so resuming evaluates nothing
+            with mock.patch.object(
+                search_module, "_evaluate_chunk", side_effect=AssertionError
+            ):
+                self.assertEqual(
+                    search(6, 20, workers=1, chunk_size=4, checkpoint=path), results
+                )
+            with self.assertRaises(ValueError):
+                search(6, 24, workers=1, chunk_size=4, checkpoint=path)
+
+    def test_main(self):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            main(["search", "-l", "16", "-k", "64", "0x1021", "0x3D65"])
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].startswith("0x3D65     6"))
+        self.assertTrue(lines[2].startswith("0x1021     4"))
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), self.assertRaises(SystemExit):
+            main(["search", "-l", "3", "-k", "4", "--max-weight", "5", "0x2", "0x3"])
+        self.assertIn("candidates must have a +1 term", stderr.getvalue())
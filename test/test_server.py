@@ -0,0 +1,142 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+import contextlib
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+from crcgen.__main__ import main
+from crcgen.crcgen import PRESETS, build_crc_matrices, int_to_poly
+from crcgen.server import Server, WarmMatrices, socket_server
+
+CRC32_POLY = int_to_poly(32, 0x04C11DB7)
+
+
+class TestServer(unittest.TestCase):
+    def request(self, server, **request):
+        return json.loads(server.handle_line(json.dumps(request)))
+
+    def test_generate(self):
+        server = Server()
+        response = self.request(server, id=7, preset="CRC32", width=16)
+        self.assertEqual(response["id"], 7)
+        self.assertTrue(response["ok"])
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            main(["--preset", "CRC32", "--width", "16"])
+        self.assertEqual(response["output"], stdout.getvalue())
+
+    def test_errors(self):
+        server = Server()
+        self.assertEqual(
+            json.loads(server.handle_line("[]")),
+            {"id": None, "ok": False, "error": "request must be a JSON object"},
+        )
+        response = self.request(server, id=1, preset="CRC32")
+        self.assertFalse(response["ok"])
+        self.assertEqual(
+            response["error"], "the following arguments are required: -w/--width"
+        )
+        response = self.request(server, id=2, preset="CRC32", width=8, output="x")
+        self.assertEqual(response["error"], "unknown keys output")
+        response = self.request(
+            server, id=3, preset="CRC32", width=8, mode="vhdl_testbench"
+        )
+        self.assertEqual(response["error"], "mode vhdl_testbench is not available")
+        response = self.request(server, id=4, op="frobnicate")
+        self.assertFalse(response["ok"])
+
+    def test_matrices(self):
+        server = Server()
+        response = self.request(
+            server, op="matrices", length=32, poly="0x04C11DB7", width=24
+        )
+        state_matrix, data_matrix = build_crc_matrices(CRC32_POLY, 24, False)
+        self.assertEqual(response["state"], [hex(row) for row in state_matrix.rows])
+        self.assertEqual(response["data"], [hex(row) for row in data_matrix.rows])
+
+        # Presets default to their own input reflection
+        for preset, reflect_input in (("CRC16-XMODEM", False), ("CRC32", True)):
+            params = PRESETS[preset]
+            poly = int_to_poly(params.length, params.poly)
+            response = self.request(server, op="matrices", preset=preset, width=8)
+            _, data_matrix = build_crc_matrices(poly, 8, reflect_input)
+            self.assertEqual(response["data"], [hex(row) for row in data_matrix.rows])
+            response = self.request(
+                server,
+                op="matrices",
+                preset=preset,
+                width=8,
+                reflect_input=not reflect_input,
+            )
+            _, data_matrix = build_crc_matrices(poly, 8, not reflect_input)
+            self.assertEqual(response["data"], [hex(row) for row in data_matrix.rows])
+
+    def test_warm_matrices(self):
+        warm = WarmMatrices(max_polys=2)
+        for dwidth in (64, 8, 100):
+            self.assertEqual(
+                warm.build_crc_matrices(CRC32_POLY, dwidth, False),
+                build_crc_matrices(CRC32_POLY, dwidth, False),
+            )
+        self.assertEqual((warm.hits, warm.misses), (2, 1))
+        self.assertEqual(
+            list(warm.build_crc_matrices_sweep(CRC32_POLY, [16, 8], True)),
+            [
+                (8, build_crc_matrices(CRC32_POLY, 8, True)),
+                (16, build_crc_matrices(CRC32_POLY, 16, True)),
+            ],
+        )
+        warm.powers(int_to_poly(5, 0x5))
+        warm.powers(int_to_poly(16, 0x1021))
+        self.assertEqual(len(warm), 2)
+        warm.powers(CRC32_POLY)
+        self.assertEqual(warm.misses, 4)
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "needs Unix sockets")
+    def test_socket(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "crcgen.sock")
+            unix_server = socket_server(Server(), path)
+            thread = threading.Thread(target=unix_server.serve_forever)
+            thread.start()
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                    client.connect(path)
+                    with client.makefile("rw") as stream:
+                        for width in (8, 16):
+                            request = {
+                                "id": width,
+                                "preset": "CRC5-USB",
+                                "width": width,
+                            }
+                            stream.write(json.dumps(request) + "\n")
+                            stream.flush()
+                            response = json.loads(stream.readline())
+                            self.assertEqual(response["id"], width)
+                            self.assertIn(
+                                "data width: {}".format(width), response["output"]
+                            )
+            finally:
+                unix_server.shutdown()
+                unix_server.server_close()
+                thread.join()
+            self.assertFalse(os.path.exists(path))
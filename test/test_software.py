@@ -0,0 +1,114 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+
+import random
+import unittest
+
+from crcgen.crcgen import build_crc_matrices, int_to_poly, poly_to_int
+from crcgen.software import SLICES, SoftwareCrc
+
+CRC5_USB_POLY = int_to_poly(5, 0x5)
+CRC16_CCITT_POLY = int_to_poly(16, 0x1021)
+CRC32_POLY = int_to_poly(32, 0x04C11DB7)
+CRC64_POLY = int_to_poly(64, 0x42F0E1EBA9EA3693)
+
+
+def matrix_update(matrices, length, dwidth, state, data):
+    # Apply the hardware matrices one dwidth-bit little-endian word at a time
+    state_matrix, data_matrix = matrices
+    word_bytes = dwidth // 8
+    for offset in range(0, len(data), word_bytes):
+        word = int.from_bytes(data[offset : offset + word_bytes], "little")
+        next_state = [0] * length
+        for i, row in enumerate(state_matrix):
+            if (state >> i) & 1:
+                next_state = [a ^ b for a, b in zip(next_state, row)]
+        for i, row in enumerate(data_matrix):
+            if (word >> i) & 1:
+                next_state = [a ^ b for a, b in zip(next_state, row)]
+        state = poly_to_int(next_state)
+    return state
+
+
+class TestSoftwareCrc(unittest.TestCase):
+    def test_check_values(self):
+        # https://reveng.sourceforge.io/crc-catalogue/
+        cases = [
+            (CRC5_USB_POLY, True, 0x1F, 0x1F, 0x19),
+            (CRC16_CCITT_POLY, False, 0xFFFF, 0, 0x29B1),
+            (CRC32_POLY, True, 0xFFFFFFFF, 0xFFFFFFFF, 0xCBF43926),
+            (CRC32_POLY, False, 0xFFFFFFFF, 0xFFFFFFFF, 0xFC891918),
+            (CRC64_POLY, True, (1 << 64) - 1, (1 << 64) - 1, 0x995DC9BBDF1939FA),
+            (CRC64_POLY, False, 0, 0, 0x6C40DF5F0B497347),
+        ]
+        for poly, reflect, init, xorout, check in cases:
+            for slices in SLICES:
+                for native in (True, False):
+                    crc = SoftwareCrc(
+                        poly, reflect, reflect, init, xorout, slices, native
+                    )
+                    self.assertEqual(crc.check, check)
+
+    def test_matches_matrices(self):
+        rng = random.Random(3)
+        data = bytes(rng.getrandbits(8) for _ in range(37))
+        for poly in (CRC5_USB_POLY, CRC16_CCITT_POLY, CRC32_POLY, CRC64_POLY):
+            length = len(poly)
+            state = rng.getrandbits(length)
+            for reflect in (True, False):
+                matrices = build_crc_matrices(poly, 8, reflect)
+                expected = matrix_update(matrices, length, 8, state, data)
+                for slices in SLICES:
+                    crc = SoftwareCrc(poly, reflect, slices=slices, native=False)
+                    self.assertEqual(crc.update(state, data), expected)
+                    self.assertEqual(
+                        SoftwareCrc(poly, reflect).update(state, data), expected
+                    )
+            matrices = build_crc_matrices(poly, 32, True)
+            self.assertEqual(
+                SoftwareCrc(poly, True).update(state, data[:36]),
+                matrix_update(matrices, length, 32, state, data[:36]),
+            )
+
+    def test_combine(self):
+        rng = random.Random(4)
+        a = bytes(rng.getrandbits(8) for _ in range(100))
+        b = bytes(rng.getrandbits(8) for _ in range(61))
+        cases = [
+            (CRC32_POLY, True, True, 0xFFFFFFFF, 0xFFFFFFFF),
+            (CRC16_CCITT_POLY, False, False, 0x1D0F, 0x1234),
+            (CRC5_USB_POLY, True, False, 0x1F, 0x03),
+        ]
+        for poly, reflect_input, reflect_output, init, xorout in cases:
+            crc = SoftwareCrc(poly, reflect_input, reflect_output, init, xorout)
+            self.assertEqual(
+                crc.combine(crc.crc(a), crc.crc(b), len(b)), crc.crc(a + b)
+            )
+            self.assertEqual(crc.combine(crc.crc(a), crc.crc(b""), 0), crc.crc(a))
+            self.assertEqual(
+                crc.combine_state(crc.update(crc.init, a), crc.update(0, b), len(b)),
+                crc.update(crc.init, a + b),
+            )
+
+    def test_buffers(self):
+        crc = SoftwareCrc(CRC32_POLY, True, init=0xFFFFFFFF, xorout=0xFFFFFFFF)
+        data = bytearray(b"123456789")
+        self.assertEqual(crc.crc(data), 0xCBF43926)
+        self.assertEqual(crc.crc(memoryview(data)), 0xCBF43926)
+        state = crc.update(crc.init, memoryview(data)[:4])
+        state = crc.update(state, memoryview(data)[4:])
+        self.assertEqual(crc.finalize(state), 0xCBF43926)
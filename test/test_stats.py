@@ -0,0 +1,177 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from crcgen.__main__ import generate
+from crcgen.crcgen import build_crc_matrices, int_to_poly
+from crcgen.pipeline import pipeline_stats
+from crcgen.stats import (
+    GenerationStats,
+    equation_stats,
+    lut_count,
+    lut_depth,
+    network_stats,
+)
+from crcgen.xornet import XorNetwork, matrix_rows, share_xor_terms, xor_gate_count
+
+CRC32_POLY = int_to_poly(32, 0x04C11DB7)
+
+
+class TestStats(unittest.TestCase):
+    def test_lut_estimates(self):
+        self.assertEqual(
+            [lut_count(f) for f in (0, 1, 2, 6, 7, 11, 12, 52)],
+            [0, 0, 1, 1, 2, 2, 3, 11],
+        )
+        self.assertEqual(
+            [lut_depth(f) for f in (0, 1, 2, 6, 7, 36, 37, 52)],
+            [0, 0, 1, 1, 2, 2, 3, 3],
+        )
+
+    def test_equation_stats(self):
+        state_matrix, data_matrix = build_crc_matrices(CRC32_POLY, 8, True)
+        stats = equation_stats(8, state_matrix, data_matrix)
+        self.assertEqual(len(stats.fanin), 32)
+        # next_state(0) = state(24) xor state(30) xor data(1) xor data(7)
+        self.assertEqual(stats.fanin[0], 4)
+        self.assertEqual(stats.xor_terms, sum(stats.fanin))
+        self.assertEqual(stats.max_fanin, max(stats.fanin))
+        self.assertEqual(stats.lut6, sum(lut_count(f) for f in stats.fanin))
+        self.assertEqual(stats.depth, 2)
+
+    def test_network_stats(self):
+        # out0 = in0 ^ in1 ^ in2, out1 = in0 ^ in1, sharing t = in0 ^ in1
+        network = XorNetwork(3, [(0, 1)], [[3, 2], [3]])
+        stats = network_stats(8, network)
+        self.assertEqual(stats.fanin, [2, 1])
+        self.assertEqual(stats.xor_terms, 5)
+        self.assertEqual(stats.lut6, 2)
+        self.assertEqual(stats.depth, 2)
+        self.assertEqual(stats.network, "shared")
+
+        state_matrix, data_matrix = build_crc_matrices(CRC32_POLY, 32, True)
+        rows = matrix_rows(state_matrix, data_matrix)
+        network = share_xor_terms(rows, 64)
+        flat = equation_stats(32, state_matrix, data_matrix)
+        shared = network_stats(32, network)
+        self.assertEqual(flat.network, "flat")
+        # Every gate has one more input than it has outputs
+        outputs = len(network.terms) + sum(1 for f in shared.fanin if f)
+        self.assertEqual(shared.xor_terms - outputs, xor_gate_count(network))
+        self.assertLess(shared.xor_terms, flat.xor_terms)
+        self.assertLessEqual(shared.max_fanin, flat.max_fanin)
+
+    def test_pipeline_stats(self):
+        state_matrix, data_matrix = build_crc_matrices(CRC32_POLY, 128, True)
+        flat = equation_stats(128, state_matrix, data_matrix)
+        stats = pipeline_stats(128, state_matrix, data_matrix, 4)
+        self.assertEqual(stats.network, "pipelined")
+        self.assertLessEqual(
+            stats.max_fanin,
+            max(state_matrix.transpose().row_popcount(i) for i in range(32)) + 1,
+        )
+        self.assertLess(stats.depth, flat.depth)
+
+    def test_emitted_network(self):
+        for argv, network in (
+            ([], "flat"),
+            (["--share-xor"], "shared"),
+            (["--state-transform"], "transformed"),
+            (["--state-transform", "--share-xor"], "transformed, shared"),
+            (["-m", "vhdl_pipeline"], "pipelined"),
+            (["-m", "vhdl_folded"], "folded"),
+        ):
+            with contextlib.redirect_stdout(io.StringIO()):
+                with contextlib.redirect_stderr(io.StringIO()) as stderr:
+                    stats = generate(
+                        ["--preset", "CRC32", "-w", "32", "--stats"] + argv
+                    )
+            self.assertEqual([eq.network for eq in stats.equations], [network])
+            self.assertIn("  " + network, stderr.getvalue())
+
+    def test_share_once(self):
+        for argv in ([], ["--state-transform"]):
+            outputs = []
+            for extra in ([], ["--stats"]):
+                stdout = io.StringIO()
+                with mock.patch(
+                    "crcgen.__main__.share_xor_terms", wraps=share_xor_terms
+                ) as share, mock.patch(
+                    "crcgen.crcgen.share_xor_terms", wraps=share_xor_terms
+                ) as package_share:
+                    with contextlib.redirect_stdout(stdout):
+                        with contextlib.redirect_stderr(io.StringIO()):
+                            generate(
+                                ["--preset", "CRC32", "-w", "32", "--share-xor"]
+                                + argv
+                                + extra
+                            )
+                self.assertEqual(share.call_count + package_share.call_count, 1)
+                outputs.append(stdout.getvalue())
+            # The arguments line differs, the equations must not
+            self.assertEqual(
+                [line for line in outputs[0].splitlines() if "arguments" not in line],
+                [line for line in outputs[1].splitlines() if "arguments" not in line],
+            )
+
+    def test_phase(self):
+        stats = GenerationStats()
+        with stats.phase("matrices"):
+            pass
+        with stats.phase("matrices"):
+            pass
+        with stats.phase("emit"):
+            pass
+        self.assertEqual(list(stats.phases), ["matrices", "emit"])
+        self.assertAlmostEqual(stats.total_seconds, sum(stats.phases.values()))
+
+    def test_generate(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "crc.vhd")
+            profile = os.path.join(tmp, "crc.prof")
+            stderr = io.StringIO()
+            with contextlib.redirect_stderr(stderr):
+                stats = generate(
+                    [
+                        "--preset",
+                        "CRC32",
+                        "-w",
+                        "8:16:8",
+                        "--stats",
+                        "--profile",
+                        profile,
+                        "-o",
+                        output,
+                    ]
+                )
+            self.assertEqual(
+                list(stats.phases), ["parse", "matrices", "analysis", "emit"]
+            )
+            self.assertEqual([eq.dwidth for eq in stats.equations], [8, 16])
+            self.assertIn("max_fanin", stderr.getvalue())
+            self.assertTrue(os.path.getsize(profile) > 0)
+
+    def test_generate_no_stats(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = generate(["--preset", "CRC5-USB", "-w", "4"])
+        self.assertEqual(stats.equations, [])
+        self.assertIn("emit", stats.phases)
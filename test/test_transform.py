@@ -0,0 +1,126 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+import contextlib
+import io
+import random
+import re
+import unittest
+
+from crcgen.__main__ import main
+from crcgen.crcgen import PRESETS, build_crc_matrices, gen_vhdl_package, int_to_poly
+from crcgen.matrix import gf2_matrix_apply, gf2_matrix_multiply
+from crcgen.software import SoftwareCrc
+from crcgen.transform import derby_transform, feedback_fanin, gf2_matrix_inverse
+
+CRC32_POLY = int_to_poly(32, 0x04C11DB7)
+
+
+def vhdl_function(package, name):
+    body = package.split("function {}(".format(name))[-1]
+    body = body.split("end {};".format(name))[0]
+    equations = {}
+    for target, expr in re.findall(r"\w+\((\d+)\) := (.*);", body):
+        expr = expr.replace("not ", "1 ^ ").replace(" xor ", " ^ ")
+        expr = re.sub(r"(data|state)\((\d+)\)", r"(\1 >> \2 & 1)", expr)
+        equations[int(target)] = compile(expr.replace("'", ""), name, "eval")
+
+    def function(**values):
+        return sum(eval(expr, values) << i for i, expr in equations.items())
+
+    return function
+
+
+class TestTransform(unittest.TestCase):
+    def test_inverse(self):
+        rng = random.Random(7)
+        matrix = [rng.getrandbits(20) for _ in range(20)]
+        inverse = gf2_matrix_inverse(matrix, 20)
+        if inverse is not None:
+            self.assertEqual(
+                gf2_matrix_multiply(matrix, inverse), [1 << i for i in range(20)]
+            )
+        self.assertIsNone(gf2_matrix_inverse([1, 2, 3], 3))
+
+    def test_derby(self):
+        rng = random.Random(8)
+        cases = (
+            (CRC32_POLY, 64, 2),
+            (int_to_poly(16, 0x8005), 32, 2),
+            # Repeated factors, A^W has no cyclic vector
+            (int_to_poly(64, 0x42F0E1EBA9EA3693), 64, 3),
+        )
+        for poly, dwidth, max_fanin in cases:
+            length = len(poly)
+            state_matrix, data_matrix = build_crc_matrices(poly, dwidth, True)
+            transform = derby_transform(state_matrix, data_matrix)
+            self.assertEqual(max(feedback_fanin(transform.state_matrix)), max_fanin)
+            state = rng.getrandbits(length)
+            transformed = gf2_matrix_apply(transform.forward.rows, state)
+            for _ in range(5):
+                data = rng.getrandbits(dwidth)
+                state = gf2_matrix_apply(state_matrix.rows, state) ^ gf2_matrix_apply(
+                    data_matrix.rows, data
+                )
+                transformed = gf2_matrix_apply(
+                    transform.state_matrix.rows, transformed
+                ) ^ gf2_matrix_apply(transform.data_matrix.rows, data)
+                self.assertEqual(
+                    gf2_matrix_apply(transform.inverse.rows, transformed), state
+                )
+
+    def test_vhdl(self):
+        params = PRESETS["CRC32"]
+        crc = SoftwareCrc(CRC32_POLY, True, True, params.init, params.xorout)
+        matrices = build_crc_matrices(CRC32_POLY, 32, True)
+        transform = derby_transform(*matrices)
+        package = gen_vhdl_package(
+            "", "crc", CRC32_POLY, 32, *matrices, params=params, transform=transform
+        )
+        self.assertIn("-- feedback XOR fan-in: max 2 total 45", package)
+        first = vhdl_function(package, "crc_first")
+        next_state = vhdl_function(package, "crc")
+        final = vhdl_function(package, "crc_final")
+        to_state = vhdl_function(package, "crc_out")
+        from_state = vhdl_function(package, "crc_in")
+        message = b"123456789abc"
+        words = [int.from_bytes(message[k : k + 4], "little") for k in range(0, 12, 4)]
+        state = first(data=words[0])
+        for word in words[1:]:
+            state = next_state(state=state, data=word)
+        self.assertEqual(final(state=state), crc.crc(message))
+        self.assertEqual(to_state(state=state), crc.update(params.init, message))
+        self.assertEqual(from_state(state=to_state(state=state)), state)
+
+    def test_main(self):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            main(["-l", "16", "-p", "0x1021", "-w", "16", "--state-transform"])
+        self.assertIn("function crc16_16b_in(", stdout.getvalue())
+        self.assertNotIn("crc16_16b_final", stdout.getvalue())
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                main(
+                    [
+                        "--preset",
+                        "CRC32",
+                        "-w",
+                        "32",
+                        "-m",
+                        "vhdl_pipeline",
+                        "--state-transform",
+                    ]
+                )
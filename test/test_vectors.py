@@ -0,0 +1,139 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+import contextlib
+import io
+import os
+import random
+import tempfile
+import unittest
+
+from crcgen.__main__ import main
+from crcgen.crcgen import build_crc_matrices, int_to_poly
+from crcgen.software import SoftwareCrc
+from crcgen.vectors import (
+    evaluate_slices,
+    gf2_numpy,
+    hex_lines,
+    random_slices,
+    write_vectors,
+)
+
+CRC32_POLY = int_to_poly(32, 0x04C11DB7)
+
+
+def vector_values(slices, count):
+    return [
+        sum((value >> k & 1) << i for i, value in enumerate(slices))
+        for k in range(count)
+    ]
+
+
+class TestVectors(unittest.TestCase):
+    def test_evaluate_slices(self):
+        rng = random.Random(3)
+        crc = SoftwareCrc(CRC32_POLY, True)
+        state_matrix, data_matrix = build_crc_matrices(CRC32_POLY, 16, True)
+        state_slices = random_slices(rng, 32, 50)
+        data_slices = random_slices(rng, 16, 50)
+        next_slices = evaluate_slices(
+            state_matrix, data_matrix, state_slices, data_slices
+        )
+        for state, data, next_state in zip(
+            vector_values(state_slices, 50),
+            vector_values(data_slices, 50),
+            vector_values(next_slices, 50),
+        ):
+            self.assertEqual(crc.update(state, data.to_bytes(2, "little")), next_state)
+
+    def test_hex_lines(self):
+        rng = random.Random(4)
+        fields = [random_slices(rng, nbits, 21) for nbits in (5, 8, 13)]
+        lines = hex_lines(fields, 21, use_numpy=False).splitlines()
+        self.assertEqual(len(lines), 21)
+        for k, line in enumerate(lines):
+            self.assertEqual(
+                line,
+                "{:02X} {:02X} {:04X}".format(
+                    *(vector_values(field, 21)[k] for field in fields)
+                ),
+            )
+        if gf2_numpy is not None:
+            self.assertEqual(
+                hex_lines(fields, 21, use_numpy=True), "\n".join(lines) + "\n"
+            )
+
+    def test_write_vectors(self):
+        for reflect_input in (True, False):
+            crc = SoftwareCrc(CRC32_POLY, reflect_input)
+            matrices = build_crc_matrices(CRC32_POLY, 24, reflect_input)
+            stimulus, expected = io.StringIO(), io.StringIO()
+            write_vectors(*matrices, 100, stimulus, expected, seed=1, block_size=30)
+            byteorder = "little" if reflect_input else "big"
+            lines = list(
+                zip(stimulus.getvalue().splitlines(), expected.getvalue().splitlines())
+            )
+            self.assertEqual(len(lines), 100)
+            for stimulus_line, expected_line in lines:
+                state, data = (int(field, 16) for field in stimulus_line.split())
+                self.assertEqual(
+                    crc.update(state, data.to_bytes(3, byteorder)),
+                    int(expected_line, 16),
+                )
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "crc5_tb.vhd")
+            main(
+                [
+                    "--preset",
+                    "CRC5-USB",
+                    "-w",
+                    "8",
+                    "-m",
+                    "vhdl_testbench",
+                    "--vectors",
+                    "100",
+                    "-o",
+                    output,
+                ]
+            )
+            with open(output) as f:
+                testbench = f.read()
+            with open(os.path.join(tmp, "crc5_usb_8b_stimulus.txt")) as f:
+                self.assertEqual(len(f.readlines()), 100)
+            with open(os.path.join(tmp, "crc5_usb_8b_expected.txt")) as f:
+                self.assertEqual(len(f.readlines()), 100)
+        self.assertIn("use work.crc5_usb_8b_pkg.all;", testbench)
+        self.assertIn(
+            'STIMULUS_FILE : string := "crc5_usb_8b_stimulus.txt";', testbench
+        )
+        self.assertIn("if crc5_usb_8b(state, data) /= next_state then", testbench)
+
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                main(
+                    [
+                        "--preset",
+                        "CRC32",
+                        "-w",
+                        "8",
+                        "-m",
+                        "vhdl_testbench",
+                        "--vectors",
+                        "0",
+                    ]
+                )
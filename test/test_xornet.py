@@ -0,0 +1,69 @@
+# Copyright (c) 2020-2021 Paul Roukema
+#
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR
+# OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+#
+# SPDX-License-Identifier: 0BSD
+#
+
+
+import random
+import unittest
+
+from crcgen.crcgen import build_crc_matrices, gen_vhdl_package, int_to_poly
+from crcgen.xornet import flat_network, matrix_rows, share_xor_terms, xor_gate_count
+
+CRC32_POLY = int_to_poly(32, 0x04C11DB7)
+
+
+def evaluate(network, inputs):
+    values = list(inputs)
+    for a, b in network.terms:
+        values.append(values[a] ^ values[b])
+    outputs = []
+    for row in network.rows:
+        bit = 0
+        for var in row:
+            bit ^= values[var]
+        outputs.append(bit)
+    return outputs
+
+
+class TestShareXorTerms(unittest.TestCase):
+    def test_equivalent(self):
+        rng = random.Random(1)
+        for dwidth in (1, 8, 64):
+            rows = matrix_rows(*build_crc_matrices(CRC32_POLY, dwidth, True))
+            flat = flat_network(rows, 32 + dwidth)
+            shared = share_xor_terms(rows, 32 + dwidth)
+            self.assertLess(xor_gate_count(shared), xor_gate_count(flat))
+            for _ in range(20):
+                inputs = [rng.getrandbits(1) for _ in range(32 + dwidth)]
+                self.assertEqual(evaluate(shared, inputs), evaluate(flat, inputs))
+
+    def test_no_sharing(self):
+        network = share_xor_terms([[0, 1], [2, 3]], 4)
+        self.assertEqual(network.terms, [])
+        self.assertEqual(network.rows, [[0, 1], [2, 3]])
+
+    def test_pair(self):
+        network = share_xor_terms([[0, 1, 2], [0, 1, 3], [0, 1]], 4)
+        self.assertEqual(network.terms, [(0, 1)])
+        self.assertEqual(network.rows, [[2, 4], [3, 4], [4]])
+        self.assertEqual(xor_gate_count(network), 3)
+
+    def test_vhdl_package(self):
+        state_matrix, data_matrix = build_crc_matrices(CRC32_POLY, 8, True)
+        package = gen_vhdl_package(
+            "", "crc32_8b", CRC32_POLY, 8, state_matrix, data_matrix, share_xor=True
+        )
+        self.assertIn("-- XOR gates: 71 (220 before sharing)", package)
+        self.assertIn("shared(0) := ", package)